@@ -0,0 +1,39 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from starlette.concurrency import run_in_threadpool
+import os
+import stat
+from app.utils.file_utils import PDF_UPLOAD_DIR, PHOTO_UPLOAD_DIR, TEMP_FILE_SUFFIX
+from app.utils.file_serving import FILE_ACCEL_REDIRECT_PREFIX, StoredFileResponse, accel_redirect_response
+
+# Upload directories served under their stored paths, by URL segment
+SERVED_DIRS = {
+    "pdfs": PDF_UPLOAD_DIR,
+    "photos": PHOTO_UPLOAD_DIR,
+}
+
+router = APIRouter()
+
+@router.api_route("/{kind}/{file_name}", methods=["GET", "HEAD"], response_class=StoredFileResponse)
+async def read_stored_file(kind: str, file_name: str, request: Request):
+    """
+    Get an uploaded PDF or photo by the path stored with it, cacheable for
+    good and with byte range support
+    """
+    directory = SERVED_DIRS.get(kind)
+    # In-flight uploads and dot files are never served
+    if directory is None or os.path.basename(file_name) != file_name or file_name.startswith(".") \
+            or file_name.endswith(TEMP_FILE_SUFFIX):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    if FILE_ACCEL_REDIRECT_PREFIX:
+        return accel_redirect_response(f"{kind}/{file_name}")
+
+    path = os.path.join(directory, file_name)
+    try:
+        stat_result = await run_in_threadpool(os.stat, path)
+    except OSError:
+        stat_result = None
+    if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    return StoredFileResponse(path, stat_result, request.headers, request.method)
@@ -1,34 +1,67 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
-from app.db.database import get_db
-from app.services import crud
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+import os
+import tempfile
+from app.db.database import get_db, get_read_db
+from app.services import crud, async_crud, jobs
 from app.schemas import schemas
-from app.utils.file_utils import save_pdf_file, generate_inspection_pdf
+from app.models.models import JobStatusEnum
+from app.utils.pagination import set_next_cursor, NEXT_CURSOR_HEADER
+from app.utils.response_cache import response_cache, project_tag
+from app.utils.file_utils import save_pdf_file, merge_inspection_pdf_with_photos, build_inspection_pdf
 
 router = APIRouter()
 
 @router.post("/inspections/", response_model=schemas.Inspection, status_code=status.HTTP_201_CREATED)
-async def create_inspection(inspection: schemas.InspectionCreate, db: Session = Depends(get_db)):
+def create_inspection(inspection: schemas.InspectionCreate, db: Session = Depends(get_db)):
     """Create a new inspection"""
     return crud.create_inspection(db=db, inspection=inspection)
 
+@router.post("/inspections/bulk", response_model=schemas.BulkCreateResult, status_code=status.HTTP_201_CREATED)
+def create_inspections_bulk(batch: schemas.InspectionBulkCreate, db: Session = Depends(get_db)):
+    """Create many inspections in one transaction; nothing is created if any item is invalid"""
+    return schemas.BulkCreateResult(ids=crud.create_inspections_bulk(db=db, inspections=batch.items))
+
 @router.get("/inspections/", response_model=List[schemas.Inspection])
-def read_inspections(
+async def read_inspections(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     project_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: async_crud.ReadSession = Depends(get_read_db)
 ):
-    """Get all inspections, optionally filtered by project_id"""
-    inspections = crud.get_inspections(db, skip=skip, limit=limit, project_id=project_id)
-    return inspections
+    """
+    Get all inspections, optionally filtered by project_id; pass X-Next-Cursor back as cursor for the next page.
+    
+    Per-project lists are cached and support If-None-Match.
+    """
+    if project_id:
+        cached = response_cache.lookup(request)
+        if cached is not None:
+            return cached
+    
+    inspections = await async_crud.get_inspections(db, skip=skip, limit=limit, project_id=project_id, cursor=cursor)
+    set_next_cursor(response, inspections, limit, crud.INSPECTION_ORDER)
+    if not project_id:
+        return inspections
+    
+    headers = {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]} if NEXT_CURSOR_HEADER in response.headers else {}
+    return response_cache.store(
+        request, [schemas.Inspection.model_validate(inspection) for inspection in inspections],
+        tags=[project_tag(project_id)], headers=headers
+    )
 
 @router.get("/inspections/{inspection_id}", response_model=schemas.InspectionWithPhotos)
-def read_inspection(inspection_id: int, db: Session = Depends(get_db)):
+async def read_inspection(inspection_id: int, db: async_crud.ReadSession = Depends(get_read_db)):
     """Get a specific inspection by ID with its photos"""
-    inspection = crud.get_inspection(db, inspection_id=inspection_id)
+    inspection = await async_crud.get_inspection_with_photos(db, inspection_id=inspection_id)
     return inspection
 
 @router.put("/inspections/{inspection_id}", response_model=schemas.Inspection)
@@ -52,40 +85,87 @@ async def upload_inspection_pdf(
     db: Session = Depends(get_db)
 ):
     """Upload a PDF for an inspection"""
-    inspection = crud.get_inspection(db, inspection_id=inspection_id)
+    inspection = await run_in_threadpool(crud.get_inspection, db, inspection_id=inspection_id)
     
     # Save the PDF file
-    pdf_path = await save_pdf_file(file)
+    stored_pdf = await save_pdf_file(file)
     
     # Update the inspection with the PDF path
     inspection_update = schemas.InspectionUpdate(
         result=inspection.result,
         remark=inspection.remark,
-        pdf_path=pdf_path
+        pdf_path=stored_pdf.path
     )
     
-    updated_inspection = crud.update_inspection(db, inspection_id, inspection_update)
+    updated_inspection = await run_in_threadpool(
+        crud.update_inspection, db, inspection_id, inspection_update, pdf_size=stored_pdf.size
+    )
     return updated_inspection
 
-@router.post("/inspections/{inspection_id}/generate-pdf", response_model=schemas.Inspection)
-async def generate_inspection_report(
-    inspection_id: int,
-    db: Session = Depends(get_db)
-):
-    """Generate a PDF report with inspection data and photos"""
-    # Get the inspection and its photos
+@router.post("/inspections/{inspection_id}/merge-pdf", response_model=schemas.Inspection)
+def merge_inspection_pdf(inspection_id: int, db: Session = Depends(get_db)):
+    """Append pages with the inspection photos to its PDF and store the merged document"""
+    from PyPDF2.errors import PdfReadError
+    
     inspection = crud.get_inspection(db, inspection_id=inspection_id)
-    photos = crud.get_photos(db, inspection_id=inspection_id)
+    if not inspection.pdf_path or not os.path.exists(inspection.pdf_path):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Inspection has no PDF to merge")
     
-    # Generate the PDF
-    pdf_path = generate_inspection_pdf(inspection, photos)
+    photos = crud.get_photos(db, inspection_id=inspection_id, limit=None)
+    photos_data = [
+        {"photo_path": photo.photo_path, "capture_date": photo.capture_date, "caption": photo.caption or ""}
+        for photo in photos
+    ]
+    try:
+        merged_path = merge_inspection_pdf_with_photos(inspection.pdf_path, photos_data)
+    except (PdfReadError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Inspection PDF could not be read: {e}")
     
-    # Update the inspection with the PDF path
-    inspection_update = schemas.InspectionUpdate(
-        result=inspection.result,
-        remark=inspection.remark,
-        pdf_path=pdf_path
+    return crud.set_merged_pdf(db, inspection_id, merged_path, os.path.getsize(merged_path))
+
+@router.get("/inspections/{inspection_id}/report.pdf", response_class=FileResponse)
+async def stream_inspection_report(inspection_id: int, db: Session = Depends(get_db)):
+    """
+    Render the inspection report and send it without storing it in the
+    uploads or touching pdf_path; use generate-pdf to keep a report.
+    
+    reportlab only writes the document once the layout is complete, so the
+    report is rendered in the PDF process pool into a temporary file, which is
+    then sent from disk with a Content-Length and removed afterwards.
+    """
+    inspection, photos = await run_in_threadpool(jobs.inspection_report_data, db, inspection_id)
+    
+    fd, temp_path = tempfile.mkstemp(prefix=f"inspection_{inspection_id}_", suffix=".pdf")
+    os.close(fd)
+    try:
+        await run_in_threadpool(
+            jobs.run_in_pdf_executor, jobs.get_pdf_pool(), build_inspection_pdf, inspection, photos, temp_path
+        )
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    
+    return FileResponse(
+        temp_path,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f'inline; filename="inspection_{inspection_id}.pdf"',
+            "Cache-Control": "no-store",
+        },
+        background=BackgroundTask(os.remove, temp_path),
     )
+
+@router.post("/inspections/{inspection_id}/generate-pdf", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED)
+def generate_inspection_report(
+    inspection_id: int,
+    response: Response,
+    db: Session = Depends(get_db)
+):
+    """Queue generation of a PDF report with inspection data and photos"""
+    # The report is rendered by a background worker; poll /api/jobs/{id} for the outcome
+    job = jobs.request_inspection_pdf(db, inspection_id)
     
-    updated_inspection = crud.update_inspection(db, inspection_id, inspection_update)
-    return updated_inspection
+    # An unchanged inspection reuses its existing report and needs no rendering
+    if job.status == JobStatusEnum.SUCCEEDED.value:
+        response.status_code = status.HTTP_200_OK
+    return job
@@ -0,0 +1,14 @@
+from fastapi import APIRouter
+from app.db import database
+from app.db.pool import SYNC_POOL_METRICS, ASYNC_POOL_METRICS, pool_status
+
+# Operational endpoints; keep /internal off the public reverse proxy
+router = APIRouter()
+
+@router.get("/db-pool")
+def read_db_pool():
+    """Get the occupancy and checkout wait times of this worker's connection pools"""
+    status = {"sync": pool_status(database.engine, SYNC_POOL_METRICS)}
+    if database.async_engine is not None:
+        status["async"] = pool_status(database.async_engine.sync_engine, ASYNC_POOL_METRICS)
+    return status
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.services import jobs
+from app.schemas import schemas
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=schemas.Job)
+def read_job(job_id: int, db: Session = Depends(get_db)):
+    """Get the status of a background job"""
+    return jobs.get_job(db, job_id=job_id)
+
+@router.get("/jobs/{job_id}/result")
+def read_job_result(job_id: int, db: Session = Depends(get_db)):
+    """Get the result of a finished background job"""
+    job = jobs.get_job(db, job_id=job_id)
+    return jobs.get_job_result(job)
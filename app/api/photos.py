@@ -1,11 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
-from app.db.database import get_db
-from app.services import crud
+import os
+import asyncio
+from starlette.concurrency import run_in_threadpool
+from app.db.database import get_db, get_read_db
+from app.services import crud, async_crud
 from app.schemas import schemas
 from app.utils.file_utils import save_photo_file
+from app.utils.pagination import set_next_cursor
+from app.utils.image_utils import (
+    ThumbnailSize, thumbnail_path, generate_thumbnails, build_thumbnails, run_in_image_pool
+)
 
 router = APIRouter()
 
@@ -19,38 +27,150 @@ async def create_photo(
 ):
     """Upload a new photo for an inspection"""
     # Verify the inspection exists
-    inspection = crud.get_inspection(db, inspection_id=inspection_id)
+    await run_in_threadpool(crud.get_inspection, db, inspection_id=inspection_id)
     
     # Save the photo file
-    photo_path = await save_photo_file(file)
+    stored_photo = await save_photo_file(file)
+    
+    # Build the list-view derivatives before the photo becomes visible
+    await generate_thumbnails(stored_photo.path)
     
     # Create the photo record
-    photo_data = schemas.PhotoCreate(
+    photo_data = schemas.StoredPhotoCreate(
         inspection_id=inspection_id,
-        photo_path=photo_path,
+        photo_path=stored_photo.path,
         capture_date=capture_date,
-        caption=caption
+        caption=caption,
+        content_hash=stored_photo.sha256,
+        file_size=stored_photo.size
     )
     
-    return crud.create_photo(db=db, photo=photo_data)
+    return await run_in_threadpool(crud.create_photo, db=db, photo=photo_data, upload_path=stored_photo.upload_path)
+
+# Files of one batch upload written to disk at the same time
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "8"))
+
+@router.post("/photos/batch", response_model=schemas.PhotoBatchUploadResult, status_code=status.HTTP_201_CREATED)
+async def create_photos_batch(
+    response: Response,
+    inspection_id: int = Form(...),
+    capture_dates: List[date] = Form(...),
+    captions: List[str] = Form([]),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
+):
+    """
+    Upload many photos for an inspection in one request.
+    
+    capture_dates and captions are matched to files by position; a single
+    capture date applies to every file. Files are written concurrently and
+    all records are created in one transaction. The response reports each
+    file: 201 if all were stored, 207 if some failed, 422 if none were.
+    """
+    if len(capture_dates) not in (1, len(files)):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="capture_dates must have one entry or one per file")
+    if captions and len(captions) != len(files):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="captions must have one entry per file")
+    
+    # Verify the inspection exists
+    await run_in_threadpool(crud.get_inspection, db, inspection_id=inspection_id)
+    
+    semaphore = asyncio.Semaphore(BATCH_UPLOAD_CONCURRENCY)
+    
+    async def store(upload_file: UploadFile):
+        async with semaphore:
+            stored_photo = await save_photo_file(upload_file)
+            await generate_thumbnails(stored_photo.path)
+            return stored_photo
+    
+    stored_photos = await asyncio.gather(*(store(file) for file in files), return_exceptions=True)
+    
+    results = []
+    new_photos = []
+    for index, (file, stored_photo) in enumerate(zip(files, stored_photos)):
+        result = schemas.PhotoUploadResult(filename=file.filename)
+        if isinstance(stored_photo, HTTPException):
+            result.error = stored_photo.detail
+        elif isinstance(stored_photo, Exception):
+            print(f"[WARNING] Could not store uploaded photo {file.filename}: {stored_photo}")
+            result.error = "Photo could not be stored"
+        else:
+            new_photos.append((result, stored_photo.upload_path, schemas.StoredPhotoCreate(
+                inspection_id=inspection_id,
+                photo_path=stored_photo.path,
+                capture_date=capture_dates[index if len(capture_dates) > 1 else 0],
+                caption=(captions[index] or None) if captions else None,
+                content_hash=stored_photo.sha256,
+                file_size=stored_photo.size
+            )))
+        results.append(result)
+    
+    if new_photos:
+        ids = await run_in_threadpool(
+            crud.create_photos_bulk, db=db, photos=[photo for _, _, photo in new_photos],
+            upload_paths=[upload_path for _, upload_path, _ in new_photos]
+        )
+        for (result, _, _), photo_id in zip(new_photos, ids):
+            result.photo_id = photo_id
+    
+    failed_count = len(results) - len(new_photos)
+    if not new_photos:
+        response.status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    elif failed_count:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return schemas.PhotoBatchUploadResult(created_count=len(new_photos), failed_count=failed_count, items=results)
+
+@router.post("/photos/bulk", response_model=schemas.BulkCreateResult, status_code=status.HTTP_201_CREATED)
+def create_photos_bulk(batch: schemas.PhotoBulkCreate, db: Session = Depends(get_db)):
+    """Create many photo records for already stored files in one transaction"""
+    return schemas.BulkCreateResult(ids=crud.create_client_photos_bulk(db=db, photos=batch.items))
 
 @router.get("/photos/", response_model=List[schemas.Photo])
-def read_photos(
+async def read_photos(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     inspection_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: async_crud.ReadSession = Depends(get_read_db)
 ):
-    """Get all photos, optionally filtered by inspection_id"""
-    photos = crud.get_photos(db, skip=skip, limit=limit, inspection_id=inspection_id)
+    """Get all photos, optionally filtered by inspection_id; pass X-Next-Cursor back as cursor for the next page"""
+    photos = await async_crud.get_photos(db, skip=skip, limit=limit, inspection_id=inspection_id, cursor=cursor)
+    set_next_cursor(response, photos, limit, crud.PHOTO_ORDER)
     return photos
 
 @router.get("/photos/{photo_id}", response_model=schemas.Photo)
-def read_photo(photo_id: int, db: Session = Depends(get_db)):
+async def read_photo(photo_id: int, db: async_crud.ReadSession = Depends(get_read_db)):
     """Get a specific photo by ID"""
-    photo = crud.get_photo(db, photo_id=photo_id)
+    photo = await async_crud.get_photo(db, photo_id=photo_id)
     return photo
 
+@router.get("/photos/{photo_id}/thumbnail", response_class=FileResponse)
+def read_photo_thumbnail(
+    photo_id: int,
+    size: ThumbnailSize = ThumbnailSize.SMALL,
+    db: Session = Depends(get_db)
+):
+    """Get a downscaled JPEG of a photo, building it on demand if missing"""
+    photo = crud.get_photo(db, photo_id=photo_id)
+    
+    path = thumbnail_path(photo.photo_path, size)
+    if not os.path.exists(path):
+        if not os.path.exists(photo.photo_path):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo file not found")
+        try:
+            run_in_image_pool(build_thumbnails, photo.photo_path)
+        except Exception as e:
+            print(f"[WARNING] Could not build thumbnails for {photo.photo_path}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Photo cannot be converted to a thumbnail"
+            )
+    
+    return FileResponse(path, media_type="image/jpeg")
+
 @router.put("/photos/{photo_id}", response_model=schemas.Photo)
 def update_photo(
     photo_id: int, 
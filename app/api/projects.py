@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from fastapi import APIRouter, Depends, status, Header, BackgroundTasks, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.db.database import get_db
-from app.services import crud
+from app.db.database import get_db, get_read_db, SessionLocal
+from app.services import crud, async_crud, jobs
+from app.models.models import JobStatusEnum
+from app.services.ownership import check_project_owner
 from app.schemas import schemas
-from app.utils.file_utils import calculate_project_files_size
+from app.utils.file_utils import calculate_project_files_size, reconcile_project_file_sizes
+from app.utils.archive import project_archive_entries, stream_zip
+from app.utils.pagination import set_next_cursor
+from app.utils.response_cache import response_cache, project_tag
 
 router = APIRouter()
 
@@ -14,41 +20,52 @@ def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)
     return crud.create_project(db=db, project=project)
 
 @router.get("/projects/", response_model=List[schemas.Project])
-def read_projects(
+async def read_projects(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
+    cursor: Optional[str] = None,
     owner: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: async_crud.ReadSession = Depends(get_read_db)
 ):
-    """Get all projects, optionally filtered by owner"""
-    if owner:
-        projects = crud.get_projects_by_owner(db, owner=owner, skip=skip, limit=limit)
-    else:
-        projects = crud.get_projects(db, skip=skip, limit=limit)
+    """Get all projects, optionally filtered by owner; pass X-Next-Cursor back as cursor for the next page"""
+    projects = await async_crud.get_projects(db, skip=skip, limit=limit, cursor=cursor, owner=owner)
+    set_next_cursor(response, projects, limit, crud.PROJECT_ORDER)
     return projects
 
-@router.get("/projects/{project_id}", response_model=schemas.ProjectWithInspections)
-def read_project(
+@router.get("/projects/{project_id}", response_model=schemas.ProjectWithInspections,
+            dependencies=[Depends(check_project_owner)])
+async def read_project(
+    request: Request,
     project_id: int, 
-    owner: Optional[str] = Header(None),
-    db: Session = Depends(get_db)
+    db: async_crud.ReadSession = Depends(get_read_db)
 ):
-    """Get a specific project by ID with its inspections"""
-    project = crud.get_project(db, project_id=project_id)
+    """Get a specific project by ID with its inspections (supports If-None-Match)"""
+    cached = response_cache.lookup(request)
+    if cached is not None:
+        return cached
     
-    # If owner is provided, verify it matches the project owner
-    if owner and project.owner != owner:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You are not the owner of this project"
-        )
-    
-    return project
+    project = await async_crud.get_project_with_inspections(db, project_id=project_id)
+    return response_cache.store(
+        request, schemas.ProjectWithInspections.model_validate(project), tags=[project_tag(project_id)]
+    )
+
+def _reconcile_in_background(project_id: int):
+    """Re-stat a project's files with a session of its own"""
+    db = SessionLocal()
+    try:
+        reconcile_project_file_sizes(db, project_id)
+    except Exception as e:
+        print(f"[WARNING] Storage reconcile for project {project_id} failed: {e}")
+    finally:
+        db.close()
 
-@router.get("/projects/{project_id}/storage")
+@router.get("/projects/{project_id}/storage", dependencies=[Depends(check_project_owner)])
 def get_project_storage_info(
     project_id: int, 
-    owner: Optional[str] = Header(None),
+    background_tasks: BackgroundTasks,
+    include_files: bool = False,
+    reconcile: bool = False,
     db: Session = Depends(get_db)
 ):
     """
@@ -56,26 +73,53 @@ def get_project_storage_info(
     
     Args:
         project_id: 專案ID
-        owner: 專案擁有者 (可選)
+        include_files: 是否列出所有檔案路徑
+        reconcile: 是否在背景重新讀取檔案大小並更新資料庫
         db: 資料庫會話
         
+    專案是否存在及 owner header (可選) 由 check_project_owner 檢查
+        
     Returns:
         包含專案靜態檔案大小資訊的字典
     """
-    # 檢查專案是否存在
-    project = crud.get_project(db, project_id=project_id)
-    
-    # If owner is provided, verify it matches the project owner
-    if owner and project.owner != owner:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You are not the owner of this project"
-        )
+    # 計算專案相關的靜態檔案大小 (使用資料庫中記錄的檔案大小)
+    storage_info = calculate_project_files_size(db, project_id, include_files=include_files)
     
-    # 計算專案相關的靜態檔案大小
-    storage_info = calculate_project_files_size(db, project_id)
+    # 回應後再重新讀取實際檔案大小，結果反映在下一次查詢
+    if reconcile:
+        background_tasks.add_task(_reconcile_in_background, project_id)
+    storage_info["reconcile_scheduled"] = reconcile
     return storage_info
 
+@router.get("/projects/{project_id}/archive.zip", response_class=StreamingResponse,
+            dependencies=[Depends(check_project_owner)])
+def download_project_archive(project_id: int, db: Session = Depends(get_db)):
+    """
+    Download every PDF and photo of a project as a ZIP laid out in
+    subproject/inspection folders, with a manifest.csv
+    """
+    entries = project_archive_entries(db, project_id)
+    # A sync generator: the response reads files and builds the archive in the threadpool
+    return StreamingResponse(
+        stream_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="project_{project_id}.zip"'}
+    )
+
+@router.post("/projects/{project_id}/report", response_model=schemas.Job, status_code=status.HTTP_202_ACCEPTED,
+             dependencies=[Depends(check_project_owner)])
+def generate_project_report(project_id: int, response: Response, db: Session = Depends(get_db)):
+    """
+    Queue a consolidated PDF of every inspection in the project, with a table
+    of contents and bookmarks; poll /api/jobs/{id} for progress
+    """
+    job = jobs.request_project_report(db, project_id)
+    
+    # An unchanged project reuses its existing report and needs no rendering
+    if job.status == JobStatusEnum.SUCCEEDED.value:
+        response.status_code = status.HTTP_200_OK
+    return job
+
 @router.put("/projects/{project_id}", response_model=schemas.Project)
 def update_project(
     project_id: int, 
@@ -83,18 +127,8 @@ def update_project(
     owner: str = Header(...),
     db: Session = Depends(get_db)
 ):
-    """Update a project"""
-    # Get the existing project
-    existing_project = crud.get_project(db, project_id=project_id)
-    
-    # Verify owner matches
-    if existing_project.owner != owner:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You are not the owner of this project"
-        )
-    
-    return crud.update_project(db=db, project_id=project_id, project=project)
+    """Update a project; the owner header must match the project owner"""
+    return crud.update_project(db=db, project_id=project_id, project=project, owner=owner)
 
 @router.delete("/projects/{project_id}", response_model=schemas.Project)
 def delete_project(
@@ -102,15 +136,5 @@ def delete_project(
     owner: str = Header(...),
     db: Session = Depends(get_db)
 ):
-    """Delete a project"""
-    # Get the existing project
-    existing_project = crud.get_project(db, project_id=project_id)
-    
-    # Verify owner matches
-    if existing_project.owner != owner:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied: You are not the owner of this project"
-        )
-    
-    return crud.delete_project(db=db, project_id=project_id)
+    """Delete a project; the owner header must match the project owner"""
+    return crud.delete_project(db=db, project_id=project_id, owner=owner)
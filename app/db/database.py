@@ -1,6 +1,12 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from typing import Optional
+import importlib.util
 import os
+from app.db.pool import (
+    DB_POOL_PING, SYNC_POOL_METRICS, ASYNC_POOL_METRICS, pool_options, install_idle_ping
+)
 
 # Get database URL from environment variable or use default
 # SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/app.db")
@@ -18,9 +24,11 @@ if SQLALCHEMY_DATABASE_URL.startswith("sqlite:///") and not SQLALCHEMY_DATABASE_
 # Create engine with the appropriate connect_args for SQLite
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+    connect_args={"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {},
+    **pool_options(SQLALCHEMY_DATABASE_URL)
 )
+if DB_POOL_PING == "idle":
+    install_idle_ping(engine, SYNC_POOL_METRICS)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -36,14 +44,62 @@ def get_db():
     finally:
         db.close()
 
-#def create_tables():
- #   """Create all tables in the database"""
-    # The directory creation is now handled when the module is loaded
-    # Create all tables
-   # Base.metadata.create_all(bind=engine,checkfirst=True)
-def create_tables():
-   """Create all tables in the database."""
-   try:
-        Base.metadata.create_all(bind=engine, checkfirst=True)
-   except Exception as e:
-       print(f"[WARNING] Skipping table creation due to error: {e}")
+# Async drivers for the read endpoints, by backend
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "asyncmy",
+}
+
+def async_database_url(url: str) -> Optional[str]:
+    """Return the async driver variant of a database URL, or None if there is none"""
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or importlib.util.find_spec(driver) is None:
+        return None
+    # An in-memory SQLite database would be a different, empty database per engine
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return None
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+# Read endpoints use an async engine when enabled and a driver is installed;
+# otherwise they fall back to the sync engine in the threadpool. Off by default
+# until the MySQL (asyncmy) path has been benchmarked against the sync one
+# (benchmarks/bench_async_reads.py)
+ASYNC_DB_ENABLED = os.getenv("ASYNC_DB_ENABLED", "0") == "1"
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or (
+    async_database_url(SQLALCHEMY_DATABASE_URL) if ASYNC_DB_ENABLED else None
+)
+
+async_engine = None
+AsyncSessionLocal = None
+if ASYNC_DATABASE_URL:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options(ASYNC_DATABASE_URL, asyncio=True))
+    if DB_POOL_PING == "idle":
+        install_idle_ping(async_engine.sync_engine, ASYNC_POOL_METRICS)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    if AsyncSessionLocal is None:
+        raise RuntimeError("No async database driver is configured")
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def _get_async_read_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _get_sync_read_db():
+    # A sync generator, so FastAPI opens and closes (ROLLBACK) the session in
+    # the threadpool rather than on the event loop
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Dependency for read endpoints: an AsyncSession when the async engine is
+# available, otherwise a regular Session (see app.services.async_crud)
+get_read_db = _get_async_read_db if AsyncSessionLocal is not None else _get_sync_read_db
@@ -0,0 +1,63 @@
+"""
+Bring the database schema and the upload directories up to date.
+
+Run it once per deploy, before the API workers start; importing the app no
+longer creates tables or directories:
+
+    python -m app.db.migrate
+
+A database that create_tables() built before migrations existed has no
+alembic_version table. It is stamped first: at head if its tables already
+match the models, otherwise at the 0001 baseline, and then upgraded.
+"""
+import os
+import sys
+from typing import Optional
+from alembic import command
+from alembic.config import Config
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from app.db.database import Base, engine as default_engine
+import app.models.models  # noqa: F401  registers the tables on Base.metadata
+from app.utils.file_utils import ensure_upload_dirs
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..")
+BASELINE_REVISION = "0001"
+
+def alembic_config() -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    # Resolve the scripts from the repository, whatever the working directory
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+    return config
+
+def migrate(engine: Optional[Engine] = None) -> str:
+    """
+    Upgrade the database to the latest revision, adopting an unversioned
+    database first.
+
+    Returns:
+        The revision the database is at afterwards
+    """
+    engine = engine or default_engine
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = inspect(connection).get_table_names()
+        if "alembic_version" not in tables and "projects" in tables:
+            context = MigrationContext.configure(connection)
+            revision = "head" if not compare_metadata(context, Base.metadata) else BASELINE_REVISION
+            print(f"[INFO] Adopting an unversioned database at revision {revision}")
+            command.stamp(config, revision)
+        command.upgrade(config, "head")
+        return MigrationContext.configure(connection).get_current_revision()
+
+def main() -> int:
+    revision = migrate()
+    ensure_upload_dirs()
+    print(f"Database at revision {revision}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+import os
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Connection pool settings, per engine and per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Replace connections older than this many seconds (MySQL drops idle ones after wait_timeout)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+
+# How a connection is checked before use:
+#   pre_ping - a round trip on every checkout
+#   idle     - a round trip only if the connection sat idle longer than DB_POOL_PING_IDLE_SECONDS
+#   none     - no check
+DB_POOL_PING = os.getenv("DB_POOL_PING", "idle")
+DB_POOL_PING_IDLE_SECONDS = float(os.getenv("DB_POOL_PING_IDLE_SECONDS", "30"))
+
+class PoolMetrics:
+    """Checkout wait statistics of a connection pool, safe to update from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.timeouts = 0
+            self.pings = 0
+            self.ping_failures = 0
+
+    def record_checkout(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_ping(self, failed: bool = False):
+        with self._lock:
+            self.pings += 1
+            if failed:
+                self.ping_failures += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+                "timeouts": self.timeouts,
+                "pings": self.pings,
+                "ping_failures": self.ping_failures,
+            }
+
+# One set of metrics per engine kind; a pool keeps them across dispose/recreate
+SYNC_POOL_METRICS = PoolMetrics()
+ASYNC_POOL_METRICS = PoolMetrics()
+
+class _TimedCheckout:
+    """Pool mixin timing how long each checkout waits for a connection"""
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_checkout(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    metrics = SYNC_POOL_METRICS
+
+class InstrumentedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    metrics = ASYNC_POOL_METRICS
+
+def pool_options(url: str, asyncio: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine configuring the pool.
+
+    In-memory SQLite keeps SQLAlchemy's default single-connection pool, since
+    each new connection would be a different database.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": InstrumentedAsyncQueuePool if asyncio else InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PING == "pre_ping",
+    }
+
+def install_idle_ping(sync_engine, metrics: PoolMetrics, idle_seconds: float = DB_POOL_PING_IDLE_SECONDS):
+    """
+    Ping a pooled connection on checkout only if it has been idle for longer
+    than idle_seconds. Recently used connections, the common case under
+    load, skip the round trip that pool_pre_ping would make on every checkout.
+    A failed ping discards the connection and the pool retries with a new one.
+    """
+    @event.listens_for(sync_engine, "checkin")
+    def mark_idle(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(sync_engine, "checkout")
+    def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        checked_in_at = connection_record.info.get("checked_in_at")
+        if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+        except Exception as e:
+            metrics.record_ping(failed=True)
+            raise exc.DisconnectionError(f"Idle connection failed its ping: {e}")
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        metrics.record_ping()
+
+def pool_status(engine, metrics: PoolMetrics) -> dict:
+    """Current occupancy of an engine's pool together with its checkout metrics"""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+        })
+    status.update(metrics.snapshot())
+    return status
@@ -1,29 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-import os
 
 # Import the routers
-from app.api import projects, inspections, photos
+from app.api import projects, inspections, photos, jobs, internal, files
+from app.services.jobs import start_job_worker, stop_job_worker
+from app.services.file_cleanup import file_deletion_queue
+from app.services.orphan_gc import start_orphan_collector, stop_orphan_collector
+from app.db.database import async_engine
+from app.utils.request_limits import UploadSizeLimitMiddleware
 
-# Create necessary directories first
-os.makedirs("app/data", exist_ok=True)
-os.makedirs("app/static/uploads/pdfs", exist_ok=True)
-os.makedirs("app/static/uploads/photos", exist_ok=True)
+# Importing the app has no side effects: tables and upload directories are
+# created by `python -m app.db.migrate`, run once per deploy
 
-# Import database components for initialization
-from app.db.database import create_tables
-
-# Initialize database tables
-create_tables()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop the background workers of this process"""
+    start_job_worker()
+    start_orphan_collector()
+    yield
+    stop_orphan_collector()
+    stop_job_worker()
+    # Let queued file deletions finish before the process exits
+    file_deletion_queue.stop()
+    # Close pooled async connections; aiosqlite keeps a thread per connection
+    if async_engine is not None:
+        await async_engine.dispose()
 
 # Create the FastAPI app
 app = FastAPI(
     title="Construction Inspection API",
     description="API for managing construction inspections and photos",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan,
+    # Responses are converted to JSON types by pydantic/jsonable_encoder as before;
+    # orjson only replaces the stdlib json.dumps step, so the bytes are unchanged
+    default_response_class=ORJSONResponse,
 )
 
+# Oversized uploads are refused before Starlette spools their body to disk;
+# added before CORS so that its 413 still carries the CORS headers
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -31,16 +51,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Content-Range"],
 )
 
-# Mount static files
-os.makedirs("app/static", exist_ok=True)
-app.mount("/app/static", StaticFiles(directory="app/static"), name="static")
+# Uploaded PDFs and photos keep their /app/static URLs but are served with
+# immutable caching and range support; this route must precede the mount
+app.include_router(files.router, prefix="/app/static/uploads", tags=["files"], include_in_schema=False)
+
+# Mount static files; the directory is checked per request rather than at startup
+app.mount("/app/static", StaticFiles(directory="app/static", check_dir=False), name="static")
 
 # Include routers
 app.include_router(projects.router, prefix="/api", tags=["projects"])
 app.include_router(inspections.router, prefix="/api", tags=["inspections"])
 app.include_router(photos.router, prefix="/api", tags=["photos"])
+app.include_router(jobs.router, prefix="/api", tags=["jobs"])
+app.include_router(internal.router, prefix="/internal", tags=["internal"], include_in_schema=False)
 
 @app.get("/")
 async def root():
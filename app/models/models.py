@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Text, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Text, Enum, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
@@ -12,6 +12,12 @@ class ResultEnum(enum.Enum):
     PASS = "合格"
     FAIL = "不合格"
 
+class JobStatusEnum(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class Project(Base):
     __tablename__ = "projects"
     
@@ -21,12 +27,20 @@ class Project(Base):
     contractor = Column(String(100), nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    owner = Column(String(100), nullable=False)
+    owner = Column(String(100), nullable=False, index=True)
+    # The consolidated report of every inspection, built by a project_report job
+    report_pdf_path = Column(String(255), nullable=True)
+    report_pdf_size = Column(BigInteger, nullable=True)
+    report_render_key = Column(String(64), nullable=True)
     
     inspections = relationship("ConstructionInspection", back_populates="project")
 
 class ConstructionInspection(Base):
     __tablename__ = "construction_inspections"
+    __table_args__ = (
+        # Serves the project filter and its (inspection_date, id) list order
+        Index("ix_construction_inspections_project_id_inspection_date", "project_id", "inspection_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
@@ -38,6 +52,11 @@ class ConstructionInspection(Base):
     result = Column(String(20), nullable=False)
     remark = Column(Text, nullable=True)
     pdf_path = Column(String(255), nullable=True)
+    pdf_size = Column(BigInteger, nullable=True)
+    pdf_render_key = Column(String(64), nullable=True)
+    # The PDF with the inspection photos appended, built by POST /inspections/{id}/merge-pdf
+    merged_pdf_path = Column(String(255), nullable=True)
+    merged_pdf_size = Column(BigInteger, nullable=True)
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
@@ -46,11 +65,53 @@ class ConstructionInspection(Base):
 
 class InspectionPhoto(Base):
     __tablename__ = "inspection_photos"
+    __table_args__ = (
+        # Serves the inspection filter and its (capture_date, id) list order
+        Index("ix_inspection_photos_inspection_id_capture_date", "inspection_id", "capture_date"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     inspection_id = Column(Integer, ForeignKey("construction_inspections.id"), nullable=False)
     photo_path = Column(String(255), nullable=False)
     capture_date = Column(Date, nullable=False)
     caption = Column(String(255), nullable=True)
+    content_hash = Column(String(64), nullable=True, index=True)
+    file_size = Column(BigInteger, nullable=True)
     
     inspection = relationship("ConstructionInspection", back_populates="photos")
+
+class PhotoBlob(Base):
+    """A stored photo file shared by every InspectionPhoto with the same content"""
+    __tablename__ = "photo_blobs"
+    
+    content_hash = Column(String(64), primary_key=True)
+    path = Column(String(255), nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=func.now())
+
+class Job(Base):
+    """A unit of background work, shared by every API worker through the database"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Finds the earlier jobs for the same work without comparing payload text
+        Index("ix_jobs_kind_payload_key", "kind", "payload_key"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(50), nullable=False)
+    status = Column(String(20), nullable=False, default=JobStatusEnum.QUEUED.value, index=True)
+    payload = Column(Text, nullable=True)
+    # SHA-256 of the payload (see app.services.jobs.job_payload_key)
+    payload_key = Column(String(64), nullable=True)
+    result = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100), nullable=True)
+    # Units of work finished out of the total, for jobs that report progress
+    progress_done = Column(Integer, nullable=True)
+    progress_total = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    # Renewed by the worker while the job runs; a stale heartbeat means the worker is gone
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
@@ -2,6 +2,9 @@ from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 from datetime import date, datetime
 
+# Largest batch accepted by the bulk create endpoints
+MAX_BULK_ITEMS = 500
+
 # Project schemas
 class ProjectBase(BaseModel):
     name: str
@@ -16,6 +19,7 @@ class ProjectCreate(ProjectBase):
 
 class Project(ProjectBase):
     id: int
+    report_pdf_path: Optional[str] = None
     
     model_config = ConfigDict(from_attributes=True)
 
@@ -43,6 +47,7 @@ class InspectionUpdate(BaseModel):
 class Inspection(InspectionBase):
     id: int
     pdf_path: Optional[str] = None
+    merged_pdf_path: Optional[str] = None
     created_at: datetime
     updated_at: datetime
     
@@ -58,6 +63,11 @@ class PhotoBase(BaseModel):
 class PhotoCreate(PhotoBase):
     pass
 
+class StoredPhotoCreate(PhotoCreate):
+    """A photo whose file the server stored and hashed itself; never a request body"""
+    content_hash: Optional[str] = None
+    file_size: Optional[int] = None
+
 class PhotoUpdate(BaseModel):
     photo_path: Optional[str] = None
     capture_date: Optional[date] = None
@@ -66,6 +76,8 @@ class PhotoUpdate(BaseModel):
     model_config = ConfigDict(from_attributes=True, populate_by_name=True)
 
 class Photo(PhotoBase):
+    content_hash: Optional[str] = None
+    file_size: Optional[int] = None
     id: int
     
     model_config = ConfigDict(from_attributes=True)
@@ -80,3 +92,38 @@ class ProjectWithInspections(Project):
     inspections: List[Inspection] = []
     
     model_config = ConfigDict(from_attributes=True)
+
+# Bulk schemas
+class InspectionBulkCreate(BaseModel):
+    items: List[InspectionCreate] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class PhotoBulkCreate(BaseModel):
+    items: List[PhotoCreate] = Field(..., min_length=1, max_length=MAX_BULK_ITEMS)
+
+class BulkCreateResult(BaseModel):
+    ids: List[int]
+
+class PhotoUploadResult(BaseModel):
+    filename: Optional[str] = None
+    photo_id: Optional[int] = None
+    error: Optional[str] = None
+
+class PhotoBatchUploadResult(BaseModel):
+    created_count: int
+    failed_count: int
+    items: List[PhotoUploadResult]
+
+# Job schemas
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    attempts: int
+    error: Optional[str] = None
+    progress_done: Optional[int] = None
+    progress_total: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,78 @@
+"""
+Read-only crud variants for the hot list/detail endpoints.
+
+Each function takes either an AsyncSession, so the query runs on the event
+loop without holding a threadpool worker, or a regular Session when no async
+driver is configured, in which case the sync query runs in the threadpool.
+Results and errors match the functions of the same name in crud.
+"""
+from typing import Optional, Union
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+from starlette.concurrency import run_in_threadpool
+from app.models.models import Project, ConstructionInspection, InspectionPhoto
+from app.services.crud import read_options, PROJECT_ORDER, INSPECTION_ORDER, PHOTO_ORDER
+from app.utils.pagination import page_query
+
+ReadSession = Union[AsyncSession, Session]
+
+async def _all(db: ReadSession, stmt):
+    if isinstance(db, AsyncSession):
+        return (await db.scalars(stmt)).all()
+    return await run_in_threadpool(lambda: db.scalars(stmt).all())
+
+async def _first(db: ReadSession, stmt):
+    if isinstance(db, AsyncSession):
+        return (await db.scalars(stmt)).first()
+    return await run_in_threadpool(lambda: db.scalars(stmt).first())
+
+# Project reads
+async def get_projects(db: ReadSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                       owner: Optional[str] = None):
+    stmt = select(Project).options(*read_options())
+    if owner:
+        stmt = stmt.where(Project.owner == owner)
+    return await _all(db, page_query(stmt, PROJECT_ORDER, skip=skip, limit=limit, cursor=cursor))
+
+async def get_project_with_inspections(db: ReadSession, project_id: int):
+    stmt = select(Project).options(
+        *read_options(selectinload(Project.inspections))
+    ).where(Project.id == project_id)
+    project = await _first(db, stmt)
+    if not project:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
+
+# Inspection reads
+async def get_inspections(db: ReadSession, skip: int = 0, limit: int = 100, project_id: Optional[int] = None,
+                          cursor: Optional[str] = None):
+    stmt = select(ConstructionInspection).options(*read_options())
+    if project_id:
+        stmt = stmt.where(ConstructionInspection.project_id == project_id)
+    return await _all(db, page_query(stmt, INSPECTION_ORDER, skip=skip, limit=limit, cursor=cursor))
+
+async def get_inspection_with_photos(db: ReadSession, inspection_id: int):
+    stmt = select(ConstructionInspection).options(
+        *read_options(selectinload(ConstructionInspection.photos))
+    ).where(ConstructionInspection.id == inspection_id)
+    inspection = await _first(db, stmt)
+    if not inspection:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inspection not found")
+    return inspection
+
+# Photo reads
+async def get_photos(db: ReadSession, skip: int = 0, limit: int = 100, inspection_id: Optional[int] = None,
+                     cursor: Optional[str] = None):
+    stmt = select(InspectionPhoto).options(*read_options())
+    if inspection_id:
+        stmt = stmt.where(InspectionPhoto.inspection_id == inspection_id)
+    return await _all(db, page_query(stmt, PHOTO_ORDER, skip=skip, limit=limit, cursor=cursor))
+
+async def get_photo(db: ReadSession, photo_id: int):
+    stmt = select(InspectionPhoto).options(*read_options()).where(InspectionPhoto.id == photo_id)
+    photo = await _first(db, stmt)
+    if not photo:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
+    return photo
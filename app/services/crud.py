@@ -1,18 +1,51 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload, raiseload
 from fastapi import HTTPException, status
-from typing import List, Optional
-from app.models.models import Project, ConstructionInspection, InspectionPhoto
+from typing import Iterable, List, Optional, Tuple
+from collections import Counter
+from app.models.models import Project, ConstructionInspection, InspectionPhoto, PhotoBlob
 from app.schemas import schemas
+from app.utils.image_utils import derived_image_paths
+from app.utils.file_utils import is_upload_path, resolve_stored_photo_path, settle_photo_upload
+from app.utils.pagination import paginate
+from app.utils.response_cache import response_cache, project_tag
+from app.services.ownership import ensure_owner, invalidate_project_owner
+from app.services.file_cleanup import schedule_file_deletions, schedule_photo_deletions, photo_file_in_use
 from datetime import date
 import os
 
+# Raise instead of lazy loading any relationship a read query did not load
+# up front, so a new N+1 fails loudly (enabled in the test suite)
+STRICT_LOADING = os.getenv("DB_STRICT_LOADING", "0") == "1"
+
+def read_options(*options):
+    """Loader options for a read query, closed off with raiseload in strict mode"""
+    if STRICT_LOADING:
+        return [*options, raiseload("*")]
+    return list(options)
+
+# Stable list orders; the trailing primary key makes each order total so
+# keyset cursors never skip or repeat rows
+PROJECT_ORDER = (Project.id,)
+INSPECTION_ORDER = (ConstructionInspection.inspection_date, ConstructionInspection.id)
+PHOTO_ORDER = (InspectionPhoto.capture_date, InspectionPhoto.id)
+
+# Set-based writes skip matching their rows against the session; the commit
+# that follows expires whatever the session still holds
+BULK_OPTIONS = {"synchronize_session": False}
+
 # Project CRUD operations
-def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(Project).offset(skip).limit(limit).all()
+def get_projects(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
+    query = db.query(Project).options(*read_options())
+    return paginate(query, PROJECT_ORDER, skip=skip, limit=limit, cursor=cursor)
 
-def get_projects_by_owner(db: Session, owner: str, skip: int = 0, limit: int = 100):
+def get_projects_by_owner(db: Session, owner: str, skip: int = 0, limit: int = 100, cursor: Optional[str] = None):
     """Get projects filtered by owner"""
-    return db.query(Project).filter(Project.owner == owner).offset(skip).limit(limit).all()
+    query = db.query(Project).options(*read_options()).filter(Project.owner == owner)
+    return paginate(query, PROJECT_ORDER, skip=skip, limit=limit, cursor=cursor)
 
 def get_project(db: Session, project_id: int):
     project = db.query(Project).filter(Project.id == project_id).first()
@@ -20,6 +53,15 @@ def get_project(db: Session, project_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
     return project
 
+def get_project_with_inspections(db: Session, project_id: int):
+    """Get a project shaped for ProjectWithInspections, loading its inspections in one extra query"""
+    project = db.query(Project).options(
+        *read_options(selectinload(Project.inspections))
+    ).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
+
 def create_project(db: Session, project: schemas.ProjectCreate):
     db_project = Project(**project.model_dump())
     db.add(db_project)
@@ -27,33 +69,66 @@ def create_project(db: Session, project: schemas.ProjectCreate):
     db.refresh(db_project)
     return db_project
 
-def update_project(db: Session, project_id: int, project: schemas.ProjectCreate):
+def update_project(db: Session, project_id: int, project: schemas.ProjectCreate, owner: Optional[str] = None):
+    """Update a project; if owner is given it must own the row as currently stored"""
     db_project = get_project(db, project_id)
+    if owner is not None:
+        ensure_owner(db_project.owner, owner)
     for key, value in project.model_dump().items():
         setattr(db_project, key, value)
     db.commit()
+    response_cache.invalidate(project_tag(project_id))
+    invalidate_project_owner(project_id)
     db.refresh(db_project)
     return db_project
 
-def delete_project(db: Session, project_id: int):
+def delete_project(db: Session, project_id: int, owner: Optional[str] = None):
+    """
+    Delete a project with its inspections and photos in one transaction.
+    
+    Rows are removed with a few set-based DELETE statements; the files they
+    referenced are handed to the background deletion queue after the commit.
+    If owner is given it must own the row as currently stored.
+    """
     db_project = get_project(db, project_id)
+    if owner is not None:
+        ensure_owner(db_project.owner, owner)
+    # Keep the loaded row as the response; the bulk DELETE bypasses the session
+    db.expunge(db_project)
     
-    # Get all inspections for this project to delete their files
-    inspections = db.query(ConstructionInspection).filter(ConstructionInspection.project_id == project_id).all()
-    for inspection in inspections:
-        # Delete inspection files (including associated photos)
-        delete_inspection(db, inspection.id)
+    pdf_paths, photo_paths, legacy_paths = _delete_inspections(db, ConstructionInspection.project_id == project_id)
+    db.execute(delete(Project).where(Project.id == project_id), execution_options=BULK_OPTIONS)
+    db.commit()
+    response_cache.invalidate(project_tag(project_id))
+    invalidate_project_owner(project_id)
+    
+    schedule_file_deletions(pdf_paths + legacy_paths + [db_project.report_pdf_path])
+    schedule_photo_deletions(photo_paths)
+    return db_project
+
+def set_project_report(db: Session, project_id: int, report_pdf_path: str, report_pdf_size: Optional[int],
+                       report_render_key: str):
+    """Attach a consolidated report to a project, removing the one it replaces"""
+    db_project = get_project(db, project_id)
+    previous_path = db_project.report_pdf_path
+    db_project.report_pdf_path = report_pdf_path
+    db_project.report_pdf_size = report_pdf_size
+    db_project.report_render_key = report_render_key
     
-    db.delete(db_project)
     db.commit()
+    response_cache.invalidate(project_tag(project_id))
+    if previous_path and previous_path != report_pdf_path:
+        schedule_file_deletions([previous_path])
+    db.refresh(db_project)
     return db_project
 
 # Inspection CRUD operations
-def get_inspections(db: Session, skip: int = 0, limit: int = 100, project_id: Optional[int] = None):
-    query = db.query(ConstructionInspection)
+def get_inspections(db: Session, skip: int = 0, limit: int = 100, project_id: Optional[int] = None,
+                    cursor: Optional[str] = None):
+    query = db.query(ConstructionInspection).options(*read_options())
     if project_id:
         query = query.filter(ConstructionInspection.project_id == project_id)
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, INSPECTION_ORDER, skip=skip, limit=limit, cursor=cursor)
 
 def get_inspection(db: Session, inspection_id: int):
     inspection = db.query(ConstructionInspection).filter(ConstructionInspection.id == inspection_id).first()
@@ -61,20 +136,42 @@ def get_inspection(db: Session, inspection_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inspection not found")
     return inspection
 
+def get_inspection_with_photos(db: Session, inspection_id: int):
+    """Get an inspection shaped for InspectionWithPhotos, loading its photos in one extra query"""
+    inspection = db.query(ConstructionInspection).options(
+        *read_options(selectinload(ConstructionInspection.photos))
+    ).filter(ConstructionInspection.id == inspection_id).first()
+    if not inspection:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inspection not found")
+    return inspection
+
 def create_inspection(db: Session, inspection: schemas.InspectionCreate):
     db_inspection = ConstructionInspection(**inspection.model_dump())
     db.add(db_inspection)
     db.commit()
+    response_cache.invalidate(project_tag(inspection.project_id))
     db.refresh(db_inspection)
     return db_inspection
 
-def update_inspection(db: Session, inspection_id: int, inspection_update: schemas.InspectionUpdate):
+def create_inspections_bulk(db: Session, inspections: List[schemas.InspectionCreate]) -> List[int]:
+    """Create a batch of inspections in one transaction and return their ids in input order"""
+    rows = [inspection.model_dump() for inspection in inspections]
+    _require_existing(db, Project, {row["project_id"] for row in rows}, "Project not found")
+    
+    ids = _insert_many(db, ConstructionInspection, rows)
+    db.commit()
+    response_cache.invalidate(*{project_tag(row["project_id"]) for row in rows})
+    return ids
+
+def update_inspection(db: Session, inspection_id: int, inspection_update: schemas.InspectionUpdate,
+                      pdf_render_key: Optional[str] = None, pdf_size: Optional[int] = None):
     db_inspection = get_inspection(db, inspection_id)
     
     # If updating the PDF path and there's an existing PDF, delete the old one
     update_data = inspection_update.model_dump(exclude_unset=True)
-    if 'pdf_path' in update_data and update_data['pdf_path'] is not None and db_inspection.pdf_path:
-        if os.path.exists(db_inspection.pdf_path):
+    if 'pdf_path' in update_data and update_data['pdf_path'] is not None and db_inspection.pdf_path \
+            and update_data['pdf_path'] != db_inspection.pdf_path:
+        if is_upload_path(db_inspection.pdf_path) and os.path.exists(db_inspection.pdf_path):
             try:
                 os.remove(db_inspection.pdf_path)
             except (OSError, PermissionError) as e:
@@ -83,42 +180,95 @@ def update_inspection(db: Session, inspection_id: int, inspection_update: schema
     
     for key, value in update_data.items():
         setattr(db_inspection, key, value)
+    
+    # Only a generated report carries a render key; any other PDF clears it
+    stale_merged_pdf = None
+    if 'pdf_path' in update_data:
+        db_inspection.pdf_render_key = pdf_render_key
+        db_inspection.pdf_size = pdf_size
+        # A merge of the previous PDF no longer matches the inspection
+        stale_merged_pdf = db_inspection.merged_pdf_path
+        db_inspection.merged_pdf_path = None
+        db_inspection.merged_pdf_size = None
+    
+    project_id = db_inspection.project_id
     db.commit()
+    response_cache.invalidate(project_tag(project_id))
+    if stale_merged_pdf:
+        schedule_file_deletions([stale_merged_pdf])
     db.refresh(db_inspection)
     return db_inspection
 
-def delete_inspection(db: Session, inspection_id: int):
+def set_merged_pdf(db: Session, inspection_id: int, merged_pdf_path: str, merged_pdf_size: Optional[int] = None):
+    """Attach a merged PDF to an inspection, removing the one it replaces"""
     db_inspection = get_inspection(db, inspection_id)
+    previous_path = db_inspection.merged_pdf_path
+    db_inspection.merged_pdf_path = merged_pdf_path
+    db_inspection.merged_pdf_size = merged_pdf_size
     
-    # Delete the PDF file if it exists
-    if db_inspection.pdf_path and os.path.exists(db_inspection.pdf_path):
-        try:
-            os.remove(db_inspection.pdf_path)
-        except (OSError, PermissionError) as e:
-            # Log the error but continue with the deletion
-            print(f"Error deleting PDF file {db_inspection.pdf_path}: {e}")
-    
-    # Get all photos for this inspection to delete their files
-    photos = db.query(InspectionPhoto).filter(InspectionPhoto.inspection_id == inspection_id).all()
-    for photo in photos:
-        # Delete photo files
-        if photo.photo_path and os.path.exists(photo.photo_path):
-            try:
-                os.remove(photo.photo_path)
-            except (OSError, PermissionError) as e:
-                # Log the error but continue with the deletion
-                print(f"Error deleting photo file {photo.photo_path}: {e}")
+    db.commit()
+    response_cache.invalidate(project_tag(db_inspection.project_id))
+    if previous_path and previous_path != merged_pdf_path:
+        schedule_file_deletions([previous_path])
+    db.refresh(db_inspection)
+    return db_inspection
+
+def delete_inspection(db: Session, inspection_id: int):
+    """Delete an inspection and its photos; files are removed in the background after the commit"""
+    db_inspection = get_inspection(db, inspection_id)
+    db.expunge(db_inspection)
     
-    db.delete(db_inspection)
+    pdf_paths, photo_paths, legacy_paths = _delete_inspections(db, ConstructionInspection.id == inspection_id)
     db.commit()
+    response_cache.invalidate(project_tag(db_inspection.project_id))
+    
+    schedule_file_deletions(pdf_paths + legacy_paths)
+    schedule_photo_deletions(photo_paths)
     return db_inspection
 
+def _delete_inspections(db: Session, condition) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Delete the inspections matching condition and their photos without
+    loading them as objects, releasing their photo blob references.
+    
+    Does not commit. Returns the PDF and merged PDF paths, the stored photo paths whose last
+    reference is gone and the paths of photos stored before deduplication,
+    for the caller to remove once the transaction has committed.
+    """
+    inspection_ids = select(ConstructionInspection.id).where(condition)
+    pdf_paths = [
+        path
+        for row in db.query(ConstructionInspection.pdf_path, ConstructionInspection.merged_pdf_path).filter(condition)
+        for path in row
+        if path
+    ]
+    
+    hashes = Counter()
+    legacy_paths = []
+    photo_rows = db.query(InspectionPhoto.content_hash, InspectionPhoto.photo_path).filter(
+        InspectionPhoto.inspection_id.in_(inspection_ids)
+    )
+    for content_hash, photo_path in photo_rows:
+        if content_hash:
+            hashes[content_hash] += 1
+        elif photo_path:
+            legacy_paths.append(photo_path)
+    
+    photo_paths = _release_photo_blobs(db, hashes)
+    db.execute(
+        delete(InspectionPhoto).where(InspectionPhoto.inspection_id.in_(inspection_ids)),
+        execution_options=BULK_OPTIONS
+    )
+    db.execute(delete(ConstructionInspection).where(condition), execution_options=BULK_OPTIONS)
+    return pdf_paths, photo_paths, legacy_paths
+
 # Photo CRUD operations
-def get_photos(db: Session, skip: int = 0, limit: int = 100, inspection_id: Optional[int] = None):
-    query = db.query(InspectionPhoto)
+def get_photos(db: Session, skip: int = 0, limit: int = 100, inspection_id: Optional[int] = None,
+               cursor: Optional[str] = None):
+    query = db.query(InspectionPhoto).options(*read_options())
     if inspection_id:
         query = query.filter(InspectionPhoto.inspection_id == inspection_id)
-    return query.offset(skip).limit(limit).all()
+    return paginate(query, PHOTO_ORDER, skip=skip, limit=limit, cursor=cursor)
 
 def get_photo(db: Session, photo_id: int):
     photo = db.query(InspectionPhoto).filter(InspectionPhoto.id == photo_id).first()
@@ -126,43 +276,278 @@ def get_photo(db: Session, photo_id: int):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Photo not found")
     return photo
 
-def create_photo(db: Session, photo: schemas.PhotoCreate):
+def create_photo(db: Session, photo: schemas.StoredPhotoCreate, upload_path: Optional[str] = None):
+    """
+    Create a photo record; upload_path is the kept copy of an upload whose
+    content was already stored (see save_photo_file)
+    """
     db_photo = InspectionPhoto(**photo.model_dump())
+    
+    # Content-addressed photos share one file; point at the stored copy
+    duplicate_path = None
+    if db_photo.content_hash:
+        stored_path = acquire_photo_blob(db, db_photo.content_hash, db_photo.photo_path)
+        if stored_path != db_photo.photo_path:
+            duplicate_path = db_photo.photo_path
+            db_photo.photo_path = stored_path
+    
     db.add(db_photo)
     db.commit()
     db.refresh(db_photo)
+    
+    if upload_path:
+        settle_photo_upload(upload_path, db_photo.photo_path)
+    elif duplicate_path:
+        remove_file(duplicate_path)
     return db_photo
 
+def create_photos_bulk(db: Session, photos: List[schemas.StoredPhotoCreate],
+                       upload_paths: Optional[List[Optional[str]]] = None) -> List[int]:
+    """
+    Create a batch of photo records for uploads the server stored itself and
+    return their ids in input order; upload_paths holds the kept copy of each
+    upload whose content was already stored, by position
+    """
+    rows = [photo.model_dump() for photo in photos]
+    _require_existing(db, ConstructionInspection, {row["inspection_id"] for row in rows}, "Inspection not found")
+    upload_paths = upload_paths or [None] * len(rows)
+    # Files that existed before these uploads are not theirs to remove
+    kept_paths = {photo.photo_path for photo, upload_path in zip(photos, upload_paths) if upload_path}
+    
+    duplicate_paths = acquire_photo_blobs(db, rows)
+    ids = _insert_many(db, InspectionPhoto, rows)
+    db.commit()
+    
+    for row, upload_path in zip(rows, upload_paths):
+        settle_photo_upload(upload_path, row["photo_path"])
+    for duplicate_path in duplicate_paths:
+        if duplicate_path not in kept_paths:
+            remove_file(duplicate_path)
+    return ids
+
+def create_client_photos_bulk(db: Session, photos: List[schemas.PhotoCreate]) -> List[int]:
+    """
+    Create a batch of photo records for files a client names by path and
+    return their ids in input order.
+    
+    Every path must name a stored photo; the content hash and size are taken
+    from the server's own records, and the named files are never moved or
+    removed here.
+    """
+    rows = [photo.model_dump() for photo in photos]
+    _require_existing(db, ConstructionInspection, {row["inspection_id"] for row in rows}, "Inspection not found")
+    
+    for row in rows:
+        row["photo_path"] = resolve_stored_photo_path(row["photo_path"])
+    blob_hashes = _blob_hashes_by_path(db, {row["photo_path"] for row in rows})
+    for row in rows:
+        row["content_hash"] = blob_hashes.get(row["photo_path"])
+        row["file_size"] = os.path.getsize(row["photo_path"])
+    
+    # Each row already points at its blob's own path, so nothing becomes redundant
+    acquire_photo_blobs(db, rows)
+    ids = _insert_many(db, InspectionPhoto, rows)
+    db.commit()
+    return ids
+
 def update_photo(db: Session, photo_id: int, photo_update: schemas.PhotoUpdate):
     db_photo = get_photo(db, photo_id)
     
     # If updating the photo path and there's an existing photo, delete the old one
     update_data = photo_update.model_dump(exclude_unset=True)
-    if 'photo_path' in update_data and update_data['photo_path'] is not None and db_photo.photo_path:
-        if os.path.exists(db_photo.photo_path):
-            try:
-                os.remove(db_photo.photo_path)
-            except (OSError, PermissionError) as e:
-                # Log the error but continue with the update
-                print(f"Error deleting photo file {db_photo.photo_path}: {e}")
+    released_path = None
+    if 'photo_path' in update_data and update_data['photo_path'] is not None:
+        # Clients may only point a photo at a file the server stored
+        update_data['photo_path'] = resolve_stored_photo_path(update_data['photo_path'])
+    if 'photo_path' in update_data and update_data['photo_path'] is not None and db_photo.photo_path \
+            and update_data['photo_path'] != db_photo.photo_path:
+        if db_photo.content_hash:
+            # Drop the reference to the previous shared file
+            released_path = release_photo_blob(db, db_photo.content_hash)
+        elif not photo_file_in_use(db, db_photo.photo_path, photo_id):
+            remove_file(db_photo.photo_path)
+        
+        new_hash = _blob_hashes_by_path(db, [update_data['photo_path']]).get(update_data['photo_path'])
+        if new_hash:
+            acquire_photo_blob(db, new_hash, update_data['photo_path'])
+        db_photo.content_hash = new_hash
+        db_photo.file_size = os.path.getsize(update_data['photo_path'])
     
     for key, value in update_data.items():
         setattr(db_photo, key, value)
     db.commit()
     db.refresh(db_photo)
+    
+    # A new upload of the same photo may have claimed the file since the commit
+    if released_path and not photo_file_in_use(db, released_path):
+        remove_photo_files(released_path)
     return db_photo
 
 def delete_photo(db: Session, photo_id: int):
     db_photo = get_photo(db, photo_id)
     
-    # Delete the photo file if it exists
-    if db_photo.photo_path and os.path.exists(db_photo.photo_path):
-        try:
-            os.remove(db_photo.photo_path)
-        except (OSError, PermissionError) as e:
-            # Log the error but continue with the deletion
-            print(f"Error deleting photo file {db_photo.photo_path}: {e}")
+    released_path = None
+    if db_photo.content_hash:
+        # Only the last reference to a shared photo removes the file
+        released_path = release_photo_blob(db, db_photo.content_hash)
+    elif db_photo.photo_path and not photo_file_in_use(db, db_photo.photo_path, photo_id):
+        # Delete the photo file unless another record still shows it
+        remove_file(db_photo.photo_path)
     
     db.delete(db_photo)
     db.commit()
+    
+    # A new upload of the same photo may have claimed the file since the commit
+    if released_path and not photo_file_in_use(db, released_path):
+        remove_photo_files(released_path)
     return db_photo
+
+# Photo blob reference counting
+def acquire_photo_blob(db: Session, content_hash: str, photo_path: str) -> str:
+    """
+    Add a reference to the stored photo with the given content hash.
+    
+    Creates the blob record on first use. Returns the path of the stored file,
+    which differs from photo_path when the content was first stored under
+    another name (e.g. a different file extension).
+    """
+    return _upsert_photo_blobs(db, {content_hash: photo_path}, Counter([content_hash]))[content_hash]
+
+def acquire_photo_blobs(db: Session, rows: List[dict]) -> List[str]:
+    """
+    Add a reference for every content-addressed row in a batch of photo rows.
+    
+    Adds all references with one upsert and points each row's photo_path at
+    the stored copy. Returns the paths that became redundant, for the caller
+    to remove after committing.
+    """
+    hashes = Counter(row["content_hash"] for row in rows if row.get("content_hash"))
+    if not hashes:
+        return []
+    
+    first_paths = {}
+    for row in rows:
+        if row.get("content_hash"):
+            first_paths.setdefault(row["content_hash"], row["photo_path"])
+    stored_paths = _upsert_photo_blobs(db, first_paths, hashes)
+    
+    duplicate_paths = set()
+    for row in rows:
+        content_hash = row.get("content_hash")
+        if content_hash and row["photo_path"] != stored_paths[content_hash]:
+            duplicate_paths.add(row["photo_path"])
+            row["photo_path"] = stored_paths[content_hash]
+    return sorted(duplicate_paths)
+
+def release_photo_blob(db: Session, content_hash: str) -> Optional[str]:
+    """
+    Drop a reference to the stored photo with the given content hash.
+    
+    Returns the file path once the last reference is gone, so the caller can
+    remove the file after committing; otherwise returns None.
+    """
+    paths = _release_photo_blobs(db, Counter([content_hash]))
+    return paths[0] if paths else None
+
+# Dialects whose INSERT can add to an existing row instead of failing
+UPSERT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+    "mysql": mysql_insert,
+}
+
+def _upsert_photo_blobs(db: Session, paths: dict, counts: Counter) -> dict:
+    """
+    Add the given number of references to each photo blob with one upsert,
+    creating missing blobs at the given paths, and return every blob's stored
+    path by content hash.
+    
+    A SELECT ... FOR UPDATE locks nothing for a blob that does not exist yet,
+    so two uploads of new content would both insert it; the upsert lets the
+    database settle that instead.
+    """
+    rows = [
+        {"content_hash": content_hash, "path": paths[content_hash], "ref_count": count}
+        for content_hash, count in counts.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    statement = UPSERT_INSERTS[dialect](PhotoBlob).values(rows)
+    if dialect == "mysql":
+        statement = statement.on_duplicate_key_update(ref_count=PhotoBlob.ref_count + statement.inserted.ref_count)
+    else:
+        statement = statement.on_conflict_do_update(
+            index_elements=[PhotoBlob.content_hash],
+            set_={"ref_count": PhotoBlob.ref_count + statement.excluded.ref_count}
+        )
+    db.execute(statement)
+    return dict(db.query(PhotoBlob.content_hash, PhotoBlob.path).filter(PhotoBlob.content_hash.in_(counts)))
+
+def _blob_hashes_by_path(db: Session, paths: Iterable[str]) -> dict:
+    """Map the given stored photo paths to the content hash of their blob"""
+    return dict(db.query(PhotoBlob.path, PhotoBlob.content_hash).filter(PhotoBlob.path.in_(set(paths))))
+
+def _release_photo_blobs(db: Session, hashes: Counter) -> List[str]:
+    """
+    Drop the given number of references from each photo blob with one UPDATE
+    per distinct count, delete the blobs left unreferenced and return their
+    file paths.
+    """
+    if not hashes:
+        return []
+    
+    by_count = {}
+    for content_hash, count in hashes.items():
+        by_count.setdefault(count, []).append(content_hash)
+    for count, content_hashes in by_count.items():
+        db.execute(
+            update(PhotoBlob)
+            .where(PhotoBlob.content_hash.in_(content_hashes))
+            .values(ref_count=PhotoBlob.ref_count - count),
+            execution_options=BULK_OPTIONS
+        )
+    
+    unreferenced = and_(PhotoBlob.content_hash.in_(hashes), PhotoBlob.ref_count <= 0)
+    paths = [path for (path,) in db.query(PhotoBlob.path).filter(unreferenced)]
+    db.execute(delete(PhotoBlob).where(unreferenced), execution_options=BULK_OPTIONS)
+    return paths
+
+# Bulk helpers
+def _require_existing(db: Session, model, ids: Iterable[int], detail: str):
+    """Raise 404 naming the ids in the batch that have no matching row"""
+    ids = set(ids)
+    found = {row_id for (row_id,) in db.query(model.id).filter(model.id.in_(ids))}
+    missing = sorted(ids - found)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"{detail}: {', '.join(str(row_id) for row_id in missing)}"
+        )
+
+def _insert_many(db: Session, model, rows: List[dict]) -> List[int]:
+    """Insert rows as one executemany batch and return the new ids in input order"""
+    dialect = db.get_bind().dialect
+    if dialect.insert_executemany_returning_sort_by_parameter_order:
+        result = db.execute(insert(model).returning(model.id, sort_by_parameter_order=True), rows)
+        return list(result.scalars())
+    
+    # Without batched RETURNING (e.g. MySQL) let the unit of work collect the ids
+    objects = [model(**row) for row in rows]
+    db.add_all(objects)
+    db.flush()
+    return [obj.id for obj in objects]
+
+def remove_file(file_path: str):
+    """Delete an uploaded file from disk, logging instead of raising on failure"""
+    if not file_path or not is_upload_path(file_path):
+        return
+    if os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except (OSError, PermissionError) as e:
+            print(f"Error deleting file {file_path}: {e}")
+
+def remove_photo_files(photo_path: str):
+    """Delete a stored photo together with its thumbnails and cached PDF images"""
+    remove_file(photo_path)
+    for derivative_path in derived_image_paths(photo_path):
+        remove_file(derivative_path)
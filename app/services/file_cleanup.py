@@ -0,0 +1,160 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from typing import Callable, Iterable, Optional
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.models import InspectionPhoto, PhotoBlob
+from app.utils.image_utils import derived_image_paths
+from app.utils.file_utils import is_upload_path
+
+# Attempts per file before it is left to the orphan collector
+FILE_DELETE_MAX_ATTEMPTS = int(os.getenv("FILE_DELETE_MAX_ATTEMPTS", "5"))
+# Delay before the first retry; doubled after every failed attempt
+FILE_DELETE_RETRY_SECONDS = float(os.getenv("FILE_DELETE_RETRY_SECONDS", "2"))
+
+class FileDeletionQueue:
+    """
+    Deletes files on a background thread after the database rows that
+    referenced them are gone, so API requests return as soon as they commit.
+
+    Failed deletions (e.g. a file locked by an antivirus scanner on a shared
+    volume) are retried with exponential backoff. A missing file counts as
+    deleted.
+
+    Files scheduled unless_referenced are checked with is_referenced right
+    before every attempt and kept once something points at them again, e.g.
+    a photo uploaded anew while its previous copy waited for deletion.
+    """
+
+    def __init__(self, max_attempts: int = FILE_DELETE_MAX_ATTEMPTS, retry_seconds: float = FILE_DELETE_RETRY_SECONDS,
+                 is_referenced: Optional[Callable[[str], bool]] = None):
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.is_referenced = is_referenced
+        self._pending = []  # heap of (due, sequence, path, attempts, unless_referenced)
+        self._sequence = itertools.count()
+        self._in_progress = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def enqueue(self, paths: Iterable[str], unless_referenced: Optional[str] = None):
+        """Schedule files for deletion, keeping them if unless_referenced is referenced again by then"""
+        now = time.monotonic()
+        with self._condition:
+            for path in paths:
+                if path:
+                    heapq.heappush(self._pending, (now, next(self._sequence), path, 0, unless_referenced))
+            self._ensure_thread()
+            self._condition.notify_all()
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every scheduled deletion has been attempted; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self._pending or self._in_progress:
+                # Retries wait for their backoff; drain runs them right away
+                self._pending = [(0, *entry[1:]) for entry in self._pending]
+                heapq.heapify(self._pending)
+                self._condition.notify_all()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def stop(self, timeout: float = 5):
+        """Finish the deletions that are due and stop the worker thread"""
+        self.drain(timeout)
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self._stopping = False
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="file-cleanup", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopping and (not self._pending or self._pending[0][0] > time.monotonic()):
+                    timeout = self._pending[0][0] - time.monotonic() if self._pending else None
+                    self._condition.wait(timeout)
+                if self._stopping:
+                    return
+                _, _, path, attempts, unless_referenced = heapq.heappop(self._pending)
+                self._in_progress += 1
+
+            error = self._delete_unreferenced(path, unless_referenced)
+
+            with self._condition:
+                self._in_progress -= 1
+                if error is not None:
+                    attempts += 1
+                    if attempts < self.max_attempts:
+                        due = time.monotonic() + self.retry_seconds * 2 ** (attempts - 1)
+                        heapq.heappush(self._pending, (due, next(self._sequence), path, attempts, unless_referenced))
+                    else:
+                        print(f"[WARNING] Giving up deleting {path} after {attempts} attempts: {error}")
+                self._condition.notify_all()
+
+    def _delete_unreferenced(self, path: str, unless_referenced: Optional[str]) -> Optional[Exception]:
+        if unless_referenced is not None and self.is_referenced is not None:
+            try:
+                if self.is_referenced(unless_referenced):
+                    return None
+            except Exception as e:
+                # Without an answer the file is kept and checked again later
+                return e
+        return self._delete(path)
+
+    @staticmethod
+    def _delete(path: str) -> Optional[Exception]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            return e
+        return None
+
+def photo_file_in_use(db: Session, photo_path: str, exclude_photo_id: Optional[int] = None) -> bool:
+    """Whether a photo blob or a photo record (other than exclude_photo_id) points at the stored file"""
+    photos = db.query(InspectionPhoto.id).filter(InspectionPhoto.photo_path == photo_path)
+    if exclude_photo_id is not None:
+        photos = photos.filter(InspectionPhoto.id != exclude_photo_id)
+    blobs = db.query(PhotoBlob.content_hash).filter(PhotoBlob.path == photo_path)
+    return db.query(photos.exists()).scalar() or db.query(blobs.exists()).scalar()
+
+# Opens the sessions the deletion queue checks photo references with
+reference_session_factory = SessionLocal
+
+def _photo_file_referenced(photo_path: str) -> bool:
+    db = reference_session_factory()
+    try:
+        return photo_file_in_use(db, photo_path)
+    finally:
+        db.close()
+
+file_deletion_queue = FileDeletionQueue(is_referenced=_photo_file_referenced)
+
+def schedule_file_deletions(paths: Iterable[str]):
+    """Delete uploaded files in the background; paths outside the upload directories are ignored"""
+    file_deletion_queue.enqueue(path for path in paths if path and is_upload_path(path))
+
+def schedule_photo_deletions(photo_paths: Iterable[str]):
+    """
+    Delete stored photos together with their thumbnails and cached PDF images
+    in the background, unless a photo is referenced again by then
+    """
+    for photo_path in photo_paths:
+        if photo_path and is_upload_path(photo_path):
+            file_deletion_queue.enqueue([photo_path, *derived_image_paths(photo_path)], unless_referenced=photo_path)
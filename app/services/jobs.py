@@ -0,0 +1,599 @@
+import os
+import json
+import glob
+import hashlib
+import socket
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, update
+from sqlalchemy.orm import Session
+from fastapi import HTTPException, status
+from app.db.database import SessionLocal
+from app.models.models import Job, JobStatusEnum, ConstructionInspection, InspectionPhoto
+from app.schemas import schemas
+from app.services import crud
+from app.utils.file_utils import (
+    generate_inspection_pdf, render_report_section, assemble_project_report, ensure_upload_dirs,
+    ReportSection, PDF_UPLOAD_DIR, REPORT_SECTION_DIR
+)
+
+# Job kinds
+INSPECTION_PDF_JOB = "inspection_pdf"
+PROJECT_REPORT_JOB = "project_report"
+
+# Part of every render key; bump it when the report layout changes so that
+# previously cached reports are rendered again
+INSPECTION_PDF_RENDER_VERSION = 2
+
+# Report rendering is CPU bound and gets its own pool, sized independently of
+# the web workers. Every API process has its own pool, so a host runs up to
+# (gunicorn --workers) x PDF_POOL_WORKERS render processes: 4 x 2 = 8 with the
+# Dockerfile's command. Keep that total at or below the cores available.
+PDF_POOL_WORKERS = int(os.getenv("PDF_POOL_WORKERS", "2"))
+
+# Each API process runs one polling worker thread unless disabled
+JOB_WORKER_ENABLED = os.getenv("JOB_WORKER_ENABLED", "1") == "1"
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+
+# A running job whose worker has not renewed its lease for this long is retried
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+# How often a worker renews the lease of the job it runs
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", str(JOB_LEASE_SECONDS / 5)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Finished jobs are deleted this many days after they ended
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool for PDF rendering, creating it on first use"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=PDF_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pdf_pool
+
+def run_in_pdf_executor(executor: Optional[Executor], fn, *args):
+    """Run fn in the given executor, or inline when there is none"""
+    if executor is None:
+        return fn(*args)
+    try:
+        return executor.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A crashed child breaks the pool for good; start a fresh one next time
+        _discard_pdf_pool(executor)
+        raise
+
+def _discard_pdf_pool(executor: Executor):
+    global _pdf_pool
+    if _pdf_pool is executor:
+        _pdf_pool = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+# Job CRUD operations
+def job_payload_key(payload: dict) -> str:
+    """Hash a payload so that jobs for the same work can be found through an index"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def enqueue_job(db: Session, kind: str, payload: dict) -> Job:
+    """Queue a new job and return it"""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(kind=kind, status=JobStatusEnum.QUEUED.value, payload=json.dumps(payload),
+              payload_key=job_payload_key(payload), attempts=0)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_job(db: Session, job_id: int) -> Job:
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return job
+
+def claim_next_job(db: Session, worker_id: str = WORKER_ID) -> Optional[Job]:
+    """
+    Atomically take the oldest queued job for this worker.
+
+    The status check in the UPDATE makes the claim safe across processes:
+    if another worker took the job first no row is updated and the next
+    candidate is tried.
+    """
+    candidate_ids = [
+        job_id for (job_id,) in db.query(Job.id)
+        .filter(Job.status == JobStatusEnum.QUEUED.value)
+        .order_by(Job.id)
+        .limit(10)
+        .all()
+    ]
+
+    for job_id in candidate_ids:
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == JobStatusEnum.QUEUED.value)
+            .values(
+                status=JobStatusEnum.RUNNING.value,
+                worker_id=worker_id,
+                started_at=datetime.now(),
+                heartbeat_at=datetime.now(),
+                attempts=Job.attempts + 1
+            )
+        ).rowcount
+        db.commit()
+        if claimed:
+            return get_job(db, job_id)
+
+    return None
+
+def requeue_stale_jobs(db: Session) -> int:
+    """
+    Recover jobs left running by a worker that died or restarted, i.e. whose
+    heartbeat is older than JOB_LEASE_SECONDS.
+
+    Jobs are queued again until they reach JOB_MAX_ATTEMPTS, after which they
+    are marked as failed. Returns the number of recovered jobs.
+    """
+    cutoff = datetime.now() - timedelta(seconds=JOB_LEASE_SECONDS)
+    stale = (Job.status == JobStatusEnum.RUNNING.value, func.coalesce(Job.heartbeat_at, Job.started_at) < cutoff)
+
+    failed = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= JOB_MAX_ATTEMPTS)
+        .values(status=JobStatusEnum.FAILED.value, error="Worker lost", finished_at=datetime.now())
+    ).rowcount
+    requeued = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts < JOB_MAX_ATTEMPTS)
+        .values(status=JobStatusEnum.QUEUED.value, worker_id=None)
+    ).rowcount
+    db.commit()
+    return failed + requeued
+
+def purge_finished_jobs(db: Session) -> int:
+    """Delete succeeded and failed jobs that ended more than JOB_RETENTION_DAYS ago; returns how many"""
+    cutoff = datetime.now() - timedelta(days=JOB_RETENTION_DAYS)
+    purged = db.execute(
+        delete(Job).where(
+            Job.status.in_([JobStatusEnum.SUCCEEDED.value, JobStatusEnum.FAILED.value]),
+            Job.finished_at < cutoff
+        )
+    ).rowcount
+    db.commit()
+    return purged
+
+def renew_job_lease(db: Session, job_id: int, worker_id: str) -> bool:
+    """Refresh the heartbeat of a job this worker still holds; False once the lease is lost"""
+    renewed = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.worker_id == worker_id, Job.status == JobStatusEnum.RUNNING.value)
+        .values(heartbeat_at=datetime.now())
+    ).rowcount
+    db.commit()
+    return bool(renewed)
+
+class JobHeartbeat(threading.Thread):
+    """Renews the lease of a running job every JOB_HEARTBEAT_SECONDS until stopped"""
+
+    def __init__(self, bind, job_id: int, worker_id: str, interval: float = JOB_HEARTBEAT_SECONDS):
+        super().__init__(name=f"job-heartbeat-{job_id}", daemon=True)
+        self.bind = bind
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join(timeout=5)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            db = Session(bind=self.bind)
+            try:
+                if not renew_job_lease(db, self.job_id, self.worker_id):
+                    return
+            except Exception as e:
+                print(f"[WARNING] Could not renew the lease of job {self.job_id}: {e}")
+            finally:
+                db.close()
+
+def run_job(db: Session, job: Job, executor: Optional[Executor] = None) -> Job:
+    """
+    Run a claimed job and record its outcome.
+
+    The lease is renewed while the handler runs. The outcome is only recorded
+    if this worker still holds the same attempt; a job that was requeued and
+    claimed again in the meantime belongs to its new worker.
+    """
+    handler = JOB_HANDLERS[job.kind]
+    job_id, kind, worker_id, attempts = job.id, job.kind, job.worker_id, job.attempts
+    # Handlers that report progress find their job through the payload
+    payload = dict(json.loads(job.payload or "{}"), job_id=job_id)
+    heartbeat = JobHeartbeat(db.get_bind(), job_id, worker_id)
+    heartbeat.start()
+    try:
+        result = handler(db, payload, executor)
+    except Exception as e:
+        db.rollback()
+        error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        outcome = {"status": JobStatusEnum.FAILED.value, "error": error}
+        print(f"[WARNING] Job {job_id} ({kind}) failed: {error}")
+    else:
+        outcome = {"status": JobStatusEnum.SUCCEEDED.value, "result": json.dumps(result), "error": None}
+    finally:
+        heartbeat.stop()
+
+    recorded = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == JobStatusEnum.RUNNING.value,
+               Job.worker_id == worker_id, Job.attempts == attempts)
+        .values(finished_at=datetime.now(), **outcome)
+    ).rowcount
+    db.commit()
+    if not recorded:
+        print(f"[WARNING] Job {job_id} ({kind}) lost its lease; its outcome was discarded")
+    db.refresh(job)
+    return job
+
+def process_next_job(db: Session, executor: Optional[Executor] = None) -> Optional[Job]:
+    """Claim and run the next queued job; returns None when the queue is empty"""
+    job = claim_next_job(db)
+    if job is None:
+        return None
+    return run_job(db, job, executor)
+
+def set_job_progress(db: Session, job_id: Optional[int], done: int, total: int):
+    """Record how many of a job's units of work are finished, which also renews its lease"""
+    if job_id is None:
+        return
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(progress_done=done, progress_total=total, heartbeat_at=datetime.now())
+    )
+    db.commit()
+
+def get_job_result(job: Job) -> dict:
+    """Return the result of a finished job, or raise 409 if it has none"""
+    if job.status == JobStatusEnum.FAILED.value:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Job failed: {job.error}")
+    if job.status != JobStatusEnum.SUCCEEDED.value:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job has not finished yet")
+    return json.loads(job.result or "{}")
+
+# Inspection report cache
+def inspection_render_key(inspection, photos) -> str:
+    """
+    Hash everything that ends up in an inspection report.
+    
+    Two renders with the same key produce the same PDF, so the key identifies
+    a cached report; any change to the inspection fields or to the ordered
+    photo ids, paths, captions or dates yields a new key.
+    """
+    content = {
+        "version": INSPECTION_PDF_RENDER_VERSION,
+        "inspection": [
+            inspection.id,
+            inspection.subproject_name,
+            inspection.inspection_form_name,
+            str(inspection.inspection_date),
+            inspection.location,
+            inspection.timing,
+            inspection.result,
+            inspection.remark,
+        ],
+        "photos": [
+            [photo.id, photo.photo_path, photo.caption, str(photo.capture_date)]
+            for photo in photos
+        ],
+    }
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def cached_inspection_pdf(inspection, render_key: str) -> Optional[str]:
+    """Return the inspection's PDF if it is the render for render_key"""
+    if inspection.pdf_render_key == render_key and inspection.pdf_path and os.path.exists(inspection.pdf_path):
+        return inspection.pdf_path
+    return None
+
+def _report_photos(db: Session, inspection_id: int):
+    """Photos of an inspection in report order"""
+    return db.query(InspectionPhoto).filter(InspectionPhoto.inspection_id == inspection_id) \
+        .order_by(InspectionPhoto.id).all()
+
+def request_inspection_pdf(db: Session, inspection_id: int) -> Job:
+    """
+    Queue rendering of an inspection report.
+    
+    If the inspection's current PDF is still the render of its current
+    content, nothing is queued and the job that produced it is returned.
+    """
+    inspection = crud.get_inspection(db, inspection_id=inspection_id)
+    render_key = inspection_render_key(inspection, _report_photos(db, inspection_id))
+    payload = {"inspection_id": inspection_id}
+    
+    pdf_path = cached_inspection_pdf(inspection, render_key)
+    if pdf_path is None:
+        return enqueue_job(db, INSPECTION_PDF_JOB, payload)
+    return finished_job_for(db, INSPECTION_PDF_JOB, payload,
+                            {"inspection_id": inspection_id, "pdf_path": pdf_path, "cached": True})
+
+def finished_job_for(db: Session, kind: str, payload: dict, result: dict) -> Job:
+    """
+    Return a succeeded job whose result is the given cached report.
+    
+    That is the latest succeeded job with the same payload if it produced the
+    same file, so requests for an unchanged report add no rows; only when
+    there is none is a finished job recorded.
+    """
+    payload_key = job_payload_key(payload)
+    latest = db.query(Job).filter(
+        Job.kind == kind, Job.payload_key == payload_key, Job.status == JobStatusEnum.SUCCEEDED.value
+    ).order_by(Job.id.desc()).first()
+    if latest is not None and json.loads(latest.result or "{}").get("pdf_path") == result["pdf_path"]:
+        return latest
+    
+    now = datetime.now()
+    job = Job(
+        kind=kind,
+        status=JobStatusEnum.SUCCEEDED.value,
+        payload=json.dumps(payload),
+        payload_key=payload_key,
+        result=json.dumps(result),
+        attempts=0,
+        started_at=now,
+        finished_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+# Job handlers
+def _snapshot_inspection(inspection) -> SimpleNamespace:
+    """Copy the fields used by the report into a picklable object"""
+    return SimpleNamespace(
+        id=inspection.id,
+        subproject_name=inspection.subproject_name,
+        inspection_form_name=inspection.inspection_form_name,
+        inspection_date=inspection.inspection_date,
+        location=inspection.location,
+        timing=inspection.timing,
+        result=inspection.result,
+        remark=inspection.remark,
+    )
+
+def _snapshot_photo(photo) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=photo.id,
+        photo_path=photo.photo_path,
+        caption=photo.caption,
+        capture_date=photo.capture_date,
+    )
+
+def inspection_report_data(db: Session, inspection_id: int) -> Tuple[SimpleNamespace, List[SimpleNamespace]]:
+    """Load an inspection and its photos as the plain objects the report renderer takes"""
+    inspection = crud.get_inspection(db, inspection_id=inspection_id)
+    photos = _report_photos(db, inspection.id)
+    return _snapshot_inspection(inspection), [_snapshot_photo(photo) for photo in photos]
+
+def render_inspection_pdf(db: Session, payload: dict, executor: Optional[Executor] = None) -> dict:
+    """Render the report of an inspection and attach it as its PDF"""
+    inspection = crud.get_inspection(db, inspection_id=payload["inspection_id"])
+    photos = _report_photos(db, inspection.id)
+
+    # Another job may already have rendered the same content
+    render_key = inspection_render_key(inspection, photos)
+    pdf_path = cached_inspection_pdf(inspection, render_key)
+    if pdf_path is not None:
+        return {"inspection_id": inspection.id, "pdf_path": pdf_path, "cached": True}
+
+    inspection_data = _snapshot_inspection(inspection)
+    photos_data = [_snapshot_photo(photo) for photo in photos]
+    target_path = os.path.join(PDF_UPLOAD_DIR, f"inspection_{render_key}.pdf")
+    pdf_path = run_in_pdf_executor(executor, generate_inspection_pdf, inspection_data, photos_data, target_path)
+
+    inspection_update = schemas.InspectionUpdate(
+        result=inspection.result,
+        remark=inspection.remark,
+        pdf_path=pdf_path
+    )
+    pdf_size = os.path.getsize(pdf_path) if os.path.exists(pdf_path) else None
+    crud.update_inspection(db, inspection.id, inspection_update, pdf_render_key=render_key, pdf_size=pdf_size)
+    return {"inspection_id": inspection.id, "pdf_path": pdf_path, "cached": False}
+
+# Consolidated project reports
+def report_section_path(inspection_id: int, render_key: str) -> str:
+    """Where the report section of an inspection with the given content is cached"""
+    return os.path.join(REPORT_SECTION_DIR, f"section_{inspection_id}_{render_key}.pdf")
+
+def _project_report_content(db: Session, project_id: int):
+    """
+    Every inspection of a project in report order with its photos and render
+    key, loaded with two queries
+    """
+    inspections = db.query(ConstructionInspection) \
+        .filter(ConstructionInspection.project_id == project_id) \
+        .order_by(ConstructionInspection.subproject_name, ConstructionInspection.inspection_date,
+                  ConstructionInspection.id).all()
+    photos = {}
+    for photo in db.query(InspectionPhoto) \
+            .join(ConstructionInspection, InspectionPhoto.inspection_id == ConstructionInspection.id) \
+            .filter(ConstructionInspection.project_id == project_id) \
+            .order_by(InspectionPhoto.id):
+        photos.setdefault(photo.inspection_id, []).append(photo)
+    
+    return [
+        (inspection, photos.get(inspection.id, []), inspection_render_key(inspection, photos.get(inspection.id, [])))
+        for inspection in inspections
+    ]
+
+def project_report_key(project, content) -> str:
+    """Hash the project title and the render keys of its sections in order"""
+    keys = [[inspection.id, render_key] for inspection, _, render_key in content]
+    return hashlib.sha256(json.dumps([project.name, keys], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def cached_project_report(project, report_key: str) -> Optional[str]:
+    """Return the project's report if it is the render for report_key"""
+    if project.report_render_key == report_key and project.report_pdf_path and os.path.exists(project.report_pdf_path):
+        return project.report_pdf_path
+    return None
+
+def request_project_report(db: Session, project_id: int) -> Job:
+    """
+    Queue a consolidated report of every inspection in a project.
+    
+    If the project's current report still matches its content, nothing is
+    queued and the job that produced it is returned.
+    """
+    project = crud.get_project(db, project_id)
+    report_key = project_report_key(project, _project_report_content(db, project_id))
+    payload = {"project_id": project_id}
+    
+    pdf_path = cached_project_report(project, report_key)
+    if pdf_path is None:
+        return enqueue_job(db, PROJECT_REPORT_JOB, payload)
+    return finished_job_for(db, PROJECT_REPORT_JOB, payload,
+                            {"project_id": project_id, "pdf_path": pdf_path, "cached": True})
+
+def _render_sections(db: Session, job_id: Optional[int], missing, total: int, executor: Optional[Executor]):
+    """Render the sections that are not cached, in parallel when there is a pool"""
+    done = total - len(missing)
+    set_job_progress(db, job_id, done, total)
+    if executor is None:
+        for inspection, photos, path in missing:
+            render_report_section(inspection, photos, path)
+            done += 1
+            set_job_progress(db, job_id, done, total)
+        return
+    
+    futures = []
+    try:
+        futures = [executor.submit(render_report_section, inspection, photos, path) for inspection, photos, path in missing]
+        for future in as_completed(futures):
+            future.result()
+            done += 1
+            set_job_progress(db, job_id, done, total)
+    except BrokenProcessPool:
+        _discard_pdf_pool(executor)
+        raise
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+
+def render_project_report(db: Session, payload: dict, executor: Optional[Executor] = None) -> dict:
+    """
+    Build the consolidated report of a project.
+    
+    Each inspection section is cached under its render key, so a re-run only
+    renders the inspections that changed; the rest are reused. Progress is
+    reported in sections.
+    """
+    project = crud.get_project(db, payload["project_id"])
+    content = _project_report_content(db, project.id)
+    report_key = project_report_key(project, content)
+    pdf_path = cached_project_report(project, report_key)
+    if pdf_path is not None:
+        return {"project_id": project.id, "pdf_path": pdf_path, "cached": True}
+    
+    os.makedirs(REPORT_SECTION_DIR, exist_ok=True)
+    sections, missing = [], []
+    for inspection, photos, render_key in content:
+        path = report_section_path(inspection.id, render_key)
+        sections.append(ReportSection(
+            group=inspection.subproject_name,
+            title=f"{inspection.inspection_form_name} ({inspection.inspection_date})",
+            path=path
+        ))
+        if not os.path.exists(path):
+            missing.append((_snapshot_inspection(inspection), [_snapshot_photo(photo) for photo in photos], path))
+    
+    _render_sections(db, payload.get("job_id"), missing, len(sections), executor)
+    
+    # Sections of earlier versions of these inspections will not be used again
+    current = {section.path for section in sections}
+    for inspection, _, _ in content:
+        for path in glob.glob(os.path.join(REPORT_SECTION_DIR, f"section_{inspection.id}_*.pdf")):
+            if path not in current:
+                crud.remove_file(path)
+    
+    ensure_upload_dirs()
+    target_path = os.path.join(PDF_UPLOAD_DIR, f"project_{project.id}_report_{report_key}.pdf")
+    assemble_project_report(project.name, sections, target_path)
+    crud.set_project_report(db, project.id, target_path, os.path.getsize(target_path), report_key)
+    return {
+        "project_id": project.id,
+        "pdf_path": target_path,
+        "sections": len(sections),
+        "rendered_sections": len(missing),
+        "cached": False,
+    }
+
+JOB_HANDLERS: Dict[str, Callable[[Session, dict, Optional[Executor]], dict]] = {
+    INSPECTION_PDF_JOB: render_inspection_pdf,
+    PROJECT_REPORT_JOB: render_project_report,
+}
+
+# Background worker
+class JobWorker(threading.Thread):
+    """Polls the jobs table and runs jobs one at a time in this process"""
+
+    def __init__(self):
+        super().__init__(name="job-worker", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        last_recovery = None
+        while not self._stop_event.is_set():
+            db = SessionLocal()
+            try:
+                now = datetime.now()
+                if last_recovery is None or (now - last_recovery).total_seconds() >= JOB_LEASE_SECONDS / 10:
+                    requeue_stale_jobs(db)
+                    purge_finished_jobs(db)
+                    last_recovery = now
+                job = process_next_job(db, get_pdf_pool())
+            except Exception as e:
+                print(f"[WARNING] Job worker error: {e}")
+                job = None
+            finally:
+                db.close()
+
+            # Keep draining the queue while there is work, otherwise wait
+            if job is None:
+                self._stop_event.wait(JOB_POLL_INTERVAL_SECONDS)
+
+_worker: Optional[JobWorker] = None
+
+def start_job_worker():
+    """Start the background job worker of this process if enabled"""
+    global _worker
+    if not JOB_WORKER_ENABLED or _worker is not None:
+        return
+    _worker = JobWorker()
+    _worker.start()
+
+def stop_job_worker():
+    """Stop the background job worker and its process pool"""
+    global _worker, _pdf_pool
+    if _worker is not None:
+        _worker.stop()
+        _worker.join(timeout=5)
+        _worker = None
+    if _pdf_pool is not None:
+        _pdf_pool.shutdown(wait=False, cancel_futures=True)
+        _pdf_pool = None
@@ -0,0 +1,316 @@
+"""
+Incremental mark-and-sweep collector for files in the upload directories
+that no database row references any more.
+
+Files are left behind by failed requests, interrupted PDF merges
+(temp_photos_*.pdf), abandoned uploads (*.part) and deletions whose
+os.remove failed. The collector walks each directory in batches, checks a
+batch of names against the database with one query and removes the
+unreferenced ones. Files younger than the grace period are never touched,
+since an upload or render may be about to reference them.
+
+Run it once from the command line (add --dry-run for a report only):
+
+    python -m app.services.orphan_gc [--dry-run] [--grace-seconds 3600]
+
+or in the background of an API worker with ORPHAN_GC_ENABLED=1.
+"""
+import os
+import sys
+import re
+import time
+import argparse
+import threading
+from typing import Iterator, List, Optional, Set
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.db.database import SessionLocal
+from app.models.models import Project, ConstructionInspection, InspectionPhoto, PhotoBlob
+from app.utils.file_utils import PDF_UPLOAD_DIR, PHOTO_UPLOAD_DIR, REPORT_SECTION_DIR, TEMP_FILE_SUFFIX, format_file_size
+from app.utils.image_utils import THUMBNAIL_DIR, PDF_IMAGE_DIR
+
+# Files modified within this many seconds are considered in flight and kept
+ORPHAN_GC_GRACE_SECONDS = float(os.getenv("ORPHAN_GC_GRACE_SECONDS", "3600"))
+# Directory entries checked against the database per query
+ORPHAN_GC_BATCH_SIZE = int(os.getenv("ORPHAN_GC_BATCH_SIZE", "500"))
+# Pause between batches so a sweep never hogs the disk or the database
+ORPHAN_GC_BATCH_PAUSE_SECONDS = float(os.getenv("ORPHAN_GC_BATCH_PAUSE_SECONDS", "0.5"))
+
+# Background collection in the API process (off by default; one worker is enough)
+ORPHAN_GC_ENABLED = os.getenv("ORPHAN_GC_ENABLED", "0") == "1"
+ORPHAN_GC_INTERVAL_SECONDS = float(os.getenv("ORPHAN_GC_INTERVAL_SECONDS", "21600"))
+
+# Scratch files left by interrupted PDF merges before they ran in memory; never referenced by a row
+TEMP_MERGE_PREFIX = "temp_photos_"
+
+# Stored photos are named by the SHA-256 of their content
+_CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+class OrphanReport:
+    """What a collection pass found and removed"""
+
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.scanned = 0
+        self.referenced = 0
+        self.recent = 0
+        self.orphans: List[tuple] = []  # (path, size)
+        self.removed = 0
+        self.removed_bytes = 0
+        self.errors: List[str] = []
+
+    @property
+    def orphan_bytes(self) -> int:
+        return sum(size for _, size in self.orphans)
+
+    def summary(self) -> str:
+        action = "would remove" if self.dry_run else "removed"
+        count = len(self.orphans) if self.dry_run else self.removed
+        size = self.orphan_bytes if self.dry_run else self.removed_bytes
+        return (
+            f"Scanned {self.scanned} files: {self.referenced} referenced, {self.recent} within the grace period; "
+            f"{action} {count} orphans ({format_file_size(size)}), {len(self.errors)} errors"
+        )
+
+def _scan_batches(directory: str, batch_size: int) -> Iterator[List[os.DirEntry]]:
+    """Yield the regular files of a directory tree in batches without listing it all at once"""
+    pending = [directory]
+    batch = []
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        batch.append(entry)
+                        if len(batch) >= batch_size:
+                            yield batch
+                            batch = []
+        except FileNotFoundError:
+            continue
+    if batch:
+        yield batch
+
+def _referenced_pdfs(db: Session, paths: List[str]) -> Set[str]:
+    pdfs = db.query(ConstructionInspection.pdf_path).filter(ConstructionInspection.pdf_path.in_(paths))
+    merged = db.query(ConstructionInspection.merged_pdf_path).filter(ConstructionInspection.merged_pdf_path.in_(paths))
+    reports = db.query(Project.report_pdf_path).filter(Project.report_pdf_path.in_(paths))
+    return {path for (path,) in pdfs.union(merged, reports)}
+
+def _referenced_photos(db: Session, paths: List[str]) -> Set[str]:
+    photos = db.query(InspectionPhoto.photo_path).filter(InspectionPhoto.photo_path.in_(paths))
+    blobs = db.query(PhotoBlob.path).filter(PhotoBlob.path.in_(paths))
+    return {path for (path,) in photos.union(blobs)}
+
+def _source_stem(derivative_path: str) -> str:
+    stem = os.path.splitext(os.path.basename(derivative_path))[0]
+    if os.path.dirname(derivative_path).startswith(PDF_IMAGE_DIR):
+        stem = stem.rsplit("_", 1)[0]  # <stem>_<width>x<height>.jpg
+    return stem
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _referenced_derivatives(db: Session, paths: List[str]) -> Set[str]:
+    """
+    Thumbnails and cached PDF images are kept while their source photo is
+    referenced. The sources of a whole batch are resolved with one query:
+    content-addressed photos by their blob's hash, older names by a prefix
+    match on the stored paths.
+    """
+    stems = {path: _source_stem(path) for path in paths}
+    hashed = {stem for stem in stems.values() if _CONTENT_HASH_NAME.match(stem)}
+    legacy = set(stems.values()) - hashed
+
+    queries = [db.query(PhotoBlob.content_hash).filter(PhotoBlob.content_hash.in_(hashed))]
+    if legacy:
+        prefixes = [_escape_like(os.path.join(PHOTO_UPLOAD_DIR, stem)) + ".%" for stem in legacy]
+        for column in (InspectionPhoto.photo_path, PhotoBlob.path):
+            queries.append(db.query(column).filter(or_(*(column.like(prefix, escape="\\") for prefix in prefixes))))
+    referenced_stems = {
+        os.path.splitext(os.path.basename(value))[0] for (value,) in queries[0].union(*queries[1:])
+    }
+    return {path for path, stem in stems.items() if stem in referenced_stems}
+
+def _referenced_sections(db: Session, paths: List[str]) -> Set[str]:
+    """Cached report sections (section_<inspection id>_<render key>.pdf) live as long as their inspection"""
+    inspection_ids = {}
+    for path in paths:
+        parts = os.path.basename(path).split("_")
+        if len(parts) == 3 and parts[1].isdigit():
+            inspection_ids[path] = int(parts[1])
+    if not inspection_ids:
+        return set()
+
+    existing = {
+        inspection_id for (inspection_id,) in
+        db.query(ConstructionInspection.id).filter(ConstructionInspection.id.in_(set(inspection_ids.values())))
+    }
+    return {path for path, inspection_id in inspection_ids.items() if inspection_id in existing}
+
+# Directories swept by a pass, with the check marking a batch of their files
+COLLECTED_DIRS = (
+    (PDF_UPLOAD_DIR, _referenced_pdfs),
+    (PHOTO_UPLOAD_DIR, _referenced_photos),
+    (THUMBNAIL_DIR, _referenced_derivatives),
+    (PDF_IMAGE_DIR, _referenced_derivatives),
+    (REPORT_SECTION_DIR, _referenced_sections),
+)
+
+def _is_scratch(name: str) -> bool:
+    """In-flight uploads and merge scratch files; no row ever references them"""
+    return name.endswith(TEMP_FILE_SUFFIX) or name.startswith(TEMP_MERGE_PREFIX)
+
+def collect_orphans(
+    db: Session,
+    dry_run: bool = False,
+    grace_seconds: float = ORPHAN_GC_GRACE_SECONDS,
+    batch_size: int = ORPHAN_GC_BATCH_SIZE,
+    pause_seconds: float = 0,
+    stop_event: Optional[threading.Event] = None,
+) -> OrphanReport:
+    """
+    Remove the files in the upload directories that no row references.
+
+    Each batch is marked with one query and swept right away, and a file's
+    age is checked again just before it is removed, so a file that an upload
+    has just replaced is kept.
+
+    Args:
+        db: Database session
+        dry_run: Only report the orphans
+        grace_seconds: Keep files modified more recently than this
+        batch_size: Directory entries checked per query
+        pause_seconds: Sleep between batches to throttle the pass
+        stop_event: Ends the pass early when set
+
+    Returns:
+        OrphanReport of the pass
+    """
+    report = OrphanReport(dry_run)
+    for directory, referenced_in in COLLECTED_DIRS:
+        for batch in _scan_batches(directory, batch_size):
+            if stop_event is not None and stop_event.is_set():
+                return report
+            _sweep_batch(db, batch, referenced_in, report, grace_seconds)
+            # Release the read transaction between batches
+            db.rollback()
+            if pause_seconds:
+                time.sleep(pause_seconds)
+    return report
+
+def _sweep_batch(db: Session, batch: List[os.DirEntry], referenced_in, report: OrphanReport, grace_seconds: float):
+    cutoff = time.time() - grace_seconds
+    report.scanned += len(batch)
+
+    candidates = []
+    for entry in batch:
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > cutoff:
+                report.recent += 1
+                continue
+        except FileNotFoundError:
+            continue
+        candidates.append(entry.path)
+    if not candidates:
+        return
+
+    scratch = [path for path in candidates if _is_scratch(os.path.basename(path))]
+    checked = [path for path in candidates if not _is_scratch(os.path.basename(path))]
+    referenced = referenced_in(db, checked) if checked else set()
+    report.referenced += len(referenced)
+
+    for path in scratch + [path for path in checked if path not in referenced]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > cutoff:
+            report.recent += 1
+            continue
+        report.orphans.append((path, stat.st_size))
+        if report.dry_run:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        except OSError as e:
+            report.errors.append(f"{path}: {e}")
+            continue
+        report.removed += 1
+        report.removed_bytes += stat.st_size
+
+# Background collector
+class OrphanCollector(threading.Thread):
+    """Runs a throttled collection pass every ORPHAN_GC_INTERVAL_SECONDS"""
+
+    def __init__(self, interval: float = ORPHAN_GC_INTERVAL_SECONDS):
+        super().__init__(name="orphan-gc", daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            db = SessionLocal()
+            try:
+                report = collect_orphans(db, pause_seconds=ORPHAN_GC_BATCH_PAUSE_SECONDS, stop_event=self._stop_event)
+                if report.orphans:
+                    print(f"[INFO] Orphan file collection: {report.summary()}")
+            except Exception as e:
+                print(f"[WARNING] Orphan file collection failed: {e}")
+            finally:
+                db.close()
+
+_collector: Optional[OrphanCollector] = None
+
+def start_orphan_collector():
+    """Start the background orphan collector of this process if enabled"""
+    global _collector
+    if not ORPHAN_GC_ENABLED or _collector is not None:
+        return
+    _collector = OrphanCollector()
+    _collector.start()
+
+def stop_orphan_collector():
+    """Stop the background orphan collector"""
+    global _collector
+    if _collector is not None:
+        _collector.stop()
+        _collector.join(timeout=5)
+        _collector = None
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Remove unreferenced files from the upload directories")
+    parser.add_argument("--dry-run", action="store_true", help="only list the orphans")
+    parser.add_argument("--grace-seconds", type=float, default=ORPHAN_GC_GRACE_SECONDS,
+                        help="keep files modified within this many seconds")
+    parser.add_argument("--batch-size", type=int, default=ORPHAN_GC_BATCH_SIZE)
+    parser.add_argument("--pause-seconds", type=float, default=0, help="sleep between batches")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        report = collect_orphans(
+            db,
+            dry_run=args.dry_run,
+            grace_seconds=args.grace_seconds,
+            batch_size=args.batch_size,
+            pause_seconds=args.pause_seconds,
+        )
+    finally:
+        db.close()
+
+    for path, size in report.orphans:
+        print(f"{path}\t{format_file_size(size)}")
+    for error in report.errors:
+        print(f"[WARNING] {error}", file=sys.stderr)
+    print(report.summary())
+    return 1 if report.errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import os
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.db.database import get_db
+from app.models.models import Project
+from app.utils.ttl_cache import TTLCache
+
+# Project owners remembered per worker process for the read routes; writes
+# always check the owner of the row they load
+OWNER_CACHE_SIZE = int(os.getenv("OWNER_CACHE_SIZE", "4096"))
+# update_project/delete_project invalidate entries in their own worker;
+# other workers pick up an ownership change after at most this many seconds
+OWNER_CACHE_TTL = float(os.getenv("OWNER_CACHE_TTL", "30"))
+
+# Project id -> owner
+owner_cache = TTLCache(OWNER_CACHE_SIZE, OWNER_CACHE_TTL)
+
+def get_project_owner(db: Session, project_id: int) -> str:
+    """Return a project's owner, selecting only that column on a cache miss"""
+    owner = owner_cache.get(project_id)
+    if owner is not None:
+        return owner
+
+    owner = db.execute(select(Project.owner).where(Project.id == project_id)).scalar_one_or_none()
+    if owner is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    owner_cache.set(project_id, owner)
+    return owner
+
+def ensure_owner(project_owner: str, owner: str):
+    """Raise 403 if owner is not the project's owner"""
+    if project_owner != owner:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied: You are not the owner of this project"
+        )
+
+def verify_project_owner(db: Session, project_id: int, owner: Optional[str]):
+    """
+    Raise 404 if the project does not exist and 403 if owner is given and
+    does not match it; the owner may come from the cache
+    """
+    project_owner = get_project_owner(db, project_id)
+    if owner:
+        ensure_owner(project_owner, owner)
+
+def invalidate_project_owner(project_id: int):
+    """Forget the cached owner of a project after it changed or was deleted"""
+    owner_cache.discard(project_id)
+
+# FastAPI dependencies for routes with a project_id path parameter
+def check_project_owner(project_id: int, owner: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    """Dependency: the project exists and, if an owner header is sent, belongs to it"""
+    verify_project_owner(db, project_id, owner)
@@ -1,16 +1,31 @@
+import os
+
+# 測試中不啟動背景 job worker，改由測試直接處理 job
+os.environ.setdefault("JOB_WORKER_ENABLED", "0")
+# 讀取查詢若觸發未預先載入的關聯就直接報錯，避免新的 N+1 查詢
+os.environ.setdefault("DB_STRICT_LOADING", "1")
+# 上傳檔案寫到暫存目錄，測試不會動到真正的 app/static/uploads
+import tempfile
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="test_uploads_"))
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from fastapi.testclient import TestClient
 from app.db.database import Base
 from app.main import app
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db, SessionLocal
+from app.services import file_cleanup
+from app.services.file_cleanup import file_deletion_queue
 import os
 import sys
 import shutil
 from datetime import date, timedelta
 from app.models.models import Project, ConstructionInspection, InspectionPhoto
 from app.schemas import schemas
+from app.utils.response_cache import response_cache
+from app.services.ownership import owner_cache
+from app.utils.file_utils import UPLOAD_DIR, PDF_UPLOAD_DIR, PHOTO_UPLOAD_DIR
 
 os.makedirs("app/data", exist_ok=True)  
 
@@ -23,6 +38,15 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 讓 pysqlite 正確支援 SAVEPOINT，測試中的 rollback 才不會影響外層事務
+@event.listens_for(engine, "connect")
+def do_connect(dbapi_connection, connection_record):
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(engine, "begin")
+def do_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
 # 只創建一次表格，提高測試速度
 @pytest.fixture(scope="session")
 def create_tables():
@@ -36,12 +60,19 @@ def db(create_tables):
     connection = engine.connect()
     transaction = connection.begin()
     
-    # 綁定 session 到這個連接
-    session = TestingSessionLocal(bind=connection)
+    # 綁定 session 到這個連接；session 的 commit/rollback 只作用於 savepoint
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
+    
+    # 背景刪除佇列確認照片是否仍被引用時，也查詢同一個測試事務
+    file_cleanup.reference_session_factory = lambda: TestingSessionLocal(
+        bind=connection, join_transaction_mode="rollback_only"
+    )
     
     try:
         yield session
     finally:
+        file_deletion_queue.drain(timeout=5)
+        file_cleanup.reference_session_factory = SessionLocal
         session.close()
         # 回滾事務而不是刪除表格，這樣更快
         transaction.rollback()
@@ -56,7 +87,12 @@ def client(db):
         finally:
             pass  # 不在這裡關閉，由 db fixture 處理
     
+    # 每個測試的資料庫都會回滾，快取的回應與專案擁有者不能跨測試沿用
+    response_cache.clear()
+    owner_cache.clear()
     app.dependency_overrides[get_db] = override_get_db
+    # 讀取端點同樣使用測試 session (async_crud 會在 threadpool 中執行同步查詢)
+    app.dependency_overrides[get_read_db] = override_get_db
     
     with TestClient(app) as test_client:
         yield test_client
@@ -64,9 +100,9 @@ def client(db):
     # 重置依賴項覆蓋
     app.dependency_overrides = {}
 
-# 設置測試用的上傳目錄
-TEST_PDF_DIR = "app/static/test_uploads/pdfs"
-TEST_PHOTO_DIR = "app/static/test_uploads/photos"
+# 測試用的上傳目錄就是 UPLOAD_DIR 底下的上傳目錄
+TEST_PDF_DIR = PDF_UPLOAD_DIR
+TEST_PHOTO_DIR = PHOTO_UPLOAD_DIR
 
 @pytest.fixture(scope="module", autouse=True)
 def setup_test_dirs():
@@ -77,16 +113,15 @@ def setup_test_dirs():
     
     yield
     
-    # 清理測試目錄
-    if os.path.exists(TEST_PDF_DIR):
-        shutil.rmtree(TEST_PDF_DIR)
-    if os.path.exists(TEST_PHOTO_DIR):
-        shutil.rmtree(TEST_PHOTO_DIR)
+    # 清理整個暫存上傳目錄（縮圖、PDF 圖片快取等也一併移除）
+    if os.path.exists(UPLOAD_DIR):
+        shutil.rmtree(UPLOAD_DIR)
 
 @pytest.fixture
 def mock_pdf_path():
     """創建一個測試用的 PDF 檔案並返回路徑"""
     pdf_path = os.path.join(TEST_PDF_DIR, "test_inspection.pdf")
+    os.makedirs(TEST_PDF_DIR, exist_ok=True)
     
     # 創建一個空的 PDF 檔案
     with open(pdf_path, "wb") as f:
@@ -102,6 +137,7 @@ def mock_pdf_path():
 def mock_photo_path():
     """創建一個測試用的照片檔案並返回路徑"""
     photo_path = os.path.join(TEST_PHOTO_DIR, "test_photo.jpg")
+    os.makedirs(TEST_PHOTO_DIR, exist_ok=True)
     
     # 創建一個空的照片檔案
     with open(photo_path, "wb") as f:
@@ -4,6 +4,9 @@ from datetime import date, timedelta
 import json
 from app.main import app
 import io
+import os
+from app.services.file_cleanup import file_deletion_queue
+from app.services.ownership import owner_cache
 
 def test_read_main(client):
     """Test the root endpoint"""
@@ -81,6 +84,57 @@ def test_project_owner_validation(client, create_project_via_api, test_project_d
     assert response.status_code == 403
     assert "Access denied" in response.json()["detail"]
 
+def test_project_writes_ignore_a_stale_owner_cache(client, create_project_via_api, test_project_data):
+    """Test that PUT/DELETE check the stored owner, not an owner another worker still caches"""
+    project_id = create_project_via_api
+    update_data = dict(test_project_data, owner="new_owner")
+    response = client.put(f"/api/projects/{project_id}", json=update_data, headers={"owner": test_project_data["owner"]})
+    assert response.status_code == 200
+    
+    # Another worker still remembers the former owner
+    owner_cache.set(project_id, test_project_data["owner"])
+    response = client.put(f"/api/projects/{project_id}", json=test_project_data, headers={"owner": test_project_data["owner"]})
+    assert response.status_code == 403
+    response = client.delete(f"/api/projects/{project_id}", headers={"owner": test_project_data["owner"]})
+    assert response.status_code == 403
+    response = client.delete(f"/api/projects/{project_id}", headers={"owner": "new_owner"})
+    assert response.status_code == 200
+
+def test_read_project_conditional_get(client, create_project_via_api, test_inspection_data, monkeypatch):
+    """Test ETags, 304 responses and invalidation of cached project reads"""
+    project_id = create_project_via_api
+    response = client.get(f"/api/projects/{project_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    list_url = f"/api/inspections/?project_id={project_id}"
+    assert client.get(list_url).json() == []
+    
+    # Cached polls are answered without querying the database
+    async def no_db_access(*args, **kwargs):
+        raise AssertionError("cache hit expected")
+    with monkeypatch.context() as patch:
+        patch.setattr("app.services.async_crud.get_project_with_inspections", no_db_access)
+        patch.setattr("app.services.async_crud.get_inspections", no_db_access)
+        response = client.get(f"/api/projects/{project_id}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert client.get(f"/api/projects/{project_id}").json()["inspections"] == []
+        assert client.get(list_url).json() == []
+    
+    # A new inspection invalidates the project and its inspection list
+    client.post("/api/inspections/", json=dict(test_inspection_data, project_id=project_id))
+    response = client.get(f"/api/projects/{project_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert len(response.json()["inspections"]) == 1
+    assert len(client.get(list_url).json()) == 1
+    
+    # So does a change to the project itself
+    update = dict(response.json(), name="Renamed")
+    del update["inspections"], update["id"]
+    client.put(f"/api/projects/{project_id}", json=update, headers={"owner": update["owner"]})
+    assert client.get(f"/api/projects/{project_id}").json()["name"] == "Renamed"
+
 def test_get_projects_by_owner(client, test_project_data):
     """Test getting projects filtered by owner via API"""
     # Create first project with test_owner
@@ -151,6 +205,36 @@ def test_delete_project(client, create_project_via_api, test_project_data):
     assert response.status_code == 404
 
 # Inspection API tests
+def test_download_project_archive(client, create_inspection_via_api):
+    """Test the project ZIP export with its folder layout and manifest"""
+    import csv
+    import zipfile
+    inspection_id = create_inspection_via_api
+    inspection = client.get(f"/api/inspections/{inspection_id}").json()
+    project_id = inspection["project_id"]
+    
+    client.post(f"/api/inspections/{inspection_id}/upload-pdf",
+                files={"file": ("form.pdf", b"%PDF-1.4 form", "application/pdf")})
+    photo = client.post("/api/photos/", data={"inspection_id": str(inspection_id), "capture_date": "2025-01-02"},
+                        files={"file": ("site.JPG", b"photo bytes", "image/jpeg")}).json()
+    
+    response = client.get(f"/api/projects/{project_id}/archive.zip")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    folder = f"{inspection['subproject_name']}/{inspection['inspection_date']}_{inspection_id}_{inspection['inspection_form_name']}"
+    assert archive.read(f"{folder}/inspection.pdf") == b"%PDF-1.4 form"
+    assert archive.read(f"{folder}/photos/2025-01-02_{photo['id']}.jpg") == b"photo bytes"
+    
+    manifest = list(csv.DictReader(io.StringIO(archive.read("manifest.csv").decode("utf-8-sig"))))
+    assert [row["kind"] for row in manifest] == ["pdf", "photo"]
+    assert all(row["status"] == "ok" for row in manifest)
+    assert manifest[1]["photo_id"] == str(photo["id"])
+    
+    response = client.get("/api/projects/9999/archive.zip")
+    assert response.status_code == 404
+
 def test_create_inspection(client, create_project_via_api, test_inspection_data):
     """Test creating an inspection via API"""
     project_id = create_project_via_api
@@ -182,6 +266,53 @@ def test_read_inspections(client, create_inspection_via_api):
     assert len(data) >= 1
     assert all(inspection["project_id"] == project_id for inspection in data)
 
+def test_list_responses_match_stdlib_json(client, create_inspection_via_api):
+    """Test that orjson bodies are byte for byte what the stdlib JSON response produced"""
+    project_id = client.get(f"/api/inspections/{create_inspection_via_api}").json()["project_id"]
+    # Uncached list, cached per-project list (served twice) and the photo list
+    for url in ("/api/inspections/", f"/api/inspections/?project_id={project_id}",
+                f"/api/inspections/?project_id={project_id}", f"/api/photos/?inspection_id={create_inspection_via_api}"):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        expected = json.dumps(response.json(), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+        assert response.content == expected.encode("utf-8")
+    assert "檢驗停留點".encode("utf-8") in client.get("/api/inspections/").content
+
+def test_read_inspections_with_cursor(client, create_project_via_api, test_inspection_data):
+    """Test paging through inspections with the keyset cursor"""
+    project_id = create_project_via_api
+    # Several inspections share a date so the id tie-breaker is exercised
+    for offset in (0, 0, 0, 1, 2):
+        inspection_data = dict(test_inspection_data, project_id=project_id,
+                               inspection_date=str(date.today() - timedelta(days=offset)))
+        client.post("/api/inspections/", json=inspection_data)
+
+    expected = client.get(f"/api/inspections/?project_id={project_id}").json()
+    assert [item["inspection_date"] for item in expected] == sorted(item["inspection_date"] for item in expected)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"project_id": project_id, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/inspections/", params=params)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert seen == [item["id"] for item in expected]
+
+def test_read_with_invalid_cursor(client):
+    """Test that a malformed cursor is rejected"""
+    for url in ("/api/projects/", "/api/inspections/", "/api/photos/"):
+        response = client.get(url, params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+
 def test_update_inspection(client, create_inspection_via_api, test_update_inspection_data):
     """Test updating an inspection via API"""
     inspection_id = create_inspection_via_api
@@ -230,6 +361,197 @@ def test_update_inspection_preserve_pdf_path(client, create_inspection_via_api):
     assert data["remark"] == "Updated without PDF path"
     assert data["pdf_path"] == pdf_path, "pdf_path should not be changed when not included in update"
 
+def test_merge_inspection_pdf(client, create_inspection_via_api):
+    """Test merging an inspection PDF with its photos"""
+    from PIL import Image
+    from PyPDF2 import PdfReader
+    from reportlab.pdfgen import canvas
+    inspection_id = create_inspection_via_api
+    
+    # Without a PDF there is nothing to merge
+    response = client.post(f"/api/inspections/{inspection_id}/merge-pdf")
+    assert response.status_code == 400
+    
+    pdf_bytes = io.BytesIO()
+    scan = canvas.Canvas(pdf_bytes)
+    scan.drawString(100, 750, "Inspection form")
+    scan.save()
+    client.post(f"/api/inspections/{inspection_id}/upload-pdf",
+                files={"file": ("form.pdf", pdf_bytes.getvalue(), "application/pdf")})
+    
+    photo_bytes = io.BytesIO()
+    Image.new("RGB", (32, 32), "blue").save(photo_bytes, "JPEG")
+    client.post("/api/photos/", data={"inspection_id": str(inspection_id), "capture_date": "2025-01-01"},
+                files={"file": ("site.jpg", photo_bytes.getvalue(), "image/jpeg")})
+    
+    response = client.post(f"/api/inspections/{inspection_id}/merge-pdf")
+    assert response.status_code == 200
+    merged_path = response.json()["merged_pdf_path"]
+    assert len(PdfReader(merged_path).pages) == 2
+    
+    # Merging again replaces the previous merged file
+    response = client.post(f"/api/inspections/{inspection_id}/merge-pdf")
+    assert response.json()["merged_pdf_path"] != merged_path
+    assert file_deletion_queue.drain(timeout=5)
+    assert not os.path.exists(merged_path)
+    
+    # A new inspection PDF makes the merge stale
+    response = client.post(f"/api/inspections/{inspection_id}/upload-pdf",
+                           files={"file": ("form2.pdf", pdf_bytes.getvalue(), "application/pdf")})
+    assert response.json()["merged_pdf_path"] is None
+
+def test_merge_inspection_pdf_unreadable(client, create_inspection_via_api):
+    """Test that a PDF the merge cannot parse is rejected"""
+    inspection_id = create_inspection_via_api
+    client.post(f"/api/inspections/{inspection_id}/upload-pdf",
+                files={"file": ("broken.pdf", b"not a pdf", "application/pdf")})
+    response = client.post(f"/api/inspections/{inspection_id}/merge-pdf")
+    assert response.status_code == 422
+
+def test_merge_inspection_pdf_skips_missing_photo_files(client, create_inspection_via_api):
+    """Test that a photo whose file is gone is left out of the merge instead of failing it"""
+    from PIL import Image
+    from PyPDF2 import PdfReader
+    from reportlab.pdfgen import canvas
+    inspection_id = create_inspection_via_api
+    
+    pdf_bytes = io.BytesIO()
+    scan = canvas.Canvas(pdf_bytes)
+    scan.drawString(100, 750, "Inspection form")
+    scan.save()
+    client.post(f"/api/inspections/{inspection_id}/upload-pdf",
+                files={"file": ("form.pdf", pdf_bytes.getvalue(), "application/pdf")})
+    
+    for color in ("red", "green"):
+        photo_bytes = io.BytesIO()
+        Image.new("RGB", (32, 32), color).save(photo_bytes, "JPEG")
+        response = client.post("/api/photos/", data={"inspection_id": str(inspection_id), "capture_date": "2025-01-01"},
+                               files={"file": (f"{color}.jpg", photo_bytes.getvalue(), "image/jpeg")})
+        assert response.status_code == 201
+    os.remove(response.json()["photo_path"])
+    
+    response = client.post(f"/api/inspections/{inspection_id}/merge-pdf")
+    assert response.status_code == 200
+    assert len(PdfReader(response.json()["merged_pdf_path"]).pages) == 2
+
+def test_stream_inspection_report(client, create_inspection_via_api):
+    """Test that the on-the-fly report is rendered in the PDF pool and sent without storing a file"""
+    import tempfile
+    from app.utils.file_utils import PDF_UPLOAD_DIR, ensure_upload_dirs
+    inspection_id = create_inspection_via_api
+    ensure_upload_dirs()
+    before = set(os.listdir(PDF_UPLOAD_DIR))
+    
+    response = client.get(f"/api/inspections/{inspection_id}/report.pdf")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.content.startswith(b"%PDF")
+    
+    assert set(os.listdir(PDF_UPLOAD_DIR)) == before
+    assert not [name for name in os.listdir(tempfile.gettempdir()) if name.startswith(f"inspection_{inspection_id}_")]
+    assert client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"] is None
+    
+    response = client.get("/api/inspections/9999/report.pdf")
+    assert response.status_code == 404
+
+def test_create_inspections_bulk(client, create_project_via_api, test_inspection_data):
+    """Test creating a batch of inspections in one request"""
+    items = [
+        dict(test_inspection_data, project_id=create_project_via_api, subproject_name=f"Item {i}")
+        for i in range(20)
+    ]
+    response = client.post("/api/inspections/bulk", json={"items": items})
+    assert response.status_code == 201
+    ids = response.json()["ids"]
+    assert len(ids) == 20
+    
+    # Ids come back in input order
+    for i in (0, 19):
+        assert client.get(f"/api/inspections/{ids[i]}").json()["subproject_name"] == f"Item {i}"
+
+def test_create_inspections_bulk_is_all_or_nothing(client, create_project_via_api, test_inspection_data):
+    """Test that one invalid item rejects the whole batch"""
+    valid = dict(test_inspection_data, project_id=create_project_via_api, subproject_name="Bulk valid")
+    before = len(client.get("/api/inspections/").json())
+    
+    response = client.post("/api/inspections/bulk", json={"items": [valid, dict(valid, project_id=99999)]})
+    assert response.status_code == 404
+    assert "99999" in response.json()["detail"]
+    
+    response = client.post("/api/inspections/bulk", json={"items": [valid, dict(valid, inspection_date="not a date")]})
+    assert response.status_code == 422
+    
+    response = client.post("/api/inspections/bulk", json={"items": []})
+    assert response.status_code == 422
+    assert len(client.get("/api/inspections/").json()) == before
+
+def test_create_photos_bulk(client, create_inspection_via_api, create_photo_via_api, db):
+    """Test creating photo records in bulk for stored files, sharing them by content hash"""
+    from app.models.models import PhotoBlob
+    stored = client.get(f"/api/photos/{create_photo_via_api}").json()
+    items = [
+        {"inspection_id": create_inspection_via_api, "photo_path": stored["photo_path"],
+         "capture_date": str(date.today()), "caption": f"Bulk {i}", "content_hash": "b" * 64, "file_size": 10}
+        for i in range(2)
+    ]
+    response = client.post("/api/photos/bulk", json={"items": items})
+    assert response.status_code == 201
+    ids = response.json()["ids"]
+    assert len(ids) == 2
+    
+    # The hash and size come from the stored file, not from the request
+    for photo_id in ids:
+        photo = client.get(f"/api/photos/{photo_id}").json()
+        assert photo["photo_path"] == stored["photo_path"]
+        assert photo["content_hash"] == stored["content_hash"]
+        assert photo["file_size"] == stored["file_size"]
+    assert db.query(PhotoBlob).filter(PhotoBlob.content_hash == stored["content_hash"]).one().ref_count == 3
+    assert db.query(PhotoBlob).filter(PhotoBlob.content_hash == "b" * 64).first() is None
+    
+    # Deleting one of the records keeps the shared file
+    assert client.delete(f"/api/photos/{ids[0]}").status_code == 200
+    file_deletion_queue.drain(timeout=5)
+    assert os.path.exists(stored["photo_path"])
+    
+    response = client.post("/api/photos/bulk", json={"items": [dict(items[0], inspection_id=99999)]})
+    assert response.status_code == 404
+
+def test_create_photos_bulk_rejects_foreign_paths(client, create_inspection_via_api, tmp_path):
+    """Test that bulk photo paths must name existing files in the photo upload directory"""
+    from app.utils.file_utils import PDF_UPLOAD_DIR, PHOTO_UPLOAD_DIR
+    victim = tmp_path / "victim.jpg"
+    victim.write_bytes(b"not an upload")
+    os.makedirs(PDF_UPLOAD_DIR, exist_ok=True)
+    pdf_path = os.path.join(PDF_UPLOAD_DIR, "bulk_victim.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(b"%PDF-1.4")
+    
+    for photo_path in [
+        str(victim),
+        os.path.join(PHOTO_UPLOAD_DIR, "..", "pdfs", "bulk_victim.pdf"),
+        os.path.join(PHOTO_UPLOAD_DIR, "missing.jpg"),
+    ]:
+        item = {"inspection_id": create_inspection_via_api, "photo_path": photo_path,
+                "capture_date": str(date.today()), "content_hash": "c" * 64}
+        response = client.post("/api/photos/bulk", json={"items": [item]})
+        assert response.status_code == 422, photo_path
+    
+    assert victim.exists()
+    assert os.path.exists(pdf_path)
+    os.remove(pdf_path)
+
+def test_update_photo_rejects_foreign_paths(client, create_photo_via_api, tmp_path):
+    """Test that a photo cannot be pointed at a file outside the photo upload directory"""
+    victim = tmp_path / "victim.jpg"
+    victim.write_bytes(b"not an upload")
+    
+    response = client.patch(f"/api/photos/{create_photo_via_api}", json={"photo_path": str(victim)})
+    assert response.status_code == 422
+    assert client.delete(f"/api/photos/{create_photo_via_api}").status_code == 200
+    file_deletion_queue.drain(timeout=5)
+    assert victim.exists()
+
 def test_delete_inspection(client, create_inspection_via_api):
     """Test deleting an inspection via API"""
     inspection_id = create_inspection_via_api
@@ -313,6 +635,92 @@ def test_read_photos(client, create_inspection_via_api):
     response = client.get(f"/api/photos/?inspection_id={inspection_id}")
     assert response.status_code == 200
 
+def test_upload_rejected_before_the_body_is_read(client, create_inspection_via_api, monkeypatch):
+    """Test that uploads over the request limit get 413 from the declared length or while streaming"""
+    import re
+    from app.utils import request_limits
+    monkeypatch.setattr(request_limits, "UPLOAD_REQUEST_LIMITS", [(re.compile(r"^/api/photos/$"), 1024)])
+    data = {"inspection_id": str(create_inspection_via_api), "capture_date": str(date.today())}
+    
+    response = client.post("/api/photos/", data=data, files={"file": ("big.jpg", b"x" * 2048, "image/jpeg")})
+    assert response.status_code == 413
+    
+    # A browser on another origin must be able to read the 413
+    response = client.post("/api/photos/", data=data, files={"file": ("big.jpg", b"x" * 2048, "image/jpeg")},
+                           headers={"Origin": "https://app.example.com"})
+    assert response.status_code == 413
+    assert response.headers["access-control-allow-origin"]
+    
+    # Without a Content-Length the body is cut off once it passes the limit
+    def chunked_body():
+        yield b"x" * 600
+        yield b"x" * 600
+    response = client.post("/api/photos/", content=chunked_body(),
+                           headers={"Content-Type": "multipart/form-data; boundary=xyz"})
+    assert response.status_code == 413
+    assert client.get(f"/api/photos/?inspection_id={create_inspection_via_api}").json() == []
+    
+    response = client.post("/api/photos/", data=data, files={"file": ("small.jpg", b"x" * 100, "image/jpeg")})
+    assert response.status_code == 201
+
+def test_duplicate_upload_survives_concurrent_delete(client, create_inspection_via_api, db, monkeypatch):
+    """Test that a repeated upload keeps its own copy until its record holds a reference to the shared file"""
+    from app.services import crud
+    from app.utils.file_utils import PHOTO_UPLOAD_DIR
+    inspection_id = create_inspection_via_api
+    data = {"inspection_id": str(inspection_id), "capture_date": str(date.today())}
+    first = client.post("/api/photos/", data=data, files={"file": ("a.jpg", b"shared photo", "image/jpeg")}).json()
+    shared_path = first["photo_path"]
+    
+    # The last reference is deleted while the second upload is still in flight
+    async def delete_first(photo_path):
+        assert photo_path == shared_path
+        crud.delete_photo(db, first["id"])
+        assert file_deletion_queue.drain(timeout=5)
+        assert not os.path.exists(shared_path)
+        return {}
+    monkeypatch.setattr("app.api.photos.generate_thumbnails", delete_first)
+    
+    response = client.post("/api/photos/", data=data, files={"file": ("b.jpg", b"shared photo", "image/jpeg")})
+    assert response.status_code == 201
+    assert response.json()["photo_path"] == shared_path
+    with open(shared_path, "rb") as f:
+        assert f.read() == b"shared photo"
+    # No uploaded copy is left next to it
+    assert not [name for name in os.listdir(PHOTO_UPLOAD_DIR) if name.endswith("_b.jpg")]
+
+def test_upload_photos_batch(client, create_inspection_via_api, monkeypatch):
+    """Test uploading several photos in one request with a per-file failure"""
+    monkeypatch.setattr("app.utils.file_utils.MAX_PHOTO_UPLOAD_BYTES", 64)
+    files = [
+        ("files", ("batch_1.jpg", io.BytesIO(b"batch photo one"), "image/jpeg")),
+        ("files", ("batch_2.jpg", io.BytesIO(b"x" * 100), "image/jpeg")),
+        ("files", ("batch_3.jpg", io.BytesIO(b"batch photo three"), "image/jpeg")),
+    ]
+    data = {
+        "inspection_id": str(create_inspection_via_api),
+        "capture_dates": [str(date.today()), str(date.today()), str(date.today() - timedelta(days=1))],
+        "captions": ["First", "Second", ""],
+    }
+    response = client.post("/api/photos/batch", data=data, files=files)
+    assert response.status_code == 207
+    result = response.json()
+    assert result["created_count"] == 2
+    assert result["failed_count"] == 1
+    
+    first, oversized, third = result["items"]
+    assert oversized["photo_id"] is None
+    assert oversized["error"]
+    assert client.get(f"/api/photos/{first['photo_id']}").json()["caption"] == "First"
+    photo = client.get(f"/api/photos/{third['photo_id']}").json()
+    assert photo["caption"] is None
+    assert photo["capture_date"] == str(date.today() - timedelta(days=1))
+    
+    # Mismatched metadata is rejected before anything is stored
+    data["captions"] = ["Only one"]
+    response = client.post("/api/photos/batch", data=data, files=files)
+    assert response.status_code == 422
+
 def test_read_photo(client, create_photo_via_api, create_inspection_via_api):
     """Test reading a specific photo via API"""
     photo_id = create_photo_via_api
@@ -0,0 +1,81 @@
+import pytest
+from datetime import date, timedelta
+from fastapi import HTTPException
+from app.db.database import Base, async_database_url
+from app.models.models import Project, ConstructionInspection, InspectionPhoto
+from app.services import async_crud
+from app.utils.pagination import encode_cursor
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+
+@pytest.fixture
+async def async_db(tmp_path):
+    """An AsyncSession on a throwaway aiosqlite database with one project, inspection and photo"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    async with session_factory() as db:
+        project = Project(name="Async Project", location="Loc", contractor="Con",
+                          start_date=date.today(), end_date=date.today(), owner="async_owner")
+        db.add(project)
+        await db.flush()
+        for offset in range(3):
+            db.add(ConstructionInspection(
+                project_id=project.id, subproject_name=f"Sub {offset}", inspection_form_name="Form",
+                inspection_date=date.today() - timedelta(days=offset), location="Loc",
+                timing="檢驗停留點", result="合格"
+            ))
+        await db.flush()
+        db.add(InspectionPhoto(inspection_id=1, photo_path="async.jpg", capture_date=date.today()))
+        await db.commit()
+
+    async with session_factory() as db:
+        yield db
+    await engine.dispose()
+
+
+def test_async_database_url():
+    """Test that the async driver is derived from the configured URL"""
+    assert async_database_url("sqlite:///./data/app.db") == "sqlite+aiosqlite:///./data/app.db"
+    # In-memory databases are per connection and cannot be shared with a second engine
+    assert async_database_url("sqlite:///:memory:") is None
+
+
+async def test_async_reads(async_db):
+    """Test the async read variants against a real async engine"""
+    projects = await async_crud.get_projects(async_db, owner="async_owner")
+    assert [project.name for project in projects] == ["Async Project"]
+    assert await async_crud.get_projects(async_db, owner="nobody") == []
+
+    project = await async_crud.get_project_with_inspections(async_db, projects[0].id)
+    assert len(project.inspections) == 3
+
+    inspection = await async_crud.get_inspection_with_photos(async_db, 1)
+    assert [photo.photo_path for photo in inspection.photos] == ["async.jpg"]
+
+    photos = await async_crud.get_photos(async_db, inspection_id=1)
+    assert len(photos) == 1
+    assert (await async_crud.get_photo(async_db, photos[0].id)).photo_path == "async.jpg"
+
+    with pytest.raises(HTTPException) as excinfo:
+        await async_crud.get_photo(async_db, 9999)
+    assert excinfo.value.status_code == 404
+
+
+async def test_async_inspection_pages(async_db):
+    """Test that keyset pages work on select() statements"""
+    first_page = await async_crud.get_inspections(async_db, limit=2, project_id=1)
+    assert [inspection.inspection_date for inspection in first_page] == sorted(
+        inspection.inspection_date for inspection in first_page
+    )
+
+    last = first_page[-1]
+    cursor = encode_cursor([last.inspection_date, last.id])
+    second_page = await async_crud.get_inspections(async_db, limit=2, project_id=1, cursor=cursor)
+    assert len(second_page) == 1
+    assert second_page[0].id not in {inspection.id for inspection in first_page}
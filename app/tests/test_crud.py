@@ -1,14 +1,20 @@
 import pytest
+from contextlib import contextmanager
 from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.exc import InvalidRequestError
 from datetime import date, timedelta
 from app.services.crud import (
     get_projects, get_project, create_project, update_project, delete_project,
     get_inspections, get_inspection, create_inspection, update_inspection, delete_inspection,
     get_photos, get_photo, create_photo, update_photo, delete_photo,
-    get_projects_by_owner
+    get_projects_by_owner, acquire_photo_blob, release_photo_blob,
+    get_project_with_inspections, get_inspection_with_photos
 )
 from app.schemas import schemas
-from app.models.models import Project, ConstructionInspection, InspectionPhoto
+from app.models.models import Project, ConstructionInspection, InspectionPhoto, PhotoBlob
+from app.services.ownership import owner_cache, get_project_owner, verify_project_owner
+from app.utils import ttl_cache
 
 # Project CRUD tests
 def test_create_project(db, test_project_data):
@@ -88,6 +94,53 @@ def test_get_projects_by_owner(db, test_project_data):
     assert len(projects) >= 1
     assert all(p.owner == "different_owner" for p in projects)
 
+def test_project_owner_cache(db, test_project):
+    """Test that ownership checks select only the owner and are cached until the project changes"""
+    owner_cache.clear()
+    with count_queries(db) as statements:
+        assert get_project_owner(db, test_project.id) == test_project.owner
+        verify_project_owner(db, test_project.id, test_project.owner)
+    assert len(statements) == 1
+    assert "projects.name" not in statements[0]
+    
+    with pytest.raises(HTTPException) as excinfo:
+        verify_project_owner(db, test_project.id, "someone_else")
+    assert excinfo.value.status_code == 403
+    with pytest.raises(HTTPException) as excinfo:
+        get_project_owner(db, 99999)
+    assert excinfo.value.status_code == 404
+    
+    # Changing the owner invalidates the cached entry
+    project_data = schemas.ProjectCreate(
+        name=test_project.name, location=test_project.location, contractor=test_project.contractor,
+        start_date=test_project.start_date, end_date=test_project.end_date, owner="new_owner"
+    )
+    update_project(db, test_project.id, project_data)
+    assert get_project_owner(db, test_project.id) == "new_owner"
+    owner_cache.clear()
+
+def test_ttl_cache_evicts_and_expires(monkeypatch):
+    """Test that the shared cache drops the least recently used and expired entries"""
+    now = [1000.0]
+    monkeypatch.setattr(ttl_cache.time, "monotonic", lambda: now[0])
+    cache = ttl_cache.TTLCache(max_entries=2, ttl=30)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == "a"
+    cache.set(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a" and cache.get(3) == "c"
+    
+    cache.discard_where(lambda value: value == "c")
+    assert len(cache) == 1
+    now[0] += 30
+    assert cache.get(1) is None
+    assert len(cache) == 0
+    
+    disabled = ttl_cache.TTLCache(max_entries=0, ttl=30)
+    disabled.set(1, "a")
+    assert disabled.get(1) is None
+
 def test_update_project(db, test_project):
     """Test updating a project"""
     # Update the project
@@ -139,6 +192,52 @@ def test_get_inspection(db, test_inspection):
     assert inspection.id == test_inspection.id
     assert inspection.subproject_name == test_inspection.subproject_name
 
+@contextmanager
+def count_queries(db):
+    """Count the SQL statements issued on the session's connection"""
+    statements = []
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    connection = db.connection()
+    event.listen(connection, "before_cursor_execute", before_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(connection, "before_cursor_execute", before_execute)
+
+def test_nested_reads_use_constant_queries(db, test_project, test_inspection):
+    """Test that nested response shapes load their children up front"""
+    project_id, inspection_id = test_project.id, test_inspection.id
+    for i in range(5):
+        db.add(ConstructionInspection(
+            project_id=project_id, subproject_name=f"Sub {i}", inspection_form_name="Form",
+            inspection_date=date.today(), location="Loc", timing="檢驗停留點", result="合格"
+        ))
+        db.add(InspectionPhoto(
+            inspection_id=inspection_id, photo_path=f"photo_{i}.jpg", capture_date=date.today()
+        ))
+    db.commit()
+    db.expunge_all()
+
+    with count_queries(db) as statements:
+        project = get_project_with_inspections(db, project_id)
+        inspection = get_inspection_with_photos(db, inspection_id)
+    # One query for each parent and one for each child collection
+    assert len(statements) == 4
+
+    # Serializing the children needs no further round trips
+    with count_queries(db) as statements:
+        assert len(schemas.ProjectWithInspections.model_validate(project).inspections) == 6
+        assert len(schemas.InspectionWithPhotos.model_validate(inspection).photos) == 5
+    assert statements == []
+
+def test_strict_loading_rejects_lazy_loads(db, test_project, test_inspection):
+    """Test that list reads raise on relationships they did not load"""
+    db.expunge_all()
+    project = get_projects(db)[0]
+    with pytest.raises(InvalidRequestError):
+        project.inspections
+
 def test_update_inspection(db, test_inspection, test_update_inspection_data):
     """Test updating an inspection"""
     # Update the inspection
@@ -230,3 +329,38 @@ def test_delete_photo(db, test_photo):
     with pytest.raises(HTTPException) as excinfo:
         get_photo(db, test_photo.id)
     assert excinfo.value.status_code == 404
+
+def test_photo_blob_reference_counting(db):
+    """Test that shared photo blobs are released only by their last reference"""
+    content_hash = "a" * 64
+    
+    assert acquire_photo_blob(db, content_hash, "/path/to/a.jpg") == "/path/to/a.jpg"
+    # The same content stored under another name resolves to the first path
+    assert acquire_photo_blob(db, content_hash, "/path/to/a.jpeg") == "/path/to/a.jpg"
+    db.commit()
+    
+    blob = db.query(PhotoBlob).filter(PhotoBlob.content_hash == content_hash).first()
+    assert blob.ref_count == 2
+    
+    assert release_photo_blob(db, content_hash) is None
+    assert release_photo_blob(db, content_hash) == "/path/to/a.jpg"
+    db.commit()
+    assert db.query(PhotoBlob).filter(PhotoBlob.content_hash == content_hash).first() is None
+
+def test_acquire_photo_blobs_adds_to_blobs_inserted_meanwhile(db):
+    """Test that acquiring adds to a blob another writer inserted after this session last looked"""
+    from sqlalchemy import insert
+    from app.services.crud import acquire_photo_blobs
+    content_hash = "d" * 64
+    
+    # Another upload of the same content committed first
+    db.execute(insert(PhotoBlob).values(content_hash=content_hash, path="/path/to/first.jpg", ref_count=1))
+    rows = [
+        {"content_hash": content_hash, "photo_path": "/path/to/second.jpg"},
+        {"content_hash": content_hash, "photo_path": "/path/to/second.jpg"},
+        {"content_hash": None, "photo_path": "/path/to/legacy.jpg"},
+    ]
+    assert acquire_photo_blobs(db, rows) == ["/path/to/second.jpg"]
+    assert [row["photo_path"] for row in rows] == ["/path/to/first.jpg", "/path/to/first.jpg", "/path/to/legacy.jpg"]
+    db.commit()
+    assert db.query(PhotoBlob.ref_count).filter(PhotoBlob.content_hash == content_hash).scalar() == 3
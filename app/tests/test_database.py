@@ -1,4 +1,5 @@
 import pytest
+import os
 from sqlalchemy import text
 from app.db.database import Base
 from app.tests.conftest import engine, db
@@ -19,3 +20,150 @@ def test_create_tables(db):
     assert "projects" in tables
     assert "construction_inspections" in tables
     assert "inspection_photos" in tables
+
+def test_filter_indexes_exist(db):
+    """Test that the list filters and owner checks are backed by indexes"""
+    result = db.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='index'"
+    ))
+    indexes = [row[0] for row in result]
+    assert "ix_projects_owner" in indexes
+    assert "ix_construction_inspections_project_id_inspection_date" in indexes
+    assert "ix_inspection_photos_inspection_id_capture_date" in indexes
+
+def test_migrations_match_models():
+    """Test that upgrading an empty database to head yields exactly the model schema"""
+    from alembic import command
+    from alembic.config import Config
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import StaticPool
+
+    migration_engine = create_engine("sqlite://", poolclass=StaticPool)
+    config = Config(os.path.join(os.path.dirname(__file__), "..", "..", "alembic.ini"))
+    with migration_engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        diff = compare_metadata(MigrationContext.configure(connection), Base.metadata)
+    assert diff == []
+
+def test_migrate_creates_and_adopts_databases(tmp_path):
+    """Test that migrate builds a new database and adopts one made by create_all"""
+    from sqlalchemy import create_engine, inspect
+    from app.db.migrate import migrate
+
+    fresh_engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    head = migrate(fresh_engine)
+    assert "projects" in inspect(fresh_engine).get_table_names()
+    # Running it again is a no-op
+    assert migrate(fresh_engine) == head
+
+    legacy_engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=legacy_engine)
+    assert migrate(legacy_engine) == head
+    fresh_engine.dispose()
+    legacy_engine.dispose()
+
+# The schema create_tables() built before migrations existed
+ORIGINAL_SQLITE_SCHEMA = [
+    """CREATE TABLE projects (
+        id INTEGER NOT NULL, name VARCHAR(200) NOT NULL, location VARCHAR(200) NOT NULL,
+        contractor VARCHAR(100) NOT NULL, start_date DATE NOT NULL, end_date DATE NOT NULL,
+        owner VARCHAR(100) NOT NULL, PRIMARY KEY (id))""",
+    "CREATE INDEX ix_projects_id ON projects (id)",
+    """CREATE TABLE construction_inspections (
+        id INTEGER NOT NULL, project_id INTEGER NOT NULL, subproject_name VARCHAR(200) NOT NULL,
+        inspection_form_name VARCHAR(200) NOT NULL, inspection_date DATE NOT NULL,
+        location VARCHAR(200) NOT NULL, timing VARCHAR(20) NOT NULL, result VARCHAR(20) NOT NULL,
+        remark TEXT, pdf_path VARCHAR(255), created_at DATETIME, updated_at DATETIME,
+        PRIMARY KEY (id), FOREIGN KEY(project_id) REFERENCES projects (id))""",
+    "CREATE INDEX ix_construction_inspections_id ON construction_inspections (id)",
+    """CREATE TABLE inspection_photos (
+        id INTEGER NOT NULL, inspection_id INTEGER NOT NULL, photo_path VARCHAR(255) NOT NULL,
+        capture_date DATE NOT NULL, caption VARCHAR(255), PRIMARY KEY (id),
+        FOREIGN KEY(inspection_id) REFERENCES construction_inspections (id))""",
+    "CREATE INDEX ix_inspection_photos_id ON inspection_photos (id)",
+]
+
+def test_migrate_adopts_original_schema(tmp_path):
+    """Test that a database from the original create_tables() is upgraded to the models with its rows kept"""
+    from sqlalchemy import create_engine
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from app.db.migrate import migrate
+
+    original_engine = create_engine(f"sqlite:///{tmp_path / 'original.db'}")
+    with original_engine.begin() as connection:
+        for statement in ORIGINAL_SQLITE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text(
+            "INSERT INTO projects VALUES (1, 'Bridge', 'Taipei', 'ACME', '2024-01-01', '2024-12-31', 'owner')"
+        ))
+        connection.execute(text(
+            "INSERT INTO construction_inspections (id, project_id, subproject_name, inspection_form_name,"
+            " inspection_date, location, timing, result) VALUES (1, 1, 'Piers', 'Rebar', '2024-02-01', 'Pier 3',"
+            " '檢驗停留點', '合格')"
+        ))
+        connection.execute(text(
+            "INSERT INTO inspection_photos VALUES (1, 1, 'app/static/uploads/photos/p.jpg', '2024-02-01', NULL)"
+        ))
+
+    migrate(original_engine)
+    with original_engine.connect() as connection:
+        assert compare_metadata(MigrationContext.configure(connection), Base.metadata) == []
+        assert connection.execute(text("SELECT photo_path, content_hash FROM inspection_photos")).all() == [
+            ("app/static/uploads/photos/p.jpg", None)
+        ]
+        assert connection.execute(text("SELECT count(*) FROM jobs")).scalar() == 0
+    original_engine.dispose()
+
+def test_pool_idle_ping_and_metrics(tmp_path):
+    """Test that only idle connections are pinged and checkouts are timed"""
+    from sqlalchemy import create_engine
+    from app.db.pool import PoolMetrics, InstrumentedQueuePool, pool_options, install_idle_ping
+
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    options = pool_options(url)
+    assert options["poolclass"] is InstrumentedQueuePool
+    assert pool_options("sqlite:///:memory:") == {}
+
+    pool_engine = create_engine(url, **options)
+    ping_metrics = PoolMetrics()
+    install_idle_ping(pool_engine, ping_metrics, idle_seconds=3600)
+    checkouts_before = InstrumentedQueuePool.metrics.snapshot()["checkouts"]
+
+    for _ in range(3):
+        with pool_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    # Recently returned connections are reused without a ping
+    assert ping_metrics.pings == 0
+    assert InstrumentedQueuePool.metrics.snapshot()["checkouts"] - checkouts_before == 3
+
+    pool_engine.dispose()
+    idle_engine = create_engine(url, **options)
+    install_idle_ping(idle_engine, ping_metrics, idle_seconds=0)
+    for _ in range(2):
+        with idle_engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+    # The first checkout opens a fresh connection, the second finds it idle
+    assert ping_metrics.pings == 1
+    assert ping_metrics.ping_failures == 0
+    idle_engine.dispose()
+
+def test_db_pool_endpoint(client):
+    """Test the internal pool metrics endpoint"""
+    response = client.get("/internal/db-pool")
+    assert response.status_code == 200
+    status = response.json()["sync"]
+    for key in ("pool", "checkouts", "avg_wait_ms", "max_wait_ms", "timeouts"):
+        assert key in status
+
+def test_sync_read_db_is_opened_in_the_threadpool():
+    """Test that without the async engine read routes get a sync dependency, which FastAPI runs in the threadpool"""
+    import inspect
+    from app.db import database
+    if database.AsyncSessionLocal is not None:
+        pytest.skip("async read engine is enabled")
+    assert database.get_read_db is database._get_sync_read_db
+    assert inspect.isgeneratorfunction(database.get_read_db)
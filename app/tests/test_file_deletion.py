@@ -2,8 +2,9 @@ import pytest
 import os
 import shutil
 from unittest.mock import patch
-from app.models.models import InspectionPhoto, ConstructionInspection
+from app.models.models import InspectionPhoto, ConstructionInspection, PhotoBlob
 from app.utils.file_utils import PDF_UPLOAD_DIR, PHOTO_UPLOAD_DIR
+from app.services.file_cleanup import file_deletion_queue
 from datetime import date
 
 # 使用 conftest 中的 fixtures
@@ -63,7 +64,8 @@ def test_delete_inspection_with_pdf(client, test_inspection_with_pdf, mock_pdf_p
     response = client.get(f"/api/inspections/{test_inspection_with_pdf.id}")
     assert response.status_code == 404, "抽查記錄應該已從資料庫中刪除"
     
-    # 確認實體檔案已刪除
+    # 確認實體檔案已在背景刪除
+    assert file_deletion_queue.drain(timeout=5)
     assert not os.path.exists(mock_pdf_path), "PDF 實體檔案應該已被刪除"
 
 def test_delete_inspection_with_photos(client, db, test_project, mock_pdf_path, mock_photo_path):
@@ -94,24 +96,27 @@ def test_delete_inspection_with_photos(client, db, test_project, mock_pdf_path,
     db.add(photo)
     db.commit()
     db.refresh(photo)
+    # 批次刪除不會同步 session 中的物件，先記下 id
+    inspection_id, photo_id = inspection.id, photo.id
     
     # 確認檔案存在
     assert os.path.exists(mock_pdf_path), "測試 PDF 檔案應該存在"
     assert os.path.exists(mock_photo_path), "測試照片檔案應該存在"
     
     # 刪除抽查
-    response = client.delete(f"/api/inspections/{inspection.id}")
+    response = client.delete(f"/api/inspections/{inspection_id}")
     assert response.status_code == 200, "刪除抽查應該成功"
     
     # 確認資料庫記錄已刪除
-    response = client.get(f"/api/inspections/{inspection.id}")
+    response = client.get(f"/api/inspections/{inspection_id}")
     assert response.status_code == 404, "抽查記錄應該已從資料庫中刪除"
     
     # 確認照片記錄也被刪除
-    response = client.get(f"/api/photos/{photo.id}")
+    response = client.get(f"/api/photos/{photo_id}")
     assert response.status_code == 404, "照片記錄應該已從資料庫中刪除"
     
-    # 確認實體檔案已刪除
+    # 確認實體檔案已在背景刪除
+    assert file_deletion_queue.drain(timeout=5)
     assert not os.path.exists(mock_pdf_path), "PDF 實體檔案應該已被刪除"
     assert not os.path.exists(mock_photo_path), "照片實體檔案應該已被刪除"
 
@@ -143,6 +148,8 @@ def test_delete_project_cascade(client, db, test_project, mock_pdf_path, mock_ph
     db.add(photo)
     db.commit()
     db.refresh(photo)
+    # 批次刪除不會同步 session 中的物件，先記下 id
+    inspection_id, photo_id = inspection.id, photo.id
     
     # 確認檔案存在
     assert os.path.exists(mock_pdf_path), "測試 PDF 檔案應該存在"
@@ -157,14 +164,15 @@ def test_delete_project_cascade(client, db, test_project, mock_pdf_path, mock_ph
     assert response.status_code == 404, "專案記錄應該已從資料庫中刪除"
     
     # 確認抽查記錄已刪除
-    response = client.get(f"/api/inspections/{inspection.id}")
+    response = client.get(f"/api/inspections/{inspection_id}")
     assert response.status_code == 404, "抽查記錄應該已從資料庫中刪除"
     
     # 確認照片記錄已刪除
-    response = client.get(f"/api/photos/{photo.id}")
+    response = client.get(f"/api/photos/{photo_id}")
     assert response.status_code == 404, "照片記錄應該已從資料庫中刪除"
     
-    # 確認實體檔案已刪除
+    # 確認實體檔案已在背景刪除
+    assert file_deletion_queue.drain(timeout=5)
     assert not os.path.exists(mock_pdf_path), "PDF 實體檔案應該已被刪除"
     assert not os.path.exists(mock_photo_path), "照片實體檔案應該已被刪除"
 
@@ -232,9 +240,10 @@ def test_error_handling_when_file_not_exists(mock_remove, mock_exists, client, d
     mock_remove.side_effect = FileNotFoundError("模擬檔案不存在錯誤")
     
     # 創建測試數據
+    missing_path = os.path.join(PHOTO_UPLOAD_DIR, "missing_photo.jpg")  # 不存在的路徑
     photo = InspectionPhoto(
         inspection_id=test_inspection.id,
-        photo_path="/non/existent/path/photo.jpg",  # 不存在的路徑
+        photo_path=missing_path,
         capture_date=date.today(),
         caption="Test Caption"
     )
@@ -251,6 +260,166 @@ def test_error_handling_when_file_not_exists(mock_remove, mock_exists, client, d
     assert response.status_code == 404, "照片記錄應該已從資料庫中刪除"
     
     # 確認 os.path.exists 被調用
-    mock_exists.assert_called_with("/non/existent/path/photo.jpg")
+    mock_exists.assert_called_with(missing_path)
     # 確認 os.remove 被調用
-    mock_remove.assert_called_once_with("/non/existent/path/photo.jpg")
+    mock_remove.assert_called_once_with(missing_path)
+
+def test_duplicate_photo_uploads_share_one_file(client, db, test_project):
+    """測試相同內容的照片只儲存一份，並在最後一個引用刪除時才刪除檔案"""
+    inspection_ids = []
+    for _ in range(2):
+        inspection = ConstructionInspection(
+            project_id=test_project.id,
+            subproject_name="Test Subproject",
+            inspection_form_name="Test Form",
+            inspection_date=date.today(),
+            location="Test Location",
+            timing="檢驗停留點",
+            result="合格"
+        )
+        db.add(inspection)
+        db.commit()
+        db.refresh(inspection)
+        inspection_ids.append(inspection.id)
+    
+    # 將同一張照片上傳到兩個抽查
+    photo_ids = []
+    photo_paths = set()
+    for inspection_id in inspection_ids:
+        response = client.post(
+            "/api/photos/",
+            data={"inspection_id": str(inspection_id), "capture_date": str(date.today())},
+            files={"file": ("same.jpg", b"identical photo content", "image/jpeg")}
+        )
+        assert response.status_code == 201
+        photo_ids.append(response.json()["id"])
+        photo_paths.add(response.json()["photo_path"])
+    
+    # 確認兩筆記錄共用同一個檔案
+    assert len(photo_paths) == 1, "相同內容的照片應該共用同一個檔案"
+    photo_path = photo_paths.pop()
+    assert os.path.exists(photo_path)
+    
+    # 刪除第一個引用，檔案應該保留
+    response = client.delete(f"/api/photos/{photo_ids[0]}")
+    assert response.status_code == 200
+    assert os.path.exists(photo_path), "仍有其他引用時不應刪除檔案"
+    
+    # 刪除最後一個引用所屬的抽查，檔案應該被刪除
+    response = client.delete(f"/api/inspections/{inspection_ids[1]}")
+    assert response.status_code == 200
+    assert file_deletion_queue.drain(timeout=5)
+    assert not os.path.exists(photo_path), "最後一個引用刪除後應刪除檔案"
+
+def test_deletion_queue_retries_failed_removals(tmp_path):
+    """測試背景刪除失敗時會重試，檔案不存在視為已刪除"""
+    from app.services.file_cleanup import FileDeletionQueue
+    
+    locked_path = tmp_path / "locked.jpg"
+    locked_path.write_bytes(b"locked")
+    real_remove = os.remove
+    failures = []
+    
+    def flaky_remove(path):
+        # 前兩次模擬檔案被鎖定
+        if path == str(locked_path) and len(failures) < 2:
+            failures.append(path)
+            raise PermissionError("file is locked")
+        real_remove(path)
+    
+    queue = FileDeletionQueue(max_attempts=3, retry_seconds=60)
+    with patch("app.services.file_cleanup.os.remove", side_effect=flaky_remove):
+        queue.enqueue([str(locked_path), str(tmp_path / "missing.jpg")])
+        assert queue.drain(timeout=5)
+    queue.stop()
+    
+    assert len(failures) == 2
+    assert not locked_path.exists(), "重試後應刪除檔案"
+
+def test_deletion_queue_keeps_photos_referenced_again(client, db, test_inspection):
+    """測試照片在等待刪除期間又被上傳時，背景刪除會保留檔案與衍生圖"""
+    from app.services.file_cleanup import schedule_photo_deletions
+    from app.utils.image_utils import derived_image_paths
+    
+    response = client.post(
+        "/api/photos/",
+        data={"inspection_id": str(test_inspection.id), "capture_date": str(date.today())},
+        files={"file": ("again.jpg", b"photo uploaded again", "image/jpeg")}
+    )
+    assert response.status_code == 201
+    photo_path = response.json()["photo_path"]
+    
+    # 模擬前一份相同照片的刪除還在重試，新的上傳已重新引用同一個檔案
+    schedule_photo_deletions([photo_path])
+    assert file_deletion_queue.drain(timeout=5)
+    assert os.path.exists(photo_path), "仍被引用的照片不應被刪除"
+    
+    # 引用消失後才刪除
+    assert client.delete(f"/api/photos/{response.json()['id']}").status_code == 200
+    assert file_deletion_queue.drain(timeout=5)
+    assert not os.path.exists(photo_path)
+    assert not any(os.path.exists(path) for path in derived_image_paths(photo_path))
+
+def test_deletion_queue_retries_reference_checks(tmp_path):
+    """測試無法確認引用時保留檔案並稍後重試"""
+    from app.services.file_cleanup import FileDeletionQueue
+    
+    photo_path = tmp_path / "photo.jpg"
+    photo_path.write_bytes(b"photo")
+    answers = [RuntimeError("database unavailable"), True, False]
+    
+    def is_referenced(path):
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+    
+    queue = FileDeletionQueue(max_attempts=3, retry_seconds=60, is_referenced=is_referenced)
+    queue.enqueue([str(photo_path)], unless_referenced=str(photo_path))
+    assert queue.drain(timeout=5)
+    assert photo_path.exists(), "仍被引用時應保留檔案"
+    
+    queue.enqueue([str(photo_path)], unless_referenced=str(photo_path))
+    assert queue.drain(timeout=5)
+    queue.stop()
+    assert not photo_path.exists()
+    assert answers == []
+
+def test_delete_project_releases_shared_photos(client, db, test_project):
+    """測試刪除專案時一次釋放跨抽查共用的照片"""
+    inspection_ids = []
+    for _ in range(2):
+        response = client.post("/api/inspections/", json={
+            "project_id": test_project.id,
+            "subproject_name": "Test Subproject",
+            "inspection_form_name": "Test Form",
+            "inspection_date": str(date.today()),
+            "location": "Test Location",
+            "timing": "檢驗停留點",
+            "result": "合格"
+        })
+        assert response.status_code == 201
+        inspection_ids.append(response.json()["id"])
+    
+    # 同一張照片在兩個抽查中各上傳兩次，共四個引用
+    photo_paths = set()
+    for inspection_id in inspection_ids * 2:
+        response = client.post(
+            "/api/photos/",
+            data={"inspection_id": str(inspection_id), "capture_date": str(date.today())},
+            files={"file": ("shared.jpg", b"shared photo content", "image/jpeg")}
+        )
+        assert response.status_code == 201
+        photo_paths.add(response.json()["photo_path"])
+    assert len(photo_paths) == 1
+    photo_path = photo_paths.pop()
+    
+    project_id = test_project.id
+    response = client.delete(f"/api/projects/{project_id}", headers={"owner": "test_owner"})
+    assert response.status_code == 200
+    assert response.json()["id"] == project_id
+    
+    assert db.query(PhotoBlob).count() == 0, "所有引用刪除後應移除 blob 記錄"
+    assert db.query(InspectionPhoto).filter(InspectionPhoto.inspection_id.in_(inspection_ids)).count() == 0
+    assert file_deletion_queue.drain(timeout=5)
+    assert not os.path.exists(photo_path)
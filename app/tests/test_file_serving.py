@@ -0,0 +1,130 @@
+import os
+import hashlib
+import pytest
+from app.api import files
+from app.utils.file_serving import FILE_CACHE_CONTROL, ZEROCOPY_EXTENSION, StoredFileResponse, parse_range
+
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def stored_files(tmp_path, monkeypatch):
+    """A content-addressed photo and a UUID-named PDF in throwaway upload directories"""
+    photo_dir, pdf_dir = tmp_path / "photos", tmp_path / "pdfs"
+    photo_dir.mkdir()
+    pdf_dir.mkdir()
+    monkeypatch.setattr(files, "SERVED_DIRS", {"pdfs": str(pdf_dir), "photos": str(photo_dir)})
+
+    content_hash = hashlib.sha256(CONTENT).hexdigest()
+    (photo_dir / f"{content_hash}.jpg").write_bytes(CONTENT)
+    (pdf_dir / "0b7c5e1a_report.pdf").write_bytes(CONTENT)
+    (pdf_dir / "uploading.pdf.part").write_bytes(CONTENT)
+    return {
+        "photo": f"/app/static/uploads/photos/{content_hash}.jpg",
+        "photo_etag": f'"{content_hash}"',
+        "pdf": "/app/static/uploads/pdfs/0b7c5e1a_report.pdf",
+    }
+
+
+def test_serves_uploads_as_immutable(client, stored_files):
+    """Test that uploads are sent whole with immutable caching and a strong ETag"""
+    response = client.get(stored_files["photo"])
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["cache-control"] == FILE_CACHE_CONTROL
+    assert response.headers["etag"] == stored_files["photo_etag"]
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-type"] == "image/jpeg"
+
+    pdf = client.get(stored_files["pdf"])
+    assert pdf.status_code == 200
+    assert pdf.headers["content-type"] == "application/pdf"
+    assert not pdf.headers["etag"].startswith("W/")
+
+    head = client.head(stored_files["photo"])
+    assert head.status_code == 200
+    assert head.content == b""
+    assert head.headers["content-length"] == str(len(CONTENT))
+
+
+def test_conditional_requests(client, stored_files):
+    """Test that a matching ETag or modification date is answered with 304"""
+    response = client.get(stored_files["photo"], headers={"If-None-Match": f'W/{stored_files["photo_etag"]}'})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == stored_files["photo_etag"]
+
+    last_modified = client.get(stored_files["pdf"]).headers["last-modified"]
+    assert client.get(stored_files["pdf"], headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get(stored_files["pdf"], headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_range_requests(client, stored_files):
+    """Test single byte ranges, suffix ranges, If-Range and unsatisfiable ranges"""
+    response = client.get(stored_files["photo"], headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+    suffix = client.get(stored_files["photo"], headers={"Range": "bytes=-16"})
+    assert suffix.status_code == 206
+    assert suffix.content == CONTENT[-16:]
+
+    stale = client.get(stored_files["photo"], headers={"Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+    beyond = client.get(stored_files["photo"], headers={"Range": f"bytes={len(CONTENT)}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_parse_range():
+    """Test the byte range parser, including ranges it ignores"""
+    assert parse_range("bytes=0-0", 100) == (0, 0)
+    assert parse_range("bytes=90-200", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=5-1", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_rejects_unserved_paths(client, stored_files):
+    """Test that in-flight uploads, other directories and missing files are 404"""
+    assert client.get("/app/static/uploads/pdfs/uploading.pdf.part").status_code == 404
+    assert client.get("/app/static/uploads/thumbnails/x.jpg").status_code == 404
+    assert client.get("/app/static/uploads/photos/missing.jpg").status_code == 404
+
+
+def test_accel_redirect_mode(client, stored_files, monkeypatch):
+    """Test that the transfer is handed to the front proxy when configured"""
+    monkeypatch.setattr(files, "FILE_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+    monkeypatch.setattr("app.utils.file_serving.FILE_ACCEL_REDIRECT_PREFIX", "/protected-uploads/")
+
+    response = client.get("/app/static/uploads/pdfs/0b7c5e1a_report.pdf")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["x-accel-redirect"] == "/protected-uploads/pdfs/0b7c5e1a_report.pdf"
+    assert response.headers["cache-control"] == FILE_CACHE_CONTROL
+
+
+async def test_zero_copy_send(tmp_path):
+    """Test that servers with the zero-copy extension get the file descriptor and range"""
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(CONTENT)
+    response = StoredFileResponse(str(path), os.stat(path), {"range": "bytes=100-199"})
+
+    messages = []
+
+    async def send(message):
+        if message["type"] == ZEROCOPY_EXTENSION:
+            os.lseek(message["file"], message["offset"], os.SEEK_SET)
+            message = dict(message, body=os.read(message["file"], message["count"]))
+        messages.append(message)
+
+    await response({"type": "http", "extensions": {ZEROCOPY_EXTENSION: {}}}, None, send)
+    assert messages[0]["status"] == 206
+    assert messages[1]["type"] == ZEROCOPY_EXTENSION
+    assert messages[1]["body"] == CONTENT[100:200]
@@ -1,14 +1,20 @@
 import pytest
 import os
+import io
 import shutil
-from fastapi import UploadFile
-from unittest.mock import MagicMock, patch
+import hashlib
+from fastapi import UploadFile, HTTPException
+from unittest.mock import patch
+from app.utils import file_utils
 from app.utils.file_utils import (
     ensure_upload_dirs,
     save_upload_file,
     save_pdf_file,
     save_photo_file,
     generate_inspection_pdf,
+    merge_inspection_pdf_with_photos,
+    calculate_project_files_size,
+    reconcile_project_file_sizes,
     PDF_UPLOAD_DIR,
     PHOTO_UPLOAD_DIR
 )
@@ -43,19 +49,17 @@ def test_ensure_upload_dirs(cleanup_upload_dirs):
 @pytest.mark.asyncio
 async def test_save_upload_file(cleanup_upload_dirs):
     """Test saving an uploaded file"""
-    # Create a mock UploadFile
-    mock_file = MagicMock(spec=UploadFile)
-    mock_file.filename = "test.txt"
-    # Use a coroutine for read method
-    async def mock_read():
-        return b"test content"
-    mock_file.read = mock_read
+    # Create an UploadFile backed by an in-memory stream
+    mock_file = UploadFile(file=io.BytesIO(b"test content"), filename="test.txt")
     
     # Call the function
-    file_path = await save_upload_file(mock_file, PDF_UPLOAD_DIR)
+    stored = await save_upload_file(mock_file, PDF_UPLOAD_DIR)
+    file_path = stored.path
     
     # Check that the file was saved
     assert os.path.exists(file_path)
+    assert stored.size == len(b"test content")
+    assert stored.sha256 == hashlib.sha256(b"test content").hexdigest()
     with open(file_path, "rb") as f:
         content = f.read()
         assert content == b"test content"
@@ -64,16 +68,11 @@ async def test_save_upload_file(cleanup_upload_dirs):
 @pytest.mark.asyncio
 async def test_save_pdf_file(cleanup_upload_dirs):
     """Test saving a PDF file"""
-    # Create a mock UploadFile
-    mock_file = MagicMock(spec=UploadFile)
-    mock_file.filename = "test.pdf"
-    # Use a coroutine for read method
-    async def mock_read():
-        return b"%PDF-1.5\ntest pdf content"
-    mock_file.read = mock_read
+    # Create an UploadFile backed by an in-memory stream
+    mock_file = UploadFile(file=io.BytesIO(b"%PDF-1.5\ntest pdf content"), filename="test.pdf")
     
     # Call the function
-    file_path = await save_pdf_file(mock_file)
+    file_path = (await save_pdf_file(mock_file)).path
     
     # Check that the file was saved in the PDF directory
     assert os.path.exists(file_path)
@@ -86,16 +85,11 @@ async def test_save_pdf_file(cleanup_upload_dirs):
 @pytest.mark.asyncio
 async def test_save_photo_file(cleanup_upload_dirs):
     """Test saving a photo file"""
-    # Create a mock UploadFile
-    mock_file = MagicMock(spec=UploadFile)
-    mock_file.filename = "test.jpg"
-    # Use a coroutine for read method
-    async def mock_read():
-        return b"test image content"
-    mock_file.read = mock_read
+    # Create an UploadFile backed by an in-memory stream
+    mock_file = UploadFile(file=io.BytesIO(b"test image content"), filename="test.jpg")
     
     # Call the function
-    file_path = await save_photo_file(mock_file)
+    file_path = (await save_photo_file(mock_file)).path
     
     # Check that the file was saved in the photo directory
     assert os.path.exists(file_path)
@@ -105,6 +99,35 @@ async def test_save_photo_file(cleanup_upload_dirs):
         assert content == b"test image content"
 
 
+@pytest.mark.asyncio
+async def test_save_upload_file_streams_in_chunks(cleanup_upload_dirs):
+    """Test that large uploads are copied chunk by chunk with a running digest"""
+    content = os.urandom(10 * 1024 + 7)
+    mock_file = UploadFile(file=io.BytesIO(content), filename="big.bin")
+    
+    with patch.object(file_utils, "UPLOAD_CHUNK_SIZE", 1024):
+        stored = await save_upload_file(mock_file, PDF_UPLOAD_DIR)
+    
+    assert stored.size == len(content)
+    assert stored.sha256 == hashlib.sha256(content).hexdigest()
+    with open(stored.path, "rb") as f:
+        assert f.read() == content
+    assert not os.path.exists(stored.path + file_utils.TEMP_FILE_SUFFIX)
+
+
+@pytest.mark.asyncio
+async def test_save_upload_file_rejects_oversized_file(cleanup_upload_dirs):
+    """Test that an upload over the size limit is aborted and leaves nothing behind"""
+    mock_file = UploadFile(file=io.BytesIO(b"x" * 4096), filename="too_big.pdf")
+    
+    with patch.object(file_utils, "UPLOAD_CHUNK_SIZE", 1024):
+        with pytest.raises(HTTPException) as excinfo:
+            await save_upload_file(mock_file, PDF_UPLOAD_DIR, max_size=2048)
+    
+    assert excinfo.value.status_code == 413
+    assert not any("too_big.pdf" in name for name in os.listdir(PDF_UPLOAD_DIR))
+
+
 def test_generate_inspection_pdf(cleanup_upload_dirs):
     """Test generating an inspection PDF"""
     # Create mock inspection data
@@ -133,3 +156,112 @@ def test_generate_inspection_pdf(cleanup_upload_dirs):
     with open(file_path, "rb") as f:
         content = f.read()
         assert content.startswith(b"%PDF")
+
+
+
+def test_merge_inspection_pdf_with_photos(cleanup_upload_dirs, tmp_path):
+    """Test that the photo pages are appended in memory and written once"""
+    from PIL import Image
+    from PyPDF2 import PdfReader
+    
+    class MockInspection:
+        subproject_name = "Test Subproject"
+        inspection_form_name = "Test Form"
+        inspection_date = "2025-04-29"
+        location = "Test Location"
+        timing = "檢驗停留點"
+        result = "合格"
+        remark = "Test remark"
+    
+    inspection_pdf = generate_inspection_pdf(MockInspection(), [])
+    photo_path = str(tmp_path / "site.jpg")
+    Image.new("RGB", (64, 48), "red").save(photo_path)
+    photos = [{"photo_path": photo_path, "capture_date": "2025-04-29", "caption": f"Photo {i}"} for i in range(4)]
+    
+    before = set(os.listdir(PDF_UPLOAD_DIR))
+    output_path = os.path.join(PDF_UPLOAD_DIR, "merged_test.pdf")
+    assert merge_inspection_pdf_with_photos(inspection_pdf, photos, output_path) == output_path
+    
+    # Only the merged file is added; no temporary photo PDF or partial file is left behind
+    assert set(os.listdir(PDF_UPLOAD_DIR)) - before == {"merged_test.pdf"}
+    assert len(PdfReader(output_path).pages) == len(PdfReader(inspection_pdf).pages) + 1
+
+
+def test_project_storage_uses_recorded_sizes(client, create_inspection_via_api, cleanup_upload_dirs):
+    """Test that storage totals come from sizes recorded at upload time"""
+    inspection_id = create_inspection_via_api
+    project_id = client.get(f"/api/inspections/{inspection_id}").json()["project_id"]
+    
+    client.post(
+        f"/api/inspections/{inspection_id}/upload-pdf",
+        files={"file": ("scan.pdf", b"%PDF-1.4" + b"x" * 992, "application/pdf")}
+    )
+    response = client.post(
+        "/api/photos/",
+        data={"inspection_id": str(inspection_id), "capture_date": "2025-01-01"},
+        files={"file": ("site.jpg", b"y" * 500, "image/jpeg")}
+    )
+    assert response.json()["file_size"] == 500
+    
+    # Sizes no longer depend on the files being present
+    with patch("os.path.getsize", side_effect=AssertionError("filesystem should not be read")):
+        response = client.get(f"/api/projects/{project_id}/storage")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_size_bytes"] == 1500
+    assert data["file_count"] == 2
+    assert data["pdf_count"] == 1
+    assert data["photo_count"] == 1
+    assert data["unsized_file_count"] == 0
+    assert "details" not in data
+    
+    response = client.get(f"/api/projects/{project_id}/storage", params={"include_files": True})
+    details = response.json()["details"]
+    assert len(details["pdf_files"]) == 1
+    assert len(details["photo_files"]) == 1
+
+
+def test_project_storage_counts_the_project_report(db, test_project):
+    """Test that the consolidated project report is part of the storage totals"""
+    test_project.report_pdf_path = os.path.join(PDF_UPLOAD_DIR, "project_report.pdf")
+    test_project.report_pdf_size = 4096
+    db.commit()
+    
+    storage = calculate_project_files_size(db, test_project.id, include_files=True)
+    assert storage["total_size_bytes"] == 4096
+    assert storage["pdf_count"] == 1
+    assert storage["file_count"] == 1
+    assert storage["unsized_file_count"] == 0
+    assert storage["details"]["pdf_files"] == [test_project.report_pdf_path]
+    
+    test_project.report_pdf_size = None
+    db.commit()
+    assert calculate_project_files_size(db, test_project.id)["unsized_file_count"] == 1
+    assert reconcile_project_file_sizes(db, test_project.id)["updated_count"] == 1
+    assert test_project.report_pdf_size == 0
+
+def test_reconcile_project_file_sizes(db, test_project, test_inspection, test_photo, mock_pdf_path, mock_photo_path):
+    """Test that reconcile records the sizes found on disk"""
+    test_inspection.pdf_path = mock_pdf_path
+    db.commit()
+    
+    storage = calculate_project_files_size(db, test_project.id)
+    assert storage["total_size_bytes"] == 0
+    assert storage["unsized_file_count"] == 2
+    
+    result = reconcile_project_file_sizes(db, test_project.id)
+    assert result["updated_count"] == 2
+    
+    storage = calculate_project_files_size(db, test_project.id)
+    assert storage["total_size_bytes"] == os.path.getsize(mock_pdf_path) + os.path.getsize(mock_photo_path)
+    assert storage["unsized_file_count"] == 0
+    
+    # Nothing changes on a second pass
+    assert reconcile_project_file_sizes(db, test_project.id)["updated_count"] == 0
+
+
+def test_project_storage_missing_project(db):
+    """Test storage info for a non-existent project"""
+    storage = calculate_project_files_size(db, 999)
+    assert storage["exists"] is False
+    assert storage["file_count"] == 0
@@ -0,0 +1,132 @@
+import pytest
+import os
+import io
+import shutil
+from datetime import date
+from PIL import Image
+from app.utils.image_utils import (
+    ThumbnailSize,
+    THUMBNAIL_DIR,
+    THUMBNAIL_SIZES,
+    PDF_IMAGE_DIR,
+    build_thumbnails,
+    thumbnail_path,
+    prepare_pdf_image,
+    derived_image_paths,
+)
+from app.tests.conftest import TEST_PHOTO_DIR
+
+
+@pytest.fixture(scope="function")
+def cleanup_thumbnails():
+    """Clean up generated thumbnails after tests"""
+    yield
+    for directory in (THUMBNAIL_DIR, PDF_IMAGE_DIR):
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+
+
+def make_jpeg_bytes(width=400, height=200, orientation=None):
+    """Create JPEG bytes, optionally tagged with an EXIF orientation"""
+    buffer = io.BytesIO()
+    img = Image.new("RGB", (width, height), color=(200, 80, 40))
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        img.save(buffer, "JPEG", exif=exif)
+    else:
+        img.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def test_build_thumbnails_applies_exif_orientation(cleanup_thumbnails):
+    """Test that every size is built and EXIF rotation is applied"""
+    photo_path = os.path.join(TEST_PHOTO_DIR, "rotated.jpg")
+    with open(photo_path, "wb") as f:
+        # Orientation 6 means the camera was rotated 90 degrees clockwise
+        f.write(make_jpeg_bytes(400, 200, orientation=6))
+
+    paths = build_thumbnails(photo_path)
+
+    assert set(paths) == {size.value for size in ThumbnailSize}
+    with Image.open(paths["small"]) as small:
+        assert small.format == "JPEG"
+        # Portrait after rotation, longest edge capped at the small size
+        assert small.size == (THUMBNAIL_SIZES[ThumbnailSize.SMALL] // 2, THUMBNAIL_SIZES[ThumbnailSize.SMALL])
+    with Image.open(paths["large"]) as large:
+        # Never upscaled beyond the source
+        assert large.size == (200, 400)
+
+
+def test_thumbnail_endpoint(client, create_inspection_via_api, cleanup_thumbnails):
+    """Test serving a thumbnail for an uploaded photo"""
+    response = client.post(
+        "/api/photos/",
+        data={"inspection_id": str(create_inspection_via_api), "capture_date": str(date.today())},
+        files={"file": ("site.jpg", make_jpeg_bytes(1600, 1200), "image/jpeg")}
+    )
+    assert response.status_code == 201
+    photo = response.json()
+
+    # The ingest stage already produced the derivatives
+    assert os.path.exists(thumbnail_path(photo["photo_path"], ThumbnailSize.MEDIUM))
+
+    response = client.get(f"/api/photos/{photo['id']}/thumbnail", params={"size": "medium"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    with Image.open(io.BytesIO(response.content)) as img:
+        assert img.size == (480, 360)
+
+    # Missing derivatives are rebuilt on demand
+    os.remove(thumbnail_path(photo["photo_path"], ThumbnailSize.SMALL))
+    response = client.get(f"/api/photos/{photo['id']}/thumbnail")
+    assert response.status_code == 200
+
+    # Invalid sizes are rejected
+    response = client.get(f"/api/photos/{photo['id']}/thumbnail", params={"size": "huge"})
+    assert response.status_code == 422
+
+    # Deleting the last reference removes the derivatives as well
+    client.delete(f"/api/photos/{photo['id']}")
+    assert not os.path.exists(thumbnail_path(photo["photo_path"], ThumbnailSize.MEDIUM))
+
+
+def test_thumbnail_endpoint_rejects_non_image(client, create_photo_via_api, cleanup_thumbnails):
+    """Test that a photo which cannot be decoded returns 415"""
+    response = client.get(f"/api/photos/{create_photo_via_api}/thumbnail")
+    assert response.status_code == 415
+
+
+def test_prepare_pdf_image_resamples_to_slot(cleanup_thumbnails):
+    """Test that photos are downscaled for their PDF slot and cached"""
+    photo_path = os.path.join(TEST_PHOTO_DIR, "large.jpg")
+    with open(photo_path, "wb") as f:
+        f.write(make_jpeg_bytes(4000, 3000))
+
+    prepared = prepare_pdf_image(photo_path, 400, 300, dpi=150)
+    assert prepared != photo_path
+    with Image.open(prepared) as img:
+        # 400 x 300 pt at 150 DPI
+        assert img.size == (834, 625)
+
+    # The cached copy is reused while it is newer than the source
+    mtime = os.path.getmtime(prepared)
+    assert prepare_pdf_image(photo_path, 400, 300, dpi=150) == prepared
+    assert os.path.getmtime(prepared) == mtime
+    assert prepared in derived_image_paths(photo_path)
+
+    # Small photos are not upscaled
+    small_path = os.path.join(TEST_PHOTO_DIR, "small.jpg")
+    with open(small_path, "wb") as f:
+        f.write(make_jpeg_bytes(100, 80))
+    with Image.open(prepare_pdf_image(small_path, 400, 300)) as img:
+        assert img.size == (100, 80)
+
+
+def test_prepare_pdf_image_falls_back_to_original(cleanup_thumbnails):
+    """Test that a photo which cannot be decoded is embedded as is"""
+    photo_path = os.path.join(TEST_PHOTO_DIR, "broken.jpg")
+    with open(photo_path, "wb") as f:
+        f.write(b"not an image")
+
+    assert prepare_pdf_image(photo_path, 400, 300) == photo_path
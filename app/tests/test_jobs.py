@@ -0,0 +1,352 @@
+import pytest
+import os
+import json
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from app.models.models import Job, JobStatusEnum
+from app.services import jobs
+from app.services.file_cleanup import file_deletion_queue
+from app.utils.file_utils import REPORT_SECTION_DIR
+
+
+def test_generate_pdf_job_lifecycle(client, db, create_inspection_via_api):
+    """Test that generate-pdf returns a job which the worker completes"""
+    inspection_id = create_inspection_via_api
+    
+    response = client.post(f"/api/inspections/{inspection_id}/generate-pdf")
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    
+    # Not finished yet
+    response = client.get(f"/api/jobs/{job_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "queued"
+    assert client.get(f"/api/jobs/{job_id}/result").status_code == 409
+    
+    # Render for real, inline instead of in the process pool
+    job = jobs.process_next_job(db)
+    assert job.id == job_id
+    assert job.attempts == 1
+    
+    response = client.get(f"/api/jobs/{job_id}")
+    assert response.json()["status"] == "succeeded"
+    
+    result = client.get(f"/api/jobs/{job_id}/result").json()
+    assert result["inspection_id"] == inspection_id
+    assert os.path.exists(result["pdf_path"])
+    assert client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"] == result["pdf_path"]
+    
+    os.remove(result["pdf_path"])
+
+
+def test_generate_pdf_reuses_unchanged_report(client, db, create_inspection_via_api):
+    """Test that an unchanged inspection returns its cached report without rendering"""
+    inspection_id = create_inspection_via_api
+    
+    first_job_id = client.post(f"/api/inspections/{inspection_id}/generate-pdf").json()["id"]
+    jobs.process_next_job(db)
+    first_path = client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"]
+    assert os.path.exists(first_path)
+    job_count = db.query(Job).count()
+    
+    # Same content: the job that rendered it is returned, nothing queued or recorded
+    with patch("app.services.jobs.generate_inspection_pdf") as mock_generate_pdf:
+        for _ in range(3):
+            response = client.post(f"/api/inspections/{inspection_id}/generate-pdf")
+            assert response.status_code == 200
+            assert response.json()["status"] == "succeeded"
+            assert response.json()["id"] == first_job_id
+        result = client.get(f"/api/jobs/{first_job_id}/result").json()
+        assert result["pdf_path"] == first_path
+        assert jobs.process_next_job(db) is None
+        mock_generate_pdf.assert_not_called()
+    assert db.query(Job).count() == job_count
+    
+    # Without the rendering job (e.g. purged) one finished job is recorded and then reused
+    db.query(Job).filter(Job.id == first_job_id).delete()
+    db.commit()
+    cached_ids = {client.post(f"/api/inspections/{inspection_id}/generate-pdf").json()["id"] for _ in range(2)}
+    assert len(cached_ids) == 1
+    assert client.get(f"/api/jobs/{cached_ids.pop()}/result").json()["cached"] is True
+    assert db.query(Job).count() == job_count
+    
+    # Changed content: rendered again and the stale report is removed
+    client.put(f"/api/inspections/{inspection_id}", json={"result": "不合格", "remark": "changed"})
+    response = client.post(f"/api/inspections/{inspection_id}/generate-pdf")
+    assert response.status_code == 202
+    jobs.process_next_job(db)
+    second_path = client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"]
+    assert second_path != first_path
+    assert os.path.exists(second_path)
+    assert not os.path.exists(first_path)
+    
+    # An uploaded PDF is never mistaken for the cached render
+    client.post(
+        f"/api/inspections/{inspection_id}/upload-pdf",
+        files={"file": ("scan.pdf", b"%PDF-1.4 scanned", "application/pdf")}
+    )
+    response = client.post(f"/api/inspections/{inspection_id}/generate-pdf")
+    assert response.status_code == 202
+    jobs.process_next_job(db)
+    
+    os.remove(client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"])
+
+
+
+@pytest.fixture
+def project_with_inspections(client, create_project_via_api, test_inspection_data):
+    """A project with three inspections in two subprojects"""
+    inspection_ids = []
+    for subproject, form in (("Foundation", "Rebar"), ("Foundation", "Concrete"), ("Roof", "Waterproofing")):
+        data = dict(test_inspection_data, project_id=create_project_via_api,
+                    subproject_name=subproject, inspection_form_name=form)
+        inspection_ids.append(client.post("/api/inspections/", json=data).json()["id"])
+    yield create_project_via_api, inspection_ids
+    for path in glob.glob(os.path.join(REPORT_SECTION_DIR, "section_*.pdf")):
+        os.remove(path)
+
+
+def test_project_report_job(client, db, project_with_inspections):
+    """Test the consolidated report: sections, table of contents, bookmarks and progress"""
+    from PyPDF2 import PdfReader
+    project_id, inspection_ids = project_with_inspections
+    
+    response = client.post(f"/api/projects/{project_id}/report")
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    
+    # Sections render in parallel in the pool; a thread pool stands in for processes
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        job = jobs.process_next_job(db, executor)
+    assert job.status == "succeeded", job.error
+    
+    data = client.get(f"/api/jobs/{job_id}").json()
+    assert (data["progress_done"], data["progress_total"]) == (3, 3)
+    result = client.get(f"/api/jobs/{job_id}/result").json()
+    assert result["sections"] == result["rendered_sections"] == 3
+    assert client.get(f"/api/projects/{project_id}").json()["report_pdf_path"] == result["pdf_path"]
+    
+    report = PdfReader(result["pdf_path"])
+    section_pages = sum(
+        len(PdfReader(jobs.report_section_path(inspection.id, key)).pages)
+        for inspection, _, key in jobs._project_report_content(db, project_id)
+    )
+    assert len(report.pages) == section_pages + 1  # one table of contents page
+    assert [item.title for item in report.outline if not isinstance(item, list)] == ["Foundation", "Roof"]
+    
+    # Unchanged: the job of the existing report is returned without queueing or recording anything
+    job_count = db.query(Job).count()
+    response = client.post(f"/api/projects/{project_id}/report")
+    assert response.status_code == 200
+    assert response.json()["id"] == job_id
+    assert jobs.process_next_job(db) is None
+    assert db.query(Job).count() == job_count
+    os.remove(result["pdf_path"])
+
+
+def test_project_report_rerenders_only_changed_sections(client, db, project_with_inspections):
+    """Test that a re-run reuses the cached sections of unchanged inspections"""
+    project_id, inspection_ids = project_with_inspections
+    client.post(f"/api/projects/{project_id}/report")
+    first = jobs.process_next_job(db)
+    first_path = json.loads(first.result)["pdf_path"]
+    
+    client.put(f"/api/inspections/{inspection_ids[1]}", json={"result": "不合格", "remark": "changed"})
+    client.post(f"/api/projects/{project_id}/report")
+    with patch("app.services.jobs.render_report_section", wraps=jobs.render_report_section) as render:
+        second = jobs.process_next_job(db)
+    
+    result = json.loads(second.result)
+    assert result["rendered_sections"] == 1
+    assert render.call_count == 1
+    # Only the current section of the changed inspection is kept
+    assert len(glob.glob(os.path.join(REPORT_SECTION_DIR, f"section_{inspection_ids[1]}_*.pdf"))) == 1
+    assert file_deletion_queue.drain(timeout=5)
+    assert not os.path.exists(first_path)
+    os.remove(result["pdf_path"])
+
+
+def test_project_report_for_missing_project(client):
+    """Test that no report job is queued for a non-existent project"""
+    assert client.post("/api/projects/999/report").status_code == 404
+
+def test_render_key_tracks_report_content():
+    """Test that the render key changes with any rendered field"""
+    from types import SimpleNamespace
+    inspection = SimpleNamespace(
+        id=1, subproject_name="S", inspection_form_name="F", inspection_date="2025-01-01",
+        location="L", timing="T", result="合格", remark=None
+    )
+    photo = SimpleNamespace(id=1, photo_path="a.jpg", caption="c", capture_date="2025-01-01")
+    
+    key = jobs.inspection_render_key(inspection, [photo])
+    assert key == jobs.inspection_render_key(inspection, [photo])
+    
+    photo.caption = "changed"
+    assert jobs.inspection_render_key(inspection, [photo]) != key
+    assert jobs.inspection_render_key(inspection, []) != key
+
+
+def test_generate_pdf_for_missing_inspection(client):
+    """Test that no job is queued for a non-existent inspection"""
+    response = client.post("/api/inspections/999/generate-pdf")
+    assert response.status_code == 404
+
+
+def test_failed_job_records_error(client, db, create_inspection_via_api):
+    """Test that a failing render marks the job as failed"""
+    response = client.post(f"/api/inspections/{create_inspection_via_api}/generate-pdf")
+    job_id = response.json()["id"]
+    
+    with patch("app.services.jobs.generate_inspection_pdf", side_effect=RuntimeError("render crashed")):
+        job = jobs.process_next_job(db)
+    
+    assert job.status == "failed"
+    response = client.get(f"/api/jobs/{job_id}/result")
+    assert response.status_code == 409
+    assert "render crashed" in response.json()["detail"]
+
+
+def test_process_next_job_empty_queue(db):
+    """Test that an empty queue yields no job"""
+    assert jobs.process_next_job(db) is None
+
+
+def test_requeue_stale_jobs(db):
+    """Test that jobs abandoned by a dead worker are recovered"""
+    started = datetime.now() - timedelta(seconds=jobs.JOB_LEASE_SECONDS + 60)
+    retryable = Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.RUNNING.value,
+                    payload=json.dumps({"inspection_id": 1}), attempts=1, started_at=started)
+    exhausted = Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.RUNNING.value,
+                    payload=json.dumps({"inspection_id": 1}), attempts=jobs.JOB_MAX_ATTEMPTS, started_at=started)
+    fresh = Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.RUNNING.value,
+                payload=json.dumps({"inspection_id": 1}), attempts=1, started_at=datetime.now())
+    db.add_all([retryable, exhausted, fresh])
+    db.commit()
+    
+    assert jobs.requeue_stale_jobs(db) == 2
+    
+    db.refresh(retryable)
+    db.refresh(exhausted)
+    db.refresh(fresh)
+    assert retryable.status == JobStatusEnum.QUEUED.value
+    assert exhausted.status == JobStatusEnum.FAILED.value
+    assert fresh.status == JobStatusEnum.RUNNING.value
+
+
+def test_purge_finished_jobs(db):
+    """Test that finished jobs are deleted after the retention period and others are kept"""
+    old = datetime.now() - timedelta(days=jobs.JOB_RETENTION_DAYS + 1)
+    kept = [
+        Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.SUCCEEDED.value, finished_at=datetime.now()),
+        Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.QUEUED.value),
+        Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.RUNNING.value, started_at=old),
+    ]
+    purged = [
+        Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.SUCCEEDED.value, finished_at=old),
+        Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.FAILED.value, finished_at=old),
+    ]
+    db.add_all(kept + purged)
+    db.commit()
+    kept_ids = {job.id for job in kept}
+    purged_ids = {job.id for job in purged}
+    
+    assert jobs.purge_finished_jobs(db) == 2
+    remaining = {job_id for (job_id,) in db.query(Job.id).filter(Job.id.in_(kept_ids | purged_ids))}
+    assert remaining == kept_ids
+
+
+def test_finished_job_lookup_uses_the_payload_key(client, db, create_inspection_via_api):
+    """Test that cached report hits find their job by the indexed payload hash"""
+    inspection_id = create_inspection_via_api
+    job_id = client.post(f"/api/inspections/{inspection_id}/generate-pdf").json()["id"]
+    job = db.query(Job).filter(Job.id == job_id).one()
+    assert job.payload_key == jobs.job_payload_key({"inspection_id": inspection_id})
+    jobs.process_next_job(db)
+    
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    from sqlalchemy import event
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    try:
+        assert client.post(f"/api/inspections/{inspection_id}/generate-pdf").json()["id"] == job_id
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", record)
+    job_lookups = [statement for statement in statements if "FROM jobs" in statement]
+    assert job_lookups and all("payload_key" in statement and "jobs.payload =" not in statement
+                               for statement in job_lookups)
+    os.remove(client.get(f"/api/inspections/{inspection_id}").json()["pdf_path"])
+
+def test_requeue_uses_the_heartbeat(db):
+    """Test that a long running job is kept while its worker renews the lease"""
+    started = datetime.now() - timedelta(seconds=jobs.JOB_LEASE_SECONDS * 3)
+    renewed = Job(kind=jobs.INSPECTION_PDF_JOB, status=JobStatusEnum.RUNNING.value, worker_id="worker-a",
+                  payload=json.dumps({"inspection_id": 1}), attempts=1, started_at=started, heartbeat_at=started)
+    db.add(renewed)
+    db.commit()
+    
+    # Reporting progress renews the lease, as does the heartbeat thread
+    jobs.set_job_progress(db, renewed.id, 1, 4)
+    assert jobs.requeue_stale_jobs(db) == 0
+    
+    db.execute(Job.__table__.update().where(Job.id == renewed.id).values(heartbeat_at=started))
+    db.commit()
+    assert jobs.renew_job_lease(db, renewed.id, "worker-a")
+    assert not jobs.renew_job_lease(db, renewed.id, "worker-b")
+    assert jobs.requeue_stale_jobs(db) == 0
+    db.refresh(renewed)
+    assert renewed.status == JobStatusEnum.RUNNING.value
+
+
+def test_heartbeat_renews_the_lease_while_a_job_runs(client, db, create_inspection_via_api, monkeypatch):
+    """Test that a job without progress reports keeps renewing its lease"""
+    import time
+    from functools import partial
+    client.post(f"/api/inspections/{create_inspection_via_api}/generate-pdf")
+    
+    renewals = []
+    monkeypatch.setattr(jobs, "JobHeartbeat", partial(jobs.JobHeartbeat, interval=0.02))
+    monkeypatch.setattr(jobs, "renew_job_lease", lambda db, job_id, worker_id: renewals.append(job_id) or True)
+    
+    def slow_render(*args):
+        time.sleep(0.2)
+        return args[-1]
+    
+    with patch("app.services.jobs.generate_inspection_pdf", side_effect=slow_render):
+        job = jobs.process_next_job(db)
+    assert job.status == JobStatusEnum.SUCCEEDED.value
+    assert renewals and set(renewals) == {job.id}
+    
+    # The heartbeat stops with the job
+    count = len(renewals)
+    time.sleep(0.1)
+    assert len(renewals) == count
+
+
+def test_outcome_of_a_lost_lease_is_discarded(client, db, create_inspection_via_api):
+    """Test that a worker whose job was requeued and claimed again does not overwrite it"""
+    client.post(f"/api/inspections/{create_inspection_via_api}/generate-pdf")
+    job = jobs.claim_next_job(db, worker_id="slow-worker")
+    
+    # The lease expired and another worker took the job over
+    db.execute(Job.__table__.update().where(Job.id == job.id).values(
+        worker_id="other-worker", attempts=job.attempts + 1
+    ))
+    db.commit()
+    job.worker_id, job.attempts = "slow-worker", 1
+    
+    with patch("app.services.jobs.generate_inspection_pdf", side_effect=RuntimeError("render crashed")):
+        job = jobs.run_job(db, job)
+    assert job.status == JobStatusEnum.RUNNING.value
+    assert job.worker_id == "other-worker"
+    assert job.error is None
+
+
+def test_get_nonexistent_job(client):
+    """Test getting a non-existent job"""
+    response = client.get("/api/jobs/999")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Job not found"
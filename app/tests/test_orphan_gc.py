@@ -0,0 +1,141 @@
+import os
+import time
+import pytest
+from datetime import date
+from app.models.models import InspectionPhoto, PhotoBlob
+from app.services import orphan_gc
+
+
+@pytest.fixture
+def upload_dirs(tmp_path, monkeypatch):
+    """Point the collector at throwaway upload directories"""
+    dirs = {name: tmp_path / name for name in ("pdfs", "photos", "thumbnails", "pdf_images")}
+    for directory in dirs.values():
+        directory.mkdir()
+    (dirs["thumbnails"] / "small").mkdir()
+
+    monkeypatch.setattr(orphan_gc, "PHOTO_UPLOAD_DIR", str(dirs["photos"]))
+    monkeypatch.setattr(orphan_gc, "PDF_IMAGE_DIR", str(dirs["pdf_images"]))
+    monkeypatch.setattr(orphan_gc, "COLLECTED_DIRS", (
+        (str(dirs["pdfs"]), orphan_gc._referenced_pdfs),
+        (str(dirs["photos"]), orphan_gc._referenced_photos),
+        (str(dirs["thumbnails"]), orphan_gc._referenced_derivatives),
+        (str(dirs["pdf_images"]), orphan_gc._referenced_derivatives),
+    ))
+    return dirs
+
+
+def make_file(path, age_seconds=7200):
+    path.write_bytes(b"content")
+    modified = time.time() - age_seconds
+    os.utime(path, (modified, modified))
+    return str(path)
+
+
+@pytest.fixture
+def stored_files(db, test_inspection, upload_dirs):
+    """Referenced, orphaned, scratch and recent files across the upload directories"""
+    files = {
+        "pdf": make_file(upload_dirs["pdfs"] / "inspection.pdf"),
+        "orphan_pdf": make_file(upload_dirs["pdfs"] / "orphan.pdf"),
+        "merge_scratch": make_file(upload_dirs["pdfs"] / "temp_photos_1234.pdf"),
+        "recent_pdf": make_file(upload_dirs["pdfs"] / "rendering.pdf", age_seconds=10),
+        "photo": make_file(upload_dirs["photos"] / "kept.jpg"),
+        "blob": make_file(upload_dirs["photos"] / "shared.jpg"),
+        "orphan_photo": make_file(upload_dirs["photos"] / "orphan.jpg"),
+        "stale_part": make_file(upload_dirs["photos"] / "upload.jpg.part"),
+        "recent_part": make_file(upload_dirs["photos"] / "uploading.jpg.part", age_seconds=10),
+        "thumbnail": make_file(upload_dirs["thumbnails"] / "small" / "kept.jpg"),
+        "orphan_thumbnail": make_file(upload_dirs["thumbnails"] / "small" / "orphan.jpg"),
+        "pdf_image": make_file(upload_dirs["pdf_images"] / "kept_800x600.jpg"),
+        "orphan_pdf_image": make_file(upload_dirs["pdf_images"] / "gone_800x600.jpg"),
+    }
+    test_inspection.pdf_path = files["pdf"]
+    db.add(InspectionPhoto(inspection_id=test_inspection.id, photo_path=files["photo"], capture_date=date.today()))
+    db.add(PhotoBlob(content_hash="a" * 64, path=files["blob"], ref_count=1))
+    db.commit()
+    return files
+
+
+ORPHANS = {"orphan_pdf", "merge_scratch", "orphan_photo", "stale_part", "orphan_thumbnail", "orphan_pdf_image"}
+
+
+def test_dry_run_reports_without_removing(db, stored_files):
+    """Test that a dry run lists the orphans and leaves every file in place"""
+    report = orphan_gc.collect_orphans(db, dry_run=True, grace_seconds=3600, batch_size=2)
+
+    assert {path for path, _ in report.orphans} == {stored_files[name] for name in ORPHANS}
+    assert report.scanned == len(stored_files)
+    assert report.recent == 2
+    assert report.removed == 0
+    assert all(os.path.exists(path) for path in stored_files.values())
+    assert "would remove 6 orphans" in report.summary()
+
+
+def test_collect_removes_only_orphans(db, stored_files):
+    """Test that referenced and recent files survive a collection pass"""
+    report = orphan_gc.collect_orphans(db, grace_seconds=3600, batch_size=3)
+
+    assert report.removed == len(ORPHANS)
+    assert report.removed_bytes == len(ORPHANS) * len(b"content")
+    for name, path in stored_files.items():
+        assert os.path.exists(path) == (name not in ORPHANS), name
+
+
+def test_collect_keeps_files_touched_after_marking(db, stored_files, monkeypatch):
+    """Test that a file refreshed between marking and sweeping is kept"""
+    referenced_pdfs = orphan_gc._referenced_pdfs
+
+    def touch_then_mark(db, paths):
+        # An upload reuses the file while its batch is being checked
+        os.utime(stored_files["orphan_pdf"])
+        return referenced_pdfs(db, paths)
+
+    dirs = list(orphan_gc.COLLECTED_DIRS)
+    dirs[0] = (dirs[0][0], touch_then_mark)
+    monkeypatch.setattr(orphan_gc, "COLLECTED_DIRS", tuple(dirs))
+
+    orphan_gc.collect_orphans(db, grace_seconds=3600)
+    assert os.path.exists(stored_files["orphan_pdf"])
+    assert not os.path.exists(stored_files["merge_scratch"])
+
+
+def test_cli_dry_run(db, stored_files, monkeypatch, capsys):
+    """Test the command line entry point in dry-run mode"""
+    monkeypatch.setattr(orphan_gc, "SessionLocal", lambda: db)
+    monkeypatch.setattr(db, "close", lambda: None)
+
+    assert orphan_gc.main(["--dry-run", "--grace-seconds", "3600"]) == 0
+    output = capsys.readouterr().out
+    assert stored_files["orphan_photo"] in output
+    assert "would remove 6 orphans" in output
+    assert os.path.exists(stored_files["orphan_photo"])
+
+
+def test_derivatives_are_marked_with_one_query_per_batch(db, test_inspection, upload_dirs):
+    """Test that a batch of derived images is checked against the database without scanning the photo directory"""
+    from sqlalchemy import event
+
+    content_hash = "b" * 64
+    db.add(PhotoBlob(content_hash=content_hash, path=str(upload_dirs["photos"] / f"{content_hash}.jpg"), ref_count=1))
+    db.add(InspectionPhoto(inspection_id=test_inspection.id, photo_path=str(upload_dirs["photos"] / "site_1.jpg"),
+                           capture_date=date.today()))
+    db.commit()
+    thumbnails = {
+        "hashed": make_file(upload_dirs["thumbnails"] / "small" / f"{content_hash}.jpg"),
+        "legacy": make_file(upload_dirs["thumbnails"] / "small" / "site_1.jpg"),
+        # '_' must not act as a LIKE wildcard
+        "lookalike": make_file(upload_dirs["thumbnails"] / "small" / "siteX1.jpg"),
+        "orphan": make_file(upload_dirs["thumbnails"] / "small" / ("c" * 64 + ".jpg")),
+    }
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    try:
+        referenced = orphan_gc._referenced_derivatives(db, list(thumbnails.values()))
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", listener)
+
+    assert referenced == {thumbnails["hashed"], thumbnails["legacy"]}
+    assert len([statement for statement in statements if statement.startswith("SELECT")]) == 1
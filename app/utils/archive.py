@@ -0,0 +1,179 @@
+import io
+import os
+import re
+import csv
+import time
+import hashlib
+import zipfile
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+from sqlalchemy.orm import Session
+from app.models.models import ConstructionInspection, InspectionPhoto
+
+# Files are copied into the archive in chunks of this size, which bounds the
+# memory an export uses however large the project is
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+
+# ZIP timestamps start in 1980; older modification times are clamped
+ZIP_EPOCH = 315619200  # 1980-01-02, clear of time zone offsets
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_FIELDS = [
+    "path", "kind", "subproject_name", "inspection_id", "inspection_form_name", "inspection_date",
+    "photo_id", "capture_date", "caption", "size", "sha256", "status",
+]
+
+class ArchiveEntry(NamedTuple):
+    """A file to put into a project archive, with its manifest columns"""
+    arcname: str
+    source_path: str
+    kind: str
+    subproject_name: str
+    inspection_id: int
+    inspection_form_name: str
+    inspection_date: str
+    photo_id: Optional[int] = None
+    capture_date: Optional[str] = None
+    caption: Optional[str] = None
+
+def _safe_name(name: str) -> str:
+    """A single path component that is valid on common file systems"""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]', "_", str(name or "")).strip(" .")
+    return name[:100] or "_"
+
+def project_archive_entries(db: Session, project_id: int) -> List[ArchiveEntry]:
+    """
+    List the files of a project laid out as subproject/inspection folders.
+
+    Only paths and manifest columns are loaded, two queries in total.
+    """
+    inspections = db.query(
+        ConstructionInspection.id,
+        ConstructionInspection.subproject_name,
+        ConstructionInspection.inspection_form_name,
+        ConstructionInspection.inspection_date,
+        ConstructionInspection.pdf_path,
+        ConstructionInspection.merged_pdf_path,
+    ).filter(ConstructionInspection.project_id == project_id).order_by(
+        ConstructionInspection.subproject_name, ConstructionInspection.inspection_date, ConstructionInspection.id
+    ).all()
+
+    entries = []
+    folders = {}
+    for inspection in inspections:
+        folder = "/".join([
+            _safe_name(inspection.subproject_name),
+            _safe_name(f"{inspection.inspection_date}_{inspection.id}_{inspection.inspection_form_name}"),
+        ])
+        folders[inspection.id] = (folder, inspection)
+        for kind, path in (("pdf", inspection.pdf_path), ("merged_pdf", inspection.merged_pdf_path)):
+            if path:
+                entries.append(ArchiveEntry(
+                    arcname=f"{folder}/{'inspection' if kind == 'pdf' else 'merged'}.pdf",
+                    source_path=path,
+                    kind=kind,
+                    subproject_name=inspection.subproject_name,
+                    inspection_id=inspection.id,
+                    inspection_form_name=inspection.inspection_form_name,
+                    inspection_date=str(inspection.inspection_date),
+                ))
+
+    photos = db.query(
+        InspectionPhoto.id,
+        InspectionPhoto.inspection_id,
+        InspectionPhoto.photo_path,
+        InspectionPhoto.capture_date,
+        InspectionPhoto.caption,
+    ).join(ConstructionInspection, InspectionPhoto.inspection_id == ConstructionInspection.id).filter(
+        ConstructionInspection.project_id == project_id
+    ).order_by(InspectionPhoto.inspection_id, InspectionPhoto.capture_date, InspectionPhoto.id)
+    for photo in photos:
+        folder, inspection = folders[photo.inspection_id]
+        ext = os.path.splitext(photo.photo_path)[1].lower()
+        entries.append(ArchiveEntry(
+            arcname=f"{folder}/photos/{photo.capture_date}_{photo.id}{ext}",
+            source_path=photo.photo_path,
+            kind="photo",
+            subproject_name=inspection.subproject_name,
+            inspection_id=inspection.id,
+            inspection_form_name=inspection.inspection_form_name,
+            inspection_date=str(inspection.inspection_date),
+            photo_id=photo.id,
+            capture_date=str(photo.capture_date),
+            caption=photo.caption,
+        ))
+    return entries
+
+class _ChunkSink:
+    """
+    A write-only, unseekable file object for zipfile. What the archive writes
+    is held only until the generator hands it to the response.
+    """
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_zip(entries: Iterable[ArchiveEntry]) -> Iterator[bytes]:
+    """
+    Generate a ZIP archive of the entries followed by a manifest CSV.
+
+    The archive is produced while the files are read, with no temporary file,
+    and ZIP64 records are used where sizes require them. PDFs and photos are
+    already compressed and are stored as is; only the manifest is deflated.
+    Files missing from disk are skipped and marked in the manifest.
+    """
+    sink = _ChunkSink()
+    manifest = io.StringIO()
+    writer = csv.DictWriter(manifest, fieldnames=MANIFEST_FIELDS)
+    writer.writeheader()
+
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for entry in entries:
+            row = {field: getattr(entry, field, None) for field in MANIFEST_FIELDS}
+            row["path"] = entry.arcname
+            try:
+                source = open(entry.source_path, "rb")
+            except OSError:
+                row["status"] = "missing"
+                writer.writerow(row)
+                continue
+
+            with source:
+                stat = os.fstat(source.fileno())
+                info = zipfile.ZipInfo(entry.arcname, date_time=time.localtime(max(stat.st_mtime, ZIP_EPOCH))[:6])
+                info.file_size = stat.st_size
+                digest = hashlib.sha256()
+                with archive.open(info, "w") as target:
+                    while True:
+                        chunk = source.read(ARCHIVE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                        digest.update(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+
+            row.update(size=stat.st_size, sha256=digest.hexdigest(), status="ok")
+            writer.writerow(row)
+            yield sink.drain()
+
+        # UTF-8 with BOM so spreadsheet programs show Chinese names correctly
+        archive.writestr(MANIFEST_NAME, "\ufeff" + manifest.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    yield sink.drain()
@@ -0,0 +1,199 @@
+"""
+Serving stored uploads with HTTP caching and byte ranges.
+
+Stored files are never rewritten in place: photos are named by their SHA-256
+and PDFs get a fresh UUID or render key name for new content. A URL therefore
+always means the same bytes, and responses may be cached as immutable.
+
+With FILE_ACCEL_REDIRECT_PREFIX set, the API only answers with an
+X-Accel-Redirect header and the front proxy sends the file itself, e.g. with
+nginx and FILE_ACCEL_REDIRECT_PREFIX=/protected-uploads/:
+
+    location /protected-uploads/ {
+        internal;
+        alias /app/app/static/uploads/;
+        sendfile on;
+    }
+"""
+import os
+import re
+import mimetypes
+from urllib.parse import quote
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Mapping, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Uploads never change under their name, so caches may keep them for a year
+FILE_CACHE_MAX_AGE = int(os.getenv("FILE_CACHE_MAX_AGE", str(365 * 24 * 3600)))
+FILE_CACHE_CONTROL = f"public, max-age={FILE_CACHE_MAX_AGE}, immutable"
+
+# Internal location of the upload directory on the front proxy; empty to send files from the API
+FILE_ACCEL_REDIRECT_PREFIX = os.getenv("FILE_ACCEL_REDIRECT_PREFIX", "")
+
+# Read size when the server cannot send the file itself
+FILE_CHUNK_SIZE = 256 * 1024
+
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+_CONTENT_HASH_NAME = re.compile(r"^[0-9a-f]{64}$")
+
+def file_etag(path: str, stat_result: os.stat_result) -> str:
+    """
+    A strong ETag for a stored file: the content hash for content-addressed
+    files, otherwise the file's size and modification time
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if _CONTENT_HASH_NAME.match(stem):
+        return f'"{stem}"'
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range into an inclusive (start, end) pair.
+
+    Returns None if the header is missing, malformed or asks for several
+    ranges, in which case the whole file is sent.
+
+    Raises:
+        ValueError: The range lies entirely beyond the end of the file
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first.isdigit() or last.isdigit()):
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Empty suffix range")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("Range starts beyond the end of the file")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison"""
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+def _not_modified_since(header: Optional[str], stat_result: os.stat_result) -> bool:
+    if not header:
+        return False
+    try:
+        return int(stat_result.st_mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+class StoredFileResponse(Response):
+    """
+    Sends a stored file, or one byte range of it, with immutable caching
+    headers and a strong ETag.
+
+    Conditional requests are answered with 304. Range requests get 206, or
+    416 if the range is beyond the end; a range whose If-Range validator no
+    longer matches gets the whole file. When the ASGI server supports the
+    zero-copy send extension the kernel copies the file to the socket,
+    otherwise it is read in chunks off the event loop.
+    """
+
+    def __init__(self, path: str, stat_result: os.stat_result, request_headers: Mapping[str, str], method: str = "GET"):
+        self.path = path
+        self.background = None
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.send_header_only = method.upper() == "HEAD"
+        self.offset, self.length = 0, stat_result.st_size
+
+        etag = file_etag(path, stat_result)
+        headers = {
+            "cache-control": FILE_CACHE_CONTROL,
+            "etag": etag,
+            "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+            "accept-ranges": "bytes",
+        }
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match is not None and _etag_matches(if_none_match, etag) or (
+            if_none_match is None and _not_modified_since(request_headers.get("if-modified-since"), stat_result)
+        ):
+            self.status_code = 304
+            self.length = 0
+            self.init_headers(headers)
+            return
+
+        byte_range = None
+        if_range = request_headers.get("if-range")
+        if if_range is None or if_range.strip() == etag:
+            try:
+                byte_range = parse_range(request_headers.get("range"), stat_result.st_size)
+            except ValueError:
+                self.status_code = 416
+                self.length = 0
+                headers["content-range"] = f"bytes */{stat_result.st_size}"
+                headers["content-length"] = "0"
+                self.init_headers(headers)
+                return
+
+        if byte_range is None:
+            self.status_code = 200
+        else:
+            start, end = byte_range
+            self.status_code = 206
+            self.offset, self.length = start, end - start + 1
+            headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        headers["content-length"] = str(self.length)
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if self.status_code not in (200, 206) or self.send_header_only or self.length == 0:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        file = await run_in_threadpool(open, self.path, "rb")
+        try:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+                await send({
+                    "type": ZEROCOPY_EXTENSION,
+                    "file": file.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            remaining = self.length
+            await run_in_threadpool(file.seek, self.offset)
+            while remaining > 0:
+                chunk = await run_in_threadpool(file.read, min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # The file shrank underneath us; end the body rather than hang the client
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            file.close()
+
+def accel_redirect_response(relative_path: str) -> Response:
+    """Hand the transfer of an upload to the front proxy"""
+    return Response(
+        headers={
+            "x-accel-redirect": FILE_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative_path),
+            "cache-control": FILE_CACHE_CONTROL,
+        },
+        media_type=mimetypes.guess_type(relative_path)[0] or "application/octet-stream",
+    )
@@ -1,64 +1,211 @@
 import os
+import io
 import uuid
-from fastapi import UploadFile
-from typing import List
+import hashlib
+from fastapi import UploadFile, HTTPException, status
+from starlette.concurrency import run_in_threadpool
+from typing import List, NamedTuple, Optional, BinaryIO, Union
 from datetime import datetime
-from PIL import Image
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
-from reportlab.lib.styles import getSampleStyleSheet
 from sqlalchemy.orm import Session
+from app.utils.image_utils import UPLOAD_DIR, prepare_pdf_image
+
+# reportlab and PyPDF2 are imported inside the functions that build PDFs, so
+# importing this module at worker startup does not load them
 
 # Base directories for uploads
-PDF_UPLOAD_DIR = "app/static/uploads/pdfs"
-PHOTO_UPLOAD_DIR = "app/static/uploads/photos"
+PDF_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "pdfs")
+PHOTO_UPLOAD_DIR = os.path.join(UPLOAD_DIR, "photos")
+# Rendered inspection sections of consolidated project reports, named by content
+REPORT_SECTION_DIR = os.path.join(UPLOAD_DIR, "report_sections")
+
+# Uploads are copied to disk in chunks of this size so memory use per request
+# stays flat regardless of the file size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Per-kind upload limits (bytes); an upload is aborted as soon as it exceeds them
+MAX_PDF_UPLOAD_BYTES = int(os.getenv("MAX_PDF_UPLOAD_BYTES", str(250 * 1024 * 1024)))
+MAX_PHOTO_UPLOAD_BYTES = int(os.getenv("MAX_PHOTO_UPLOAD_BYTES", str(30 * 1024 * 1024)))
+
+# Suffix of in-flight uploads; the final name only appears once the copy is complete
+TEMP_FILE_SUFFIX = ".part"
+
+class StoredFile(NamedTuple):
+    """A file written to disk by save_upload_file"""
+    path: str
+    size: int
+    sha256: str
+    # A photo whose content was already stored keeps its uploaded copy here
+    # until its record is committed (see settle_photo_upload)
+    upload_path: Optional[str] = None
 
 def ensure_upload_dirs():
     """Ensure upload directories exist"""
     os.makedirs(PDF_UPLOAD_DIR, exist_ok=True)
     os.makedirs(PHOTO_UPLOAD_DIR, exist_ok=True)
 
-async def save_upload_file(upload_file: UploadFile, directory: str) -> str:
-    """Save an uploaded file to the specified directory and return the file path"""
+def is_upload_path(file_path: str) -> bool:
+    """Whether a path lies inside the upload directories; files anywhere else are never deleted"""
+    upload_dir = os.path.realpath(UPLOAD_DIR)
+    return os.path.commonpath([upload_dir, os.path.realpath(file_path)]) == upload_dir
+
+def resolve_stored_photo_path(photo_path: str) -> str:
+    """
+    Check that a photo path sent by a client names an existing file in the
+    photo upload directory and return the path in its stored form.
+    
+    Raises:
+        HTTPException: 422 if the path points anywhere else
+    """
+    real_path = os.path.realpath(photo_path)
+    if os.path.dirname(real_path) != os.path.realpath(PHOTO_UPLOAD_DIR) or real_path.endswith(TEMP_FILE_SUFFIX) \
+            or not os.path.isfile(real_path):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"photo_path must name a stored photo: {photo_path}"
+        )
+    return os.path.join(PHOTO_UPLOAD_DIR, os.path.basename(real_path))
+
+def stream_to_file(source: BinaryIO, file_path: str, max_size: Optional[int] = None) -> StoredFile:
+    """
+    Copy a binary stream to file_path chunk by chunk.
+    
+    The data is written to a temporary file next to the destination and renamed
+    into place once complete, so a partially written file is never visible under
+    its final name. The SHA-256 digest and byte count are computed on the way.
+    
+    Args:
+        source: Readable binary stream
+        file_path: Destination path
+        max_size: Maximum number of bytes accepted (None for no limit)
+        
+    Returns:
+        StoredFile with the final path, size and hex digest
+        
+    Raises:
+        HTTPException: 413 if the stream is larger than max_size
+    """
+    temp_path = f"{file_path}{TEMP_FILE_SUFFIX}"
+    digest = hashlib.sha256()
+    size = 0
+    
+    try:
+        with open(temp_path, "wb") as buffer:
+            while True:
+                chunk = source.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File exceeds the maximum upload size of {format_file_size(max_size)}"
+                    )
+                digest.update(chunk)
+                buffer.write(chunk)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    
+    return StoredFile(path=file_path, size=size, sha256=digest.hexdigest())
+
+async def save_upload_file(upload_file: UploadFile, directory: str, max_size: Optional[int] = None) -> StoredFile:
+    """Stream an uploaded file into the specified directory and return the stored file"""
     ensure_upload_dirs()
     
     # Generate a unique filename
     filename = f"{uuid.uuid4()}_{upload_file.filename}"
     file_path = os.path.join(directory, filename)
     
-    # Write the file
-    with open(file_path, "wb") as buffer:
-        content = await upload_file.read()
-        buffer.write(content)
-    
-    return file_path
+    # Copy in a worker thread so the event loop is not blocked by disk I/O
+    return await run_in_threadpool(stream_to_file, upload_file.file, file_path, max_size)
 
-async def save_pdf_file(upload_file: UploadFile) -> str:
-    """Save an uploaded PDF file and return the file path"""
-    return await save_upload_file(upload_file, PDF_UPLOAD_DIR)
+async def save_pdf_file(upload_file: UploadFile) -> StoredFile:
+    """Save an uploaded PDF file and return the stored file"""
+    return await save_upload_file(upload_file, PDF_UPLOAD_DIR, MAX_PDF_UPLOAD_BYTES)
 
-async def save_photo_file(upload_file: UploadFile) -> str:
-    """Save an uploaded photo file and return the file path"""
-    return await save_upload_file(upload_file, PHOTO_UPLOAD_DIR)
+async def save_photo_file(upload_file: UploadFile) -> StoredFile:
+    """
+    Save an uploaded photo under its content hash and return the stored file.
+    
+    Identical photos resolve to the same path. When that file already exists
+    the upload is kept as upload_path: a concurrent delete of the last
+    reference may still remove the shared file until the new record is
+    committed, after which settle_photo_upload drops or restores it.
+    """
+    stored = await save_upload_file(upload_file, PHOTO_UPLOAD_DIR, MAX_PHOTO_UPLOAD_BYTES)
+    
+    _, ext = os.path.splitext(upload_file.filename or "")
+    photo_path = os.path.join(PHOTO_UPLOAD_DIR, f"{stored.sha256}{ext.lower()}")
+    if os.path.exists(photo_path):
+        return stored._replace(path=photo_path, upload_path=stored.path)
+    
+    os.replace(stored.path, photo_path)
+    return stored._replace(path=photo_path)
 
-def calculate_project_files_size(db: Session, project_id: int) -> dict:
+def settle_photo_upload(upload_path: Optional[str], photo_path: str):
+    """
+    Put the kept copy of an upload in place of the stored photo its committed
+    record points at.
+    
+    The content is identical, so replacing an existing file changes nothing
+    for readers, refreshes its age for the orphan collector and restores a
+    file that was deleted while the upload was in flight.
+    """
+    if upload_path:
+        os.replace(upload_path, photo_path)
+
+def calculate_project_files_size(db: Session, project_id: int, include_files: bool = False) -> dict:
     """
     Calculate the total size of static files related to a specific project.
     
+    Sizes are recorded when files are stored, so the totals come from a single
+    aggregate query and do not touch the filesystem. Files stored before sizes
+    were recorded are reported in unsized_file_count until a reconcile runs.
+    
     Args:
         db: Database session
         project_id: ID of the project
+        include_files: Also list the PDF and photo paths (grows with file count)
         
     Returns:
         Dictionary with storage information for the project
     """
+    from sqlalchemy import select, func
     from app.models.models import Project, ConstructionInspection, InspectionPhoto
     
-    # Get the project
-    project = db.query(Project).filter(Project.id == project_id).first()
-    if not project:
+    project_pdfs = (ConstructionInspection.project_id == project_id, ConstructionInspection.pdf_path.isnot(None))
+    project_merged_pdfs = (
+        ConstructionInspection.project_id == project_id,
+        ConstructionInspection.merged_pdf_path.isnot(None)
+    )
+    project_photos = (
+        InspectionPhoto.inspection_id == ConstructionInspection.id,
+        ConstructionInspection.project_id == project_id
+    )
+    
+    def aggregate(expression, *criteria):
+        return select(expression).where(*criteria).scalar_subquery()
+    
+    row = db.execute(
+        select(
+            Project.name,
+            Project.report_pdf_path,
+            Project.report_pdf_size,
+            aggregate(func.count(), *project_pdfs),
+            aggregate(func.coalesce(func.sum(ConstructionInspection.pdf_size), 0), *project_pdfs),
+            aggregate(func.count(), *project_pdfs, ConstructionInspection.pdf_size.is_(None)),
+            aggregate(func.count(), *project_merged_pdfs),
+            aggregate(func.coalesce(func.sum(ConstructionInspection.merged_pdf_size), 0), *project_merged_pdfs),
+            aggregate(func.count(), *project_merged_pdfs, ConstructionInspection.merged_pdf_size.is_(None)),
+            aggregate(func.count(InspectionPhoto.id), *project_photos),
+            aggregate(func.coalesce(func.sum(InspectionPhoto.file_size), 0), *project_photos),
+            aggregate(func.count(InspectionPhoto.id), *project_photos, InspectionPhoto.file_size.is_(None)),
+        ).where(Project.id == project_id)
+    ).first()
+    
+    if row is None:
         return {
             "error": "Project not found",
             "project_id": project_id,
@@ -68,50 +215,96 @@ def calculate_project_files_size(db: Session, project_id: int) -> dict:
             "exists": False
         }
     
-    # Initialize counters
-    total_size = 0
-    file_count = 0
-    pdf_files = []
-    photo_files = []
+    (project_name, report_path, report_size, pdf_count, pdf_size, unsized_pdfs, merged_count, merged_size,
+     unsized_merged, photo_count, photo_size, unsized_photos) = row
+    # Merged PDFs and the consolidated report count as PDFs of the project
+    pdf_count += merged_count
+    pdf_size = int(pdf_size) + int(merged_size)
+    unsized_pdfs += unsized_merged
+    if report_path:
+        pdf_count += 1
+        pdf_size += report_size or 0
+        unsized_pdfs += report_size is None
+    total_size = pdf_size + int(photo_size)
+    
+    storage_info = {
+        "project_id": project_id,
+        "project_name": project_name,
+        "total_size_bytes": total_size,
+        "total_size_formatted": format_file_size(total_size),
+        "file_count": pdf_count + photo_count,
+        "pdf_count": pdf_count,
+        "photo_count": photo_count,
+        "unsized_file_count": unsized_pdfs + unsized_photos,
+        "exists": True
+    }
     
-    # Get all inspections for the project
-    inspections = db.query(ConstructionInspection).filter(ConstructionInspection.project_id == project_id).all()
+    if include_files:
+        storage_info["details"] = {
+            "pdf_files": [
+                path for (path,) in db.query(ConstructionInspection.pdf_path).filter(*project_pdfs)
+            ] + [
+                path for (path,) in db.query(ConstructionInspection.merged_pdf_path).filter(*project_merged_pdfs)
+            ] + ([report_path] if report_path else []),
+            "photo_files": [
+                path for (path,) in db.query(InspectionPhoto.photo_path)
+                .join(ConstructionInspection, InspectionPhoto.inspection_id == ConstructionInspection.id)
+                .filter(ConstructionInspection.project_id == project_id)
+            ]
+        }
     
-    # Collect PDF paths
-    for inspection in inspections:
-        if inspection.pdf_path and os.path.exists(inspection.pdf_path):
-            pdf_files.append(inspection.pdf_path)
-            file_size = os.path.getsize(inspection.pdf_path)
-            total_size += file_size
-            file_count += 1
+    return storage_info
+
+def _file_size_or_zero(file_path: Optional[str]) -> int:
+    try:
+        return os.path.getsize(file_path) if file_path else 0
+    except OSError:
+        return 0
+
+def reconcile_project_file_sizes(db: Session, project_id: int) -> dict:
+    """
+    Re-stat every file of a project and store the sizes found on disk.
+    
+    Missing files are recorded with size 0. Returns the number of rows whose
+    recorded size changed.
+    """
+    from app.models.models import Project, ConstructionInspection, InspectionPhoto
+    
+    updated = 0
+    project = db.query(Project).filter(Project.id == project_id, Project.report_pdf_path.isnot(None)).first()
+    if project is not None:
+        size = _file_size_or_zero(project.report_pdf_path)
+        if project.report_pdf_size != size:
+            project.report_pdf_size = size
+            updated += 1
     
-    # Get all photos for the inspections
+    inspections = db.query(ConstructionInspection) \
+        .filter(ConstructionInspection.project_id == project_id, ConstructionInspection.pdf_path.isnot(None)).all()
     for inspection in inspections:
-        photos = db.query(InspectionPhoto).filter(InspectionPhoto.inspection_id == inspection.id).all()
-        for photo in photos:
-            if photo.photo_path and os.path.exists(photo.photo_path):
-                photo_files.append(photo.photo_path)
-                file_size = os.path.getsize(photo.photo_path)
-                total_size += file_size
-                file_count += 1
-    
-    # Format the size for human readability
-    size_formatted = format_file_size(total_size)
-    
-    return {
-        "project_id": project_id,
-        "project_name": project.name,
-        "total_size_bytes": total_size,
-        "total_size_formatted": size_formatted,
-        "file_count": file_count,
-        "pdf_count": len(pdf_files),
-        "photo_count": len(photo_files),
-        "exists": True,
-        "details": {
-            "pdf_files": pdf_files,
-            "photo_files": photo_files
-        }
-    }
+        size = _file_size_or_zero(inspection.pdf_path)
+        if inspection.pdf_size != size:
+            inspection.pdf_size = size
+            updated += 1
+    
+    merged = db.query(ConstructionInspection) \
+        .filter(ConstructionInspection.project_id == project_id, ConstructionInspection.merged_pdf_path.isnot(None)).all()
+    for inspection in merged:
+        size = _file_size_or_zero(inspection.merged_pdf_path)
+        if inspection.merged_pdf_size != size:
+            inspection.merged_pdf_size = size
+            updated += 1
+    
+    photos = db.query(InspectionPhoto) \
+        .join(ConstructionInspection, InspectionPhoto.inspection_id == ConstructionInspection.id) \
+        .filter(ConstructionInspection.project_id == project_id).all()
+    for photo in photos:
+        size = _file_size_or_zero(photo.photo_path)
+        if photo.file_size != size:
+            photo.file_size = size
+            updated += 1
+    
+    db.commit()
+    return {"project_id": project_id, "updated_count": updated}
 
 def format_file_size(size_in_bytes: int) -> str:
     """
@@ -131,63 +324,20 @@ def format_file_size(size_in_bytes: int) -> str:
                 return f"{size_in_bytes:.2f} {unit}"
         size_in_bytes /= 1024.0
 
-def generate_inspection_pdf(inspection_data, photos_data):
-    """Generate a PDF with inspection data and photos"""
-    # Create a unique filename for the PDF
-    filename = f"inspection_{uuid.uuid4()}.pdf"
-    file_path = os.path.join(PDF_UPLOAD_DIR, filename)
-    
-    # Ensure directory exists
-    ensure_upload_dirs()
-    
-    # Create the PDF document
-    doc = SimpleDocTemplate(file_path, pagesize=letter)
-    styles = getSampleStyleSheet()
-    elements = []
-    
-    # Add inspection details
-    elements.append(Paragraph(f"工程抽查表", styles['Title']))
-    elements.append(Spacer(1, 12))
-    elements.append(Paragraph(f"分項工程名稱: {inspection_data.subproject_name}", styles['Normal']))
-    elements.append(Paragraph(f"抽查表名稱: {inspection_data.inspection_form_name}", styles['Normal']))
-    elements.append(Paragraph(f"檢查日期: {inspection_data.inspection_date}", styles['Normal']))
-    elements.append(Paragraph(f"檢查位置: {inspection_data.location}", styles['Normal']))
-    elements.append(Paragraph(f"抽查時機: {inspection_data.timing}", styles['Normal']))
-    elements.append(Paragraph(f"抽查結果: {inspection_data.result}", styles['Normal']))
-    
-    if inspection_data.remark:
-        elements.append(Paragraph(f"備註: {inspection_data.remark}", styles['Normal']))
-    
-    elements.append(Spacer(1, 24))
-    
-    # Add photos if available
-    if photos_data:
-        elements.append(Paragraph("現場照片", styles['Heading2']))
-        elements.append(Spacer(1, 12))
-        
-        for photo in photos_data:
-            if os.path.exists(photo.photo_path):
-                img = RLImage(photo.photo_path, width=400, height=300)
-                elements.append(img)
-                elements.append(Paragraph(f"說明: {photo.caption if photo.caption else '無'}", styles['Normal']))
-                elements.append(Paragraph(f"拍攝日期: {photo.capture_date}", styles['Normal']))
-                elements.append(Spacer(1, 12))
-    
-    # Build the PDF
-    doc.build(elements)
-    
-    return file_path
-
-def merge_inspection_pdf_with_photos(inspection_pdf_path: str, photos: List[dict]) -> str:
+def merge_inspection_pdf_with_photos(inspection_pdf_path: str, photos: List[dict], output_pdf_path: Optional[str] = None) -> str:
     """
     合併抽查表單 PDF 與照片，生成一個新的 PDF 文件
     
     第一頁：原始的抽查表單 PDF
     第二頁：照片排版，每排最多 3 張照片，帶框框 + 日期 + 說明
     
+    照片頁面只在記憶體中產生，原始 PDF 透過 memory map 讀取而不整份載入，
+    合併結果直接寫到目的地（先寫 .part 再改名），整個流程只寫一次磁碟。
+    
     Args:
         inspection_pdf_path: 抽查表單 PDF 的路徑
         photos: 照片列表，每個照片包含 photo_path, capture_date, caption
+        output_pdf_path: 合併後 PDF 的路徑（預設在 PDF 上傳目錄產生新檔名）
         
     Returns:
         生成的 PDF 文件路徑
@@ -197,19 +347,17 @@ def merge_inspection_pdf_with_photos(inspection_pdf_path: str, photos: List[dict
     from reportlab.platypus import SimpleDocTemplate, Image, Table, TableStyle, Paragraph, PageBreak
     from reportlab.lib.styles import getSampleStyleSheet
     from PyPDF2 import PdfReader, PdfWriter
-    import io
-    import os
-    import uuid
+    import mmap
     
     # 確保上傳目錄存在
     ensure_upload_dirs()
     
-    # 生成臨時文件名
-    temp_photos_pdf = os.path.join(PDF_UPLOAD_DIR, f"temp_photos_{uuid.uuid4()}.pdf")
-    output_pdf_path = os.path.join(PDF_UPLOAD_DIR, f"merged_{uuid.uuid4()}.pdf")
+    if output_pdf_path is None:
+        output_pdf_path = os.path.join(PDF_UPLOAD_DIR, f"merged_{uuid.uuid4()}.pdf")
     
-    # 創建照片頁面的 PDF
-    doc = SimpleDocTemplate(temp_photos_pdf, pagesize=A4)
+    # 在記憶體中創建照片頁面的 PDF
+    photos_pdf = io.BytesIO()
+    doc = SimpleDocTemplate(photos_pdf, pagesize=A4)
     styles = getSampleStyleSheet()
     elements = []
     
@@ -221,12 +369,15 @@ def merge_inspection_pdf_with_photos(inspection_pdf_path: str, photos: List[dict
     current_row = []
     
     for photo in photos:
+        # 跳過檔案已不存在的照片，與 build_inspection_pdf 相同
+        if not os.path.exists(photo['photo_path']):
+            continue
         if len(current_row) == 3:
             photo_rows.append(current_row)
             current_row = []
         
         # 添加照片及其說明
-        img = Image(photo['photo_path'], width=150, height=150)
+        img = Image(prepare_pdf_image(photo['photo_path'], 150, 150), width=150, height=150)
         caption = f"{photo['caption']} ({photo['capture_date']})"
         current_row.append([img, Paragraph(caption, styles['Normal'])])
     
@@ -268,45 +419,50 @@ def merge_inspection_pdf_with_photos(inspection_pdf_path: str, photos: List[dict
     
     # 生成照片頁面 PDF
     doc.build(elements)
+    photos_pdf.seek(0)
     
-    # 合併原始 PDF 和照片頁面 PDF
+    # 合併原始 PDF 和照片頁面 PDF；頁面在寫出時才從 memory map 讀取
     pdf_writer = PdfWriter()
-    
-    # 添加原始 PDF 的所有頁面
-    with open(inspection_pdf_path, 'rb') as f:
-        pdf_reader = PdfReader(f)
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
+    temp_path = f"{output_pdf_path}{TEMP_FILE_SUFFIX}"
+    with open(inspection_pdf_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as inspection_pdf:
+        for page in PdfReader(inspection_pdf).pages:
             pdf_writer.add_page(page)
-    
-    # 添加照片頁面 PDF 的所有頁面
-    with open(temp_photos_pdf, 'rb') as f:
-        pdf_reader = PdfReader(f)
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
+        for page in PdfReader(photos_pdf).pages:
             pdf_writer.add_page(page)
-    
-    # 寫入合併後的 PDF
-    with open(output_pdf_path, 'wb') as f:
-        pdf_writer.write(f)
-    
-    # 刪除臨時文件
-    if os.path.exists(temp_photos_pdf):
-        os.remove(temp_photos_pdf)
+        
+        # 寫入合併後的 PDF
+        try:
+            with open(temp_path, 'wb') as output:
+                pdf_writer.write(output)
+            os.replace(temp_path, output_pdf_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
     
     return output_pdf_path
 
-def generate_inspection_pdf(inspection, photos_data=None) -> str:
+def generate_inspection_pdf(inspection, photos_data=None, file_path: Optional[str] = None) -> str:
     """Generate a PDF with inspection data and photos"""
-    # Create a unique filename for the PDF
-    filename = f"inspection_{uuid.uuid4()}.pdf"
-    file_path = os.path.join(PDF_UPLOAD_DIR, filename)
+    # Create a unique filename for the PDF unless the caller chose one
+    if file_path is None:
+        filename = f"inspection_{uuid.uuid4()}.pdf"
+        file_path = os.path.join(PDF_UPLOAD_DIR, filename)
     
     # Ensure directory exists
     ensure_upload_dirs()
     
+    build_inspection_pdf(inspection, photos_data, file_path)
+    return file_path
+
+def build_inspection_pdf(inspection, photos_data, output: Union[str, BinaryIO]):
+    """Lay out the inspection report into output, a file path or a binary file object"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage
+    from reportlab.lib.styles import getSampleStyleSheet
+    
     # Create the PDF document
-    doc = SimpleDocTemplate(file_path, pagesize=letter)
+    doc = SimpleDocTemplate(output, pagesize=letter)
     styles = getSampleStyleSheet()
     elements = []
     
@@ -332,7 +488,7 @@ def generate_inspection_pdf(inspection, photos_data=None) -> str:
         
         for photo in photos_data:
             if os.path.exists(photo.photo_path):
-                img = RLImage(photo.photo_path, width=400, height=300)
+                img = RLImage(prepare_pdf_image(photo.photo_path, 400, 300), width=400, height=300)
                 elements.append(img)
                 elements.append(Paragraph(f"說明: {photo.caption if photo.caption else '無'}", styles['Normal']))
                 elements.append(Paragraph(f"拍攝日期: {photo.capture_date}", styles['Normal']))
@@ -340,5 +496,99 @@ def generate_inspection_pdf(inspection, photos_data=None) -> str:
     
     # Build the PDF
     doc.build(elements)
+
+def render_report_section(inspection, photos_data, file_path: str) -> str:
+    """
+    Render one inspection's section of a project report.
+    
+    The section is written under a temporary name and renamed into place, so
+    a section file that exists is always complete and safe to reuse.
+    """
+    temp_path = f"{file_path}.{os.getpid()}{TEMP_FILE_SUFFIX}"
+    try:
+        generate_inspection_pdf(inspection, photos_data, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return file_path
+
+class ReportSection(NamedTuple):
+    """A rendered section of a consolidated report and its table of contents entry"""
+    group: str
+    title: str
+    path: str
+
+def _render_table_of_contents(title: str, sections: List[ReportSection], first_pages: List[int]) -> bytes:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet
+    
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = getSampleStyleSheet()
+    elements = [Paragraph(title, styles['Title']), Paragraph("目錄", styles['Heading2']), Spacer(1, 12)]
+    rows = [
+        [Paragraph(f"{section.group} / {section.title}", styles['Normal']), str(page + 1)]
+        for section, page in zip(sections, first_pages)
+    ]
+    if rows:
+        table = Table(rows, colWidths=[400, 60])
+        table.setStyle(TableStyle([('ALIGN', (1, 0), (1, -1), 'RIGHT'), ('VALIGN', (0, 0), (-1, -1), 'TOP')]))
+        elements.append(table)
+    doc.build(elements)
+    return buffer.getvalue()
+
+def assemble_project_report(title: str, sections: List[ReportSection], output_path: str) -> str:
+    """
+    Concatenate rendered sections into one PDF behind a table of contents.
+    
+    Each section gets a bookmark under a bookmark for its group (subproject).
+    The table of contents is laid out again until its own page count is
+    stable, so the page numbers it lists are exact.
+    
+    Args:
+        title: Report title shown above the table of contents
+        sections: Rendered sections in report order
+        output_path: Where to write the report
+        
+    Returns:
+        The output path
+    """
+    from PyPDF2 import PdfReader, PdfWriter
     
-    return file_path
\ No newline at end of file
+    readers = [PdfReader(section.path) for section in sections]
+    
+    toc_pages = 1
+    while True:
+        first_pages, page = [], toc_pages
+        for reader in readers:
+            first_pages.append(page)
+            page += len(reader.pages)
+        toc = PdfReader(io.BytesIO(_render_table_of_contents(title, sections, first_pages)))
+        if len(toc.pages) == toc_pages:
+            break
+        toc_pages = len(toc.pages)
+    
+    writer = PdfWriter()
+    for page in toc.pages:
+        writer.add_page(page)
+    groups = {}
+    for section, reader, first_page in zip(sections, readers, first_pages):
+        for page in reader.pages:
+            writer.add_page(page)
+        if section.group not in groups:
+            groups[section.group] = writer.add_outline_item(section.group, first_page)
+        writer.add_outline_item(section.title, first_page, parent=groups[section.group])
+    
+    temp_path = f"{output_path}{TEMP_FILE_SUFFIX}"
+    try:
+        with open(temp_path, 'wb') as output:
+            writer.write(output)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return output_path
@@ -0,0 +1,180 @@
+import os
+import glob
+import math
+import enum
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+# Root of every upload directory; the test suite points it at a temporary directory
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "app/static/uploads")
+
+# Derived images live next to the uploads, one directory per size
+THUMBNAIL_DIR = os.path.join(UPLOAD_DIR, "thumbnails")
+
+class ThumbnailSize(str, enum.Enum):
+    SMALL = "small"
+    MEDIUM = "medium"
+    LARGE = "large"
+
+# Longest edge in pixels for each derivative
+THUMBNAIL_SIZES = {
+    ThumbnailSize.SMALL: 160,
+    ThumbnailSize.MEDIUM: 480,
+    ThumbnailSize.LARGE: 1280,
+}
+
+THUMBNAIL_QUALITY = 80
+
+# Photos embedded in PDF reports are resampled to this resolution for their
+# slot on the page and cached here
+PDF_IMAGE_DIR = os.path.join(UPLOAD_DIR, "pdf_images")
+PDF_IMAGE_DPI = int(os.getenv("PDF_IMAGE_DPI", "150"))
+PDF_IMAGE_QUALITY = 80
+
+# Image decoding is CPU bound, so it runs in its own process pool
+IMAGE_POOL_WORKERS = int(os.getenv("IMAGE_POOL_WORKERS", "2"))
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+
+def get_image_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool for image work, creating it on first use"""
+    global _image_pool
+    if _image_pool is None:
+        _image_pool = ProcessPoolExecutor(
+            max_workers=IMAGE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _image_pool
+
+def run_in_image_pool(fn, *args):
+    """Run fn in the image pool and wait for the result"""
+    global _image_pool
+    pool = get_image_pool()
+    try:
+        return pool.submit(fn, *args).result()
+    except BrokenProcessPool:
+        # A crashed child breaks the pool for good; start a fresh one next time
+        if _image_pool is pool:
+            _image_pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+def thumbnail_path(photo_path: str, size: ThumbnailSize) -> str:
+    """Return where the derivative of the given size is stored for a photo"""
+    stem = os.path.splitext(os.path.basename(photo_path))[0]
+    return os.path.join(THUMBNAIL_DIR, ThumbnailSize(size).value, f"{stem}.jpg")
+
+def thumbnail_paths(photo_path: str) -> List[str]:
+    """Return the paths of every derivative of a photo"""
+    return [thumbnail_path(photo_path, size) for size in ThumbnailSize]
+
+def build_thumbnails(photo_path: str) -> Dict[str, str]:
+    """
+    Build every thumbnail size for a photo.
+
+    The source is decoded once: JPEGs use draft mode so the decoder itself
+    scales down to roughly the largest derivative, and EXIF orientation is
+    applied before resizing. Sizes are produced from largest to smallest,
+    each one resampled from the previous.
+
+    Args:
+        photo_path: Path of the original photo
+
+    Returns:
+        Dictionary mapping size name to derivative path
+    """
+    from PIL import Image, ImageOps
+
+    largest = max(THUMBNAIL_SIZES.values())
+    paths = {}
+
+    with Image.open(photo_path) as source:
+        source.draft("RGB", (largest, largest))
+        img = ImageOps.exif_transpose(source).convert("RGB")
+
+    for size, edge in sorted(THUMBNAIL_SIZES.items(), key=lambda item: item[1], reverse=True):
+        img.thumbnail((edge, edge), Image.LANCZOS)
+
+        target = thumbnail_path(photo_path, size)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_target = f"{target}.part"
+        img.save(temp_target, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(temp_target, target)
+        paths[size.value] = target
+
+    return paths
+
+def pdf_image_path(photo_path: str, size_px) -> str:
+    """Return where the PDF-ready copy of a photo at the given pixel size is cached"""
+    stem = os.path.splitext(os.path.basename(photo_path))[0]
+    return os.path.join(PDF_IMAGE_DIR, f"{stem}_{size_px[0]}x{size_px[1]}.jpg")
+
+def derived_image_paths(photo_path: str) -> List[str]:
+    """Return every file derived from a photo: thumbnails and cached PDF images"""
+    stem = os.path.splitext(os.path.basename(photo_path))[0]
+    pdf_images = glob.glob(os.path.join(glob.escape(PDF_IMAGE_DIR), f"{glob.escape(stem)}_*x*.jpg"))
+    return thumbnail_paths(photo_path) + pdf_images
+
+def prepare_pdf_image(photo_path: str, width_pt: float, height_pt: float, dpi: int = PDF_IMAGE_DPI) -> str:
+    """
+    Return a copy of a photo resampled for a width x height point slot in a PDF.
+
+    reportlab embeds image data as is, so a full resolution phone photo drawn
+    in a small slot inflates the report and its build time. The copy has just
+    enough pixels for the slot at the given DPI and is recompressed as JPEG.
+    It is cached and reused while it is newer than the source. If the photo
+    cannot be processed, the original path is returned unchanged.
+    """
+    from PIL import Image, ImageOps
+
+    target = (math.ceil(width_pt / 72 * dpi), math.ceil(height_pt / 72 * dpi))
+    cached_path = pdf_image_path(photo_path, target)
+
+    try:
+        try:
+            if os.stat(cached_path).st_mtime >= os.stat(photo_path).st_mtime:
+                return cached_path
+        except FileNotFoundError:
+            pass
+
+        with Image.open(photo_path) as source:
+            source.draft("RGB", target)
+            img = ImageOps.exif_transpose(source).convert("RGB")
+
+        # Never upscale; reportlab stretches the image to the slot either way
+        if img.width > target[0] or img.height > target[1]:
+            img = img.resize((min(img.width, target[0]), min(img.height, target[1])), Image.LANCZOS)
+
+        os.makedirs(PDF_IMAGE_DIR, exist_ok=True)
+        temp_path = f"{cached_path}.{os.getpid()}.part"
+        img.save(temp_path, "JPEG", quality=PDF_IMAGE_QUALITY, optimize=True)
+        os.replace(temp_path, cached_path)
+        return cached_path
+    except Exception as e:
+        print(f"[WARNING] Could not prepare {photo_path} for PDF embedding: {e}")
+        return photo_path
+
+def has_thumbnails(photo_path: str) -> bool:
+    """Check whether every derivative of a photo already exists"""
+    return all(os.path.exists(path) for path in thumbnail_paths(photo_path))
+
+async def generate_thumbnails(photo_path: str) -> Dict[str, str]:
+    """
+    Build the thumbnails of a newly stored photo in the image process pool.
+
+    Photos whose derivatives already exist (e.g. a deduplicated upload) are
+    skipped. Failures are logged and do not fail the upload; the thumbnail
+    endpoint retries on demand.
+    """
+    if not os.path.exists(photo_path) or has_thumbnails(photo_path):
+        return {}
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(None, run_in_image_pool, build_thumbnails, photo_path)
+    except Exception as e:
+        print(f"[WARNING] Could not build thumbnails for {photo_path}: {e}")
+        return {}
@@ -0,0 +1,72 @@
+import json
+import base64
+import binascii
+from datetime import date, datetime
+from typing import Any, List, Optional, Sequence
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Encode the sort key values of a row into an opaque cursor"""
+    raw = json.dumps([value.isoformat() if isinstance(value, (date, datetime)) else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, order_columns: Sequence) -> List[Any]:
+    """
+    Decode a cursor produced by encode_cursor for the given order columns.
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or does not match the columns
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(order_columns):
+            raise ValueError("cursor does not match the sort order")
+        return [_parse_value(column, value) for column, value in zip(order_columns, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def _parse_value(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def _after(order_columns: Sequence, values: Sequence):
+    """Row comparison (c1, c2, ...) > (v1, v2, ...) written with AND/OR"""
+    column, value = order_columns[0], values[0]
+    if len(order_columns) == 1:
+        return column > value
+    return or_(column > value, and_(column == value, _after(order_columns[1:], values[1:])))
+
+def page_query(query, order_columns: Sequence, skip: int = 0, limit: Optional[int] = 100, cursor: Optional[str] = None):
+    """
+    Order a Query or select() by order_columns and restrict it to one page.
+
+    With a cursor the page starts right after the row the cursor points at,
+    which costs the same at any depth; otherwise skip/limit offsets are used.
+    The last order column must be unique (the primary key) so the order is
+    total and pages never overlap.
+    """
+    query = query.order_by(*order_columns)
+    if cursor:
+        query = query.filter(_after(order_columns, decode_cursor(cursor, order_columns)))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+def paginate(query, order_columns: Sequence, skip: int = 0, limit: Optional[int] = 100, cursor: Optional[str] = None):
+    """Load one page of a Query, see page_query"""
+    return page_query(query, order_columns, skip=skip, limit=limit, cursor=cursor).all()
+
+def set_next_cursor(response: Response, rows: Sequence, limit: Optional[int], order_columns: Sequence):
+    """Expose the cursor of the next page in a response header if the page was full"""
+    if rows and limit and len(rows) == limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in order_columns])
@@ -0,0 +1,74 @@
+"""
+Request body limits for the upload endpoints.
+
+Starlette reads a whole multipart body into spooled temporary files before
+the endpoint runs, so the per-file limits in file_utils only cap the copy
+into the upload directory. UploadSizeLimitMiddleware stops an oversized
+request before that: a declared Content-Length over the route's limit is
+answered with 413 without reading the body, and a body sent without one
+(chunked) is cut off with 413 as soon as it passes the limit.
+"""
+import os
+import re
+from typing import Optional
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.file_utils import MAX_PDF_UPLOAD_BYTES, MAX_PHOTO_UPLOAD_BYTES, format_file_size
+
+# Room for the multipart boundaries and the other form fields next to a file
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+# A batch upload carries many photos at once
+MAX_PHOTO_BATCH_UPLOAD_BYTES = int(os.getenv("MAX_PHOTO_BATCH_UPLOAD_BYTES", str(20 * MAX_PHOTO_UPLOAD_BYTES)))
+
+# Whole-request limits of the upload endpoints by path (POST only)
+UPLOAD_REQUEST_LIMITS = [
+    (re.compile(r"^/api/inspections/\d+/upload-pdf$"), MAX_PDF_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/photos/$"), MAX_PHOTO_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+    (re.compile(r"^/api/photos/batch$"), MAX_PHOTO_BATCH_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES),
+]
+
+def upload_request_limit(method: str, path: str) -> Optional[int]:
+    """The body size limit of a request, or None if it has none"""
+    if method != "POST":
+        return None
+    for pattern, max_bytes in UPLOAD_REQUEST_LIMITS:
+        if pattern.match(path):
+            return max_bytes
+    return None
+
+def _too_large(max_bytes: int) -> str:
+    return f"Request exceeds the maximum upload size of {format_file_size(max_bytes)}"
+
+class UploadSizeLimitMiddleware:
+    """Rejects upload requests whose body exceeds the route's limit before it is spooled"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        max_bytes = upload_request_limit(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            response = ORJSONResponse({"detail": _too_large(max_bytes)}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Raised while the endpoint parses its form, so it becomes the response
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=_too_large(max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
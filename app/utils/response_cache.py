@@ -0,0 +1,90 @@
+import os
+import hashlib
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+from app.utils.ttl_cache import TTLCache
+
+# Serialized bodies kept per worker process
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+# Writes invalidate entries in the worker that handled them; other workers
+# serve their copy for at most this many seconds
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "10"))
+
+# Headers that change the response and are therefore part of the cache key
+VARY_HEADERS = ("owner",)
+
+class CachedResponse(NamedTuple):
+    etag: str
+    body: bytes
+    headers: Tuple[Tuple[str, str], ...]
+    tags: frozenset
+
+def project_tag(project_id: int) -> str:
+    """Tag of every cached response that shows a project or its inspections"""
+    return f"project:{project_id}"
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+class ResponseCache:
+    """
+    An LRU of serialized JSON bodies for read endpoints, keyed by request URL.
+
+    Entries carry tags naming the records they were built from; crud write
+    functions call invalidate() with the same tags after committing. A hit
+    answers from memory without touching the database, and a client that
+    already holds the current ETag gets 304 Not Modified.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self._entries = TTLCache(max_entries, ttl)
+
+    @staticmethod
+    def key(request: Request) -> str:
+        vary = "&".join(f"{name}={request.headers.get(name, '')}" for name in VARY_HEADERS)
+        return f"{request.url.path}?{request.url.query}#{vary}"
+
+    def lookup(self, request: Request) -> Optional[Response]:
+        """Return the response for a cached request, or None on a miss"""
+        entry = self._entries.get(self.key(request))
+        if entry is None:
+            return None
+        return self._respond(request, entry)
+
+    def store(self, request: Request, content, tags: Iterable[str], headers: Optional[Dict[str, str]] = None) -> Response:
+        """Serialize content, cache it under the request and return the response"""
+        body = ORJSONResponse(content=jsonable_encoder(content)).body
+        entry = CachedResponse(
+            etag=f'"{hashlib.sha1(body).hexdigest()}"',
+            body=body,
+            headers=tuple((headers or {}).items()),
+            tags=frozenset(tags),
+        )
+        self._entries.set(self.key(request), entry)
+        return self._respond(request, entry)
+
+    def invalidate(self, *tags: str):
+        """Drop every entry built from any of the given tags"""
+        tags = set(tags)
+        self._entries.discard_where(lambda entry: bool(entry.tags & tags))
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _respond(request: Request, entry: CachedResponse) -> Response:
+        headers = dict(entry.headers, ETag=entry.etag)
+        headers["Cache-Control"] = "private, no-cache"
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+response_cache = ResponseCache()
@@ -0,0 +1,59 @@
+"""
+A small in-process cache shared by the project owner and response caches.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+class TTLCache:
+    """
+    A bounded, thread-safe LRU map whose entries expire ttl seconds after
+    they were set. The least recently used entry is evicted once the cache
+    holds max_entries; a max_entries of 0 disables caching.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the value cached under key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_where(self, predicate: Callable[[Any], bool]):
+        """Drop every entry whose value matches the predicate"""
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
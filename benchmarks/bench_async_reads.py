@@ -0,0 +1,92 @@
+"""
+Compare read endpoint throughput with the async engine against the sync
+engine in the threadpool.
+
+    python benchmarks/bench_async_reads.py [--requests 3000] [--concurrency 200]
+
+Each mode runs in its own process (the engine is chosen at import time)
+against the same throwaway SQLite database, driving the ASGI app directly
+with httpx so the numbers reflect the app rather than the network.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PATHS = ("/api/projects/1", "/api/inspections/?project_id=1&limit=50", "/api/photos/?inspection_id=1")
+
+def seed(database_url):
+    os.environ["DATABASE_URL"] = database_url
+    from datetime import date
+    from app.db.database import Base, engine, SessionLocal
+    from app.models.models import Project, ConstructionInspection, InspectionPhoto
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(Project(name="Bench", location="L", contractor="C", start_date=date.today(),
+                   end_date=date.today(), owner="bench"))
+    db.flush()
+    db.add_all(ConstructionInspection(project_id=1, subproject_name=f"S{i}", inspection_form_name="F",
+                                      inspection_date=date.today(), location="L", timing="T", result="R")
+               for i in range(100))
+    db.flush()
+    db.add_all(InspectionPhoto(inspection_id=1, photo_path=f"{i}.jpg", capture_date=date.today())
+               for i in range(30))
+    db.commit()
+    db.close()
+
+async def drive(requests, concurrency):
+    import httpx
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = asyncio.Queue()
+        for i in range(requests):
+            queue.put_nowait(PATHS[i % len(PATHS)])
+
+        async def worker():
+            while not queue.empty():
+                response = await client.get(queue.get_nowait())
+                assert response.status_code == 200, response.text
+
+        # Warm up pools and caches before timing
+        await asyncio.gather(*(client.get(path) for path in PATHS))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return requests / (time.perf_counter() - started)
+
+def run_mode(args):
+    os.environ["JOB_WORKER_ENABLED"] = "0"
+    rps = asyncio.run(drive(args.requests, args.concurrency))
+    from app.db.database import AsyncSessionLocal
+    mode = "async engine" if AsyncSessionLocal is not None else "sync engine + threadpool"
+    print(f"{mode:>26}: {rps:8.0f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--mode", choices=("sync", "async"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed(database_url)
+    print(f"{args.requests} requests, concurrency {args.concurrency}")
+    for mode in ("sync", "async"):
+        env = dict(os.environ, DATABASE_URL=database_url, ASYNC_DB_ENABLED="1" if mode == "async" else "0")
+        subprocess.run([sys.executable, __file__, "--mode", mode, "--requests", str(args.requests),
+                        "--concurrency", str(args.concurrency)], env=env, cwd=ROOT, check=True)
+
+if __name__ == "__main__":
+    main()
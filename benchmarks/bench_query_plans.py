@@ -0,0 +1,109 @@
+"""
+Show the query plans and timings of the list/ownership queries before and
+after the filter indexes migration (0005 -> 0006).
+
+    python benchmarks/bench_query_plans.py [--projects 200] [--inspections 50] [--photos 10]
+
+Runs against a throwaway SQLite database. Point BENCH_DATABASE_URL at an
+empty MySQL scratch database to see that dialect's EXPLAIN output instead.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, text
+
+QUERIES = {
+    "projects by owner": (
+        "SELECT id FROM projects WHERE owner = :owner ORDER BY id LIMIT 100",
+        {"owner": "owner-7"},
+    ),
+    "inspections of a project": (
+        "SELECT id FROM construction_inspections WHERE project_id = :project_id "
+        "ORDER BY inspection_date, id LIMIT 100",
+        {"project_id": 7},
+    ),
+    "photos of an inspection": (
+        "SELECT id FROM inspection_photos WHERE inspection_id = :inspection_id "
+        "ORDER BY capture_date, id LIMIT 100",
+        {"inspection_id": 77},
+    ),
+}
+
+def seed(connection, projects, inspections, photos):
+    start = date(2024, 1, 1)
+    connection.execute(text(
+        "INSERT INTO projects (id, name, location, contractor, start_date, end_date, owner) "
+        "VALUES (:id, 'P', 'L', 'C', :d, :d, :owner)"
+    ), [{"id": p, "d": start, "owner": f"owner-{p % 50}"} for p in range(1, projects + 1)])
+    connection.execute(text(
+        "INSERT INTO construction_inspections (id, project_id, subproject_name, inspection_form_name, "
+        "inspection_date, location, timing, result) VALUES (:id, :project_id, 'S', 'F', :d, 'L', 'T', 'R')"
+    ), [
+        {"id": (p - 1) * inspections + i, "project_id": p, "d": start + timedelta(days=(i * 37) % 365)}
+        for p in range(1, projects + 1) for i in range(1, inspections + 1)
+    ])
+    inspection_count = projects * inspections
+    connection.execute(text(
+        "INSERT INTO inspection_photos (inspection_id, photo_path, capture_date) VALUES (:inspection_id, 'x.jpg', :d)"
+    ), [
+        {"inspection_id": i, "d": start + timedelta(days=(n * 11) % 365)}
+        for i in range(1, inspection_count + 1) for n in range(photos)
+    ])
+
+def explain(connection, sql, params):
+    if connection.dialect.name == "sqlite":
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).fetchall()
+        return [row[-1] for row in rows]
+    return [str(tuple(row)) for row in connection.execute(text(f"EXPLAIN {sql}"), params)]
+
+def timed(connection, sql, params, repeat=200):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        connection.execute(text(sql), params).fetchall()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def report(engine, label):
+    print(f"== {label} ==")
+    with engine.connect() as connection:
+        if connection.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+        for name, (sql, params) in QUERIES.items():
+            print(f"{name}: {timed(connection, sql, params):.3f} ms")
+            for line in explain(connection, sql, params):
+                print(f"    {line}")
+    print()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--inspections", type=int, default=50)
+    parser.add_argument("--photos", type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_engine(url)
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "migrations"))
+
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0005")
+        seed(connection, args.projects, args.inspections, args.photos)
+    report(engine, "0005 (primary keys only)")
+
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "0006")
+    report(engine, "0006 (filter indexes)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the cost of turning a page of inspections into a response body with
+the stdlib JSONResponse against the ORJSONResponse the app now uses.
+
+    python benchmarks/bench_serialization.py [--sizes 100 1000 10000] [--repeat 5]
+
+The inspections are transient ORM objects, so no database is involved. The
+"response model" column is FastAPI's own validation and conversion to JSON
+types, which both response classes share; the other columns are the JSON
+encoding on top of it.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import date, datetime
+from typing import List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+def make_inspections(count):
+    from app.models.models import ConstructionInspection
+
+    return [
+        ConstructionInspection(
+            id=i, project_id=1, subproject_name=f"分項工程 {i % 20}", inspection_form_name="鋼筋查驗表",
+            inspection_date=date(2024, 1, 1), location="台北市 信義區", timing="檢驗停留點", result="合格",
+            remark="備註" if i % 3 else None, pdf_path=f"app/static/uploads/pdfs/inspection_{i:032x}.pdf",
+            created_at=datetime(2024, 1, 1, 10, 0, 0, 123456), updated_at=datetime(2024, 1, 2, 8, 30),
+        )
+        for i in range(count)
+    ]
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from fastapi.responses import JSONResponse, ORJSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from app.schemas import schemas
+
+    field = create_response_field(name="Response_read_inspections", type_=List[schemas.Inspection])
+
+    print(f"{'rows':>6} {'response model':>15} {'json':>9} {'orjson':>9} {'total json':>11} {'total orjson':>13}")
+    for size in args.sizes:
+        inspections = make_inspections(size)
+        model_ms, content = best_of(args.repeat, lambda: asyncio.run(
+            serialize_response(field=field, response_content=inspections, is_coroutine=True)
+        ))
+        json_ms, json_body = best_of(args.repeat, lambda: JSONResponse(content).body)
+        orjson_ms, orjson_body = best_of(args.repeat, lambda: ORJSONResponse(content).body)
+        assert json_body == orjson_body, "orjson output differs from the stdlib encoder"
+        print(f"{size:>6} {model_ms:>12.1f} ms {json_ms:>6.1f} ms {orjson_ms:>6.1f} ms "
+              f"{model_ms + json_ms:>8.1f} ms {model_ms + orjson_ms:>10.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Measure how long an API worker takes to start: importing app.main and
+serving its first requests.
+
+    python benchmarks/bench_startup.py [--runs 5]
+
+Every run is a fresh interpreter, like a gunicorn worker being booted or
+recycled, against a throwaway SQLite database prepared by app.db.migrate.
+The first PDF request is timed separately since it pays for the reportlab
+import that startup no longer does.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+def seed(database_url):
+    os.environ["DATABASE_URL"] = database_url
+    from datetime import date
+    from app.db.database import SessionLocal
+    from app.db.migrate import migrate
+    from app.models.models import Project, ConstructionInspection
+
+    migrate()
+    db = SessionLocal()
+    db.add(Project(name="Bench", location="L", contractor="C", start_date=date.today(),
+                   end_date=date.today(), owner="bench"))
+    db.flush()
+    db.add(ConstructionInspection(project_id=1, subproject_name="S", inspection_form_name="F",
+                                  inspection_date=date.today(), location="L", timing="T", result="R"))
+    db.commit()
+    db.close()
+
+def measure():
+    """One worker start; prints its timings as JSON"""
+    started = time.perf_counter()
+    from app.main import app
+    imported = time.perf_counter()
+
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        # The test client's own imports are not part of a worker start
+        ready = time.perf_counter()
+        assert client.get("/api/projects/1").status_code == 200
+        first_request = time.perf_counter()
+        assert client.get("/api/inspections/1/report.pdf").status_code == 200
+        first_pdf = time.perf_counter()
+
+    print(json.dumps({
+        "import app.main": imported - started,
+        "first request": (imported - started) + (first_request - ready),
+        "first PDF request": first_pdf - first_request,
+    }))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        measure()
+        return
+
+    database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    seed(database_url)
+    env = dict(os.environ, DATABASE_URL=database_url, JOB_WORKER_ENABLED="0")
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, __file__, "--measure"], env=env, cwd=ROOT,
+                                check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{args.runs} fresh workers (median / min)")
+    for name in runs[0]:
+        values = [run[name] * 1000 for run in runs]
+        print(f"{name:>18}: {statistics.median(values):7.0f} ms / {min(values):7.0f} ms")
+
+if __name__ == "__main__":
+    main()
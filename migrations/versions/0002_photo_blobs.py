@@ -0,0 +1,39 @@
+"""Store photos once per content hash
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 03:02:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "photo_blobs",
+        sa.Column("content_hash", sa.String(length=64), nullable=False),
+        sa.Column("path", sa.String(length=255), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint("content_hash"),
+    )
+    with op.batch_alter_table("inspection_photos") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(length=64), nullable=True))
+        batch_op.create_index("ix_inspection_photos_content_hash", ["content_hash"])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("inspection_photos") as batch_op:
+        batch_op.drop_index("ix_inspection_photos_content_hash")
+        batch_op.drop_column("content_hash")
+    op.drop_table("photo_blobs")
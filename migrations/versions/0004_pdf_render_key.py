@@ -0,0 +1,28 @@
+"""Key generated inspection PDFs by their rendered content
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 03:06:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.add_column(sa.Column("pdf_render_key", sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.drop_column("pdf_render_key")
@@ -0,0 +1,32 @@
+"""Record the size of stored PDFs and photos
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 03:08:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.add_column(sa.Column("pdf_size", sa.BigInteger(), nullable=True))
+    with op.batch_alter_table("inspection_photos") as batch_op:
+        batch_op.add_column(sa.Column("file_size", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("inspection_photos") as batch_op:
+        batch_op.drop_column("file_size")
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.drop_column("pdf_size")
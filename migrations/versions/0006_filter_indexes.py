@@ -0,0 +1,39 @@
+"""Index the columns used by list filters and ownership checks
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 03:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_projects_owner", "projects", ["owner"])
+    # The leading column also serves the plain project_id / inspection_id
+    # lookups and the foreign keys, so no separate single-column index is needed
+    op.create_index(
+        "ix_construction_inspections_project_id_inspection_date",
+        "construction_inspections",
+        ["project_id", "inspection_date"],
+    )
+    op.create_index(
+        "ix_inspection_photos_inspection_id_capture_date",
+        "inspection_photos",
+        ["inspection_id", "capture_date"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inspection_photos_inspection_id_capture_date", table_name="inspection_photos")
+    op.drop_index("ix_construction_inspections_project_id_inspection_date", table_name="construction_inspections")
+    op.drop_index("ix_projects_owner", table_name="projects")
@@ -0,0 +1,30 @@
+"""Store the merged inspection PDF with its photo pages
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 05:20:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.add_column(sa.Column("merged_pdf_path", sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column("merged_pdf_size", sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("construction_inspections") as batch_op:
+        batch_op.drop_column("merged_pdf_size")
+        batch_op.drop_column("merged_pdf_path")
@@ -0,0 +1,38 @@
+"""Store consolidated project reports and job progress
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 06:40:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("projects") as batch_op:
+        batch_op.add_column(sa.Column("report_pdf_path", sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column("report_pdf_size", sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column("report_render_key", sa.String(length=64), nullable=True))
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.add_column(sa.Column("progress_done", sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column("progress_total", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.drop_column("progress_total")
+        batch_op.drop_column("progress_done")
+    with op.batch_alter_table("projects") as batch_op:
+        batch_op.drop_column("report_render_key")
+        batch_op.drop_column("report_pdf_size")
+        batch_op.drop_column("report_pdf_path")
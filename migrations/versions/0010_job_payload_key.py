@@ -0,0 +1,43 @@
+"""Key jobs by a hash of their payload and index it
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 14:20:00
+
+"""
+from typing import Sequence, Union
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010"
+down_revision: Union[str, None] = "0009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.add_column(sa.Column("payload_key", sa.String(length=64), nullable=True))
+    op.create_index("ix_jobs_kind_payload_key", "jobs", ["kind", "payload_key"])
+
+    # Same key as app.services.jobs.job_payload_key, which is not imported so
+    # that the revision keeps working when the app changes
+    connection = op.get_bind()
+    jobs = sa.table("jobs", sa.column("id", sa.Integer), sa.column("payload", sa.Text),
+                    sa.column("payload_key", sa.String))
+    for job_id, payload in connection.execute(sa.select(jobs.c.id, jobs.c.payload)).all():
+        payload_key = hashlib.sha256(
+            json.dumps(json.loads(payload or "{}"), sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        connection.execute(jobs.update().where(jobs.c.id == job_id).values(payload_key=payload_key))
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_kind_payload_key", table_name="jobs")
+    with op.batch_alter_table("jobs") as batch_op:
+        batch_op.drop_column("payload_key")
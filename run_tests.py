@@ -24,6 +24,11 @@ def run_tests():
         "app/tests/test_file_utils.py",  # File utils tests
         "app/tests/test_database.py",    # Database tests
         "app/tests/test_coverage.py",    # Coverage tests
+        "app/tests/test_image_utils.py", # Thumbnail tests
+        "app/tests/test_jobs.py",        # Background job tests
+        "app/tests/test_async_crud.py",  # Async read path tests
+        "app/tests/test_orphan_gc.py",   # Orphan file collector tests
+        "app/tests/test_file_serving.py", # Upload file serving tests
         "--cov=app",           # Coverage report
         "--cov-report=html",   # HTML coverage report
         "--cov-report=term-missing",  # Terminal report with missing lines